@@ -1,21 +1,64 @@
+import os
+import threading
 from dotenv import load_dotenv
-from data_processor import run_chat
+from data_processor import run_chat, show_latency_panel
+from utils.embedders import warm_up_embedders
+from utils.facets import load_facets
+from utils.tracing import start_metrics_server
 import streamlit as st
 
 load_dotenv()
 
 
+@st.cache_resource(show_spinner=False)
+def load_embedders():
+    # runs once per server process; every session shares the loaded models.
+    # They load in the background so the first page is drawn without waiting;
+    # a query arriving earlier waits for its embedder in `get_embedder`.
+    thread = threading.Thread(target=warm_up_embedders, name="embedder-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource(show_spinner=False)
+def load_metrics_server():
+    # one Prometheus endpoint per server process, only when METRICS_PORT is set
+    return start_metrics_server()
+
+
 st.set_page_config(page_title='My App', page_icon=':smiley:')
 st.title('My App')
 st.sidebar.title('Settings')
 
 
+# facet vocabularies are read from dictionaries.json once per process
+facets = load_facets()
+
 with st.sidebar:
     index_name = st.text_input("Index name:", value="col-ambiente")
     namespace = st.text_input("namespace:", value="regulations")
+    st.subheader("Filters")
+    genres = st.multiselect("Genre:", options=facets.genres)
+    themes = st.multiselect("Theme:", options=facets.themes)
+    statuses = st.multiselect("Status:", options=facets.statuses)
+    year_range = st.slider("Year:", min_value=facets.min_year, max_value=facets.max_year,
+                           value=(facets.min_year, facets.max_year))
+    dependency = st.text_input("Dependency:")
+    show_latency = st.toggle("Latency breakdown", value=os.getenv("SHOW_LATENCY_PANEL") == "1")
+
+query_filter = facets.build_filter(genres=genres, themes=themes, statuses=statuses,
+                                   year_range=year_range, dependency=dependency)
 
+load_embedders()
+load_metrics_server()
 
 run_chat(
     index_name=index_name,
-    namespace=namespace
+    namespace=namespace,
+    filter=query_filter
 )
+
+if show_latency:
+    # drawn after the chat so it includes the question just answered
+    with st.sidebar:
+        show_latency_panel()
@@ -0,0 +1,188 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from utils.compact import FullVectorStore, compact_query, compact_records, truncate_vectors
+from utils.embedders import OPENAI_EMBEDDING_DIMENSIONS
+from utils.local_index import LocalIndex
+
+"""Recall-versus-latency report for compact search settings:
+    1- Load the full-precision chunk embeddings from the chunk embedding cache
+    2- Hold out a sample of them as queries (or read real queries from the query cache)
+    3- Compute the exact full-precision top-k as ground truth
+    4- Search a local index per (dimensions, quantization, re-rank) setting and time each query
+    5- Write a Markdown table and recommend the fastest setting above the recall target
+
+    python -m benchmarks.compact_report --output benchmarks/compact_report.md
+    SEARCH_DIMENSIONS=256 SEARCH_QUANTIZATION=int8 streamlit run app.py
+"""
+
+NAMESPACE = "report"
+
+
+def load_vectors(path, dimensions=OPENAI_EMBEDDING_DIMENSIONS, limit=None):
+    """
+    Return the `dimensions`-sized vectors stored in an `EmbeddingCache` SQLite file.
+    """
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute("SELECT vector FROM embeddings WHERE length(vector) = ? ORDER BY rowid"
+                          + (f" LIMIT {int(limit)}" if limit else ""), (dimensions * 4,))
+        vectors = [np.frombuffer(blob, dtype='<f4') for (blob,) in rows]
+    finally:
+        db.close()
+    return np.array(vectors, dtype=np.float32).reshape(-1, dimensions)
+
+
+def exact_top_k(corpus, queries, top_k):
+    """
+    Return the ids of the exact full-precision top-k of each query.
+    """
+    corpus = truncate_vectors(corpus, corpus.shape[1])
+    scores = truncate_vectors(queries, queries.shape[1]) @ corpus.T
+    top = np.argsort(-scores, axis=1)[:, :top_k]
+    return [[f"v{i}" for i in row] for row in top]
+
+
+def evaluate_setting(corpus, queries, truth, directory, dimensions, quantization, rerank,
+                     top_k=10, candidates=40):
+    """
+    Index `corpus` for one setting, run every query and measure recall and latency.
+
+    Returns:
+        dict: Setting plus 'recall', 'p50_ms', 'p95_ms' and 'index_mb'.
+    """
+    records = [(f"v{i}", vector, {}) for i, vector in enumerate(corpus)]
+    index = LocalIndex(directory, dimension=dimensions, quantization=quantization)
+    store = FullVectorStore(os.path.join(directory, "full.sqlite"))
+    index.upsert(compact_records(records, store, NAMESPACE, dimensions), namespace=NAMESPACE)
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        if rerank:
+            results = compact_query(index, store, NAMESPACE, query, top_k=top_k,
+                                    dimensions=dimensions, candidates=candidates)
+        else:
+            results = index.query(vector=truncate_vectors(query, dimensions).tolist(),
+                                  top_k=top_k, namespace=NAMESPACE, include_metadata=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({match['id'] for match in results['matches']} & set(expected))
+
+    itemsize = 1 if quantization == "int8" else 4
+    return {
+        'dimensions': dimensions,
+        'quantization': quantization or "float32",
+        'rerank': rerank,
+        'recall': hits / (len(truth) * top_k) if truth else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) if latencies else 0.0,
+        'p95_ms': float(np.percentile(latencies, 95)) if latencies else 0.0,
+        'index_mb': len(corpus) * dimensions * itemsize / 1e6,
+    }
+
+
+def build_report(corpus, queries, dimensions_list, top_k=10, candidates=40):
+    """
+    Evaluate every setting, starting with the uncompressed full-precision baseline.
+    """
+    truth = exact_top_k(corpus, queries, top_k)
+    full = corpus.shape[1]
+    settings = [(full, None, False)]
+    for dimensions in dimensions_list:
+        for quantization in (None, "int8"):
+            for rerank in (False, True):
+                if (dimensions, quantization, rerank) != (full, None, False):
+                    settings.append((dimensions, quantization, rerank))
+    rows = []
+    for dimensions, quantization, rerank in settings:
+        with tempfile.TemporaryDirectory() as directory:
+            rows.append(evaluate_setting(corpus, queries, truth, directory, dimensions,
+                                         quantization, rerank, top_k=top_k, candidates=candidates))
+            print(format_row(rows[-1]))
+    return rows
+
+
+def format_row(row):
+    return (f"| {row['dimensions']} | {row['quantization']} | {'yes' if row['rerank'] else 'no'} | "
+            f"{row['recall']:.3f} | {row['p50_ms']:.2f} | {row['p95_ms']:.2f} | {row['index_mb']:.1f} |")
+
+
+def recommend(rows, target):
+    """
+    Return the setting with the lowest p50 latency whose recall meets `target`.
+
+    Only the baseline and re-ranked settings are eligible, since compact mode
+    always re-ranks; the other rows show what the re-rank pass recovers.
+    """
+    eligible = [row for row in rows[:1] + [row for row in rows if row['rerank']]
+                if row['recall'] >= target]
+    return min(eligible, key=lambda row: row['p50_ms']) if eligible else None
+
+
+def render_markdown(rows, corpus_size, query_count, top_k, candidates, target):
+    lines = [
+        "# Compact search: recall versus latency",
+        "",
+        f"Corpus: {corpus_size} chunks | Queries: {query_count} | Recall@{top_k} against the exact "
+        f"full-precision top-{top_k} | Re-rank candidates: {candidates}",
+        "",
+        "| Dimensions | Storage | Re-rank | Recall | p50 ms | p95 ms | Index MB |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    lines += [format_row(row) for row in rows]
+    best = recommend(rows, target)
+    lines.append("")
+    if best is None or best is rows[0]:
+        lines.append(f"No compact setting beats the baseline at recall >= {target:.2f}; "
+                     "keep SEARCH_DIMENSIONS=0.")
+    else:
+        quantization = "int8" if best['quantization'] == "int8" else ""
+        lines.append(f"Fastest setting with recall >= {target:.2f}: "
+                     f"SEARCH_DIMENSIONS={best['dimensions']} SEARCH_QUANTIZATION={quantization}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure recall and latency of compact search settings.")
+    parser.add_argument("--cache", default=os.getenv("CHUNK_EMBEDDING_CACHE_PATH",
+                                                     os.path.join(".cache", "chunk_embeddings.sqlite")),
+                        help="Chunk embedding cache holding the corpus vectors.")
+    parser.add_argument("--query-cache", default=os.getenv("QUERY_EMBEDDING_CACHE_PATH"),
+                        help="Query embedding cache with real user queries. Defaults to held-out chunks.")
+    parser.add_argument("--full-dimensions", type=int, default=OPENAI_EMBEDDING_DIMENSIONS)
+    parser.add_argument("--dimensions", default="1536,1024,512,256,128")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=None, help="Use at most this many corpus vectors.")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--target", type=float, default=0.95, help="Recall needed for the recommendation.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "compact_report.md"))
+    args = parser.parse_args(argv)
+
+    corpus = load_vectors(args.cache, args.full_dimensions, args.limit)
+    rng = np.random.default_rng(args.seed)
+    if args.query_cache:
+        queries = load_vectors(args.query_cache, args.full_dimensions)[:args.queries]
+    else:
+        # held-out chunks stand in for queries and are removed from the corpus
+        held_out = rng.choice(len(corpus), size=min(args.queries, len(corpus) // 10), replace=False)
+        queries = corpus[held_out]
+        corpus = np.delete(corpus, held_out, axis=0)
+    if not len(corpus) or not len(queries):
+        parser.error(f"not enough {args.full_dimensions}-dimension vectors in {args.cache}")
+
+    dimensions_list = [int(d) for d in args.dimensions.split(",") if int(d) <= args.full_dimensions]
+    print(f"Corpus: {len(corpus)} | Queries: {len(queries)}")
+    rows = build_report(corpus, queries, dimensions_list, top_k=args.top_k, candidates=args.candidates)
+    report = render_markdown(rows, len(corpus), len(queries), args.top_k, args.candidates, args.target)
+    with open(args.output, 'w') as f:
+        f.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from unittest import mock
+from utils import extraction, processes
+from utils.answer_cache import SemanticAnswerCache
+from utils.embedders import OPENAI_EMBEDDING_DIMENSIONS
+from utils.embedding_cache import EmbeddingCache
+from utils.fakes import FakeIndex, fake_embed, make_pdf
+from utils.lexical import LexicalIndex
+
+"""Offline benchmarks of the ingestion and Q&A hot paths:
+    1- Build synthetic regulation PDFs of increasing page count
+    2- Replace the embedding model, vector store and chat model with deterministic fakes,
+       and start every repetition with empty caches, so no run touches the network
+    3- Time get_text_from_pdf, split_text_into_chunks, create_records_to_upsert,
+       pinecone_store_data and get_response, keeping the median of several repetitions
+    4- Compare the medians with a JSON baseline and fail when one exceeds its threshold
+
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --update-baseline
+"""
+
+SIZES = (5, 25, 100)
+REPEATS = 5
+NAMESPACE = "benchmark"
+INDEX_NAME = "benchmark"
+BASELINE_PATH = os.path.join("benchmarks", "baselines", "hot_paths.json")
+# a median twice its baseline, and at least 5 ms over it, is a regression; shared
+# machines swing by half that between runs, so tighter limits only raise false alarms
+TOLERANCE = 1.0
+MIN_SLACK_SECONDS = 0.005
+QUESTION = "¿Qué establece el artículo 2.2.3.2 sobre las concesiones de agua?"
+
+
+def regulation_pages(code, pages):
+    """
+    Return the text of a synthetic regulation of `pages` pages, one string per page.
+    """
+    return ["\n".join(f"Articulo 2.2.{page}.{line}. El Decreto {code} regula las concesiones de agua "
+                      f"superficial y subterranea, los permisos de vertimiento y la tasa numero {line}."
+                      for line in range(1, 31))
+            for page in range(1, pages + 1)]
+
+
+class FakeEmbedder:
+    """
+    Embedding model stand-in built on `fake_embed`.
+    """
+
+    def __init__(self, dimensions):
+        self.model = "fake"
+        self.dimensions = dimensions
+
+    def embed(self, texts, batch_size=None):
+        return fake_embed(list(texts), dimensions=self.dimensions)
+
+    def warm_up(self):
+        return self
+
+
+class FakeChatModel:
+    """
+    OpenAI client stand-in whose completion echoes the size of the prompt.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    @staticmethod
+    def _complete(model, messages, **kwargs):
+        content = f"Respuesta basada en {len(messages[-1]['content'])} caracteres de contexto."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class OfflineStack:
+    """
+    Patches the external services used by `utils.processes` with in-memory fakes.
+    `reset()` empties every store and cache, so each repetition starts cold.
+    """
+
+    def __init__(self, dimensions=OPENAI_EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.embedder = FakeEmbedder(dimensions)
+        self.reset()
+
+    def reset(self):
+        self.index = FakeIndex(dimension=self.dimensions)
+        self.lexical = LexicalIndex(":memory:")
+        self.answers = SemanticAnswerCache()
+        self.query_embeddings = EmbeddingCache(normalize=True)
+        self.chunk_embeddings = EmbeddingCache()
+
+    @contextlib.contextmanager
+    def patched(self):
+        patches = [
+            # measure extraction itself, not the artifact cache
+            mock.patch.object(extraction, 'get_artifact_cache', lambda: None),
+            mock.patch.object(processes, 'get_embedder', lambda *args, **kwargs: self.embedder),
+            mock.patch.object(processes, 'get_query_embedding_cache', lambda: self.query_embeddings),
+            mock.patch.object(processes, 'get_chunk_embedding_cache', lambda: self.chunk_embeddings),
+            mock.patch.object(processes, 'get_answer_cache', lambda: self.answers),
+            mock.patch.object(processes, 'get_lexical_index', lambda index_name: self.lexical),
+            mock.patch.object(processes, 'ensure_index', lambda **kwargs: self.index),
+            mock.patch.object(processes, 'get_index', lambda index_name: self.index),
+            mock.patch.object(processes, 'index_is_ready', lambda index_name: True),
+            # the stored layout must not depend on the environment running the suite
+            mock.patch.object(processes, 'slim_metadata_enabled', lambda: False),
+            mock.patch.object(processes, 'compact_enabled', lambda: False),
+            mock.patch('openai.OpenAI', FakeChatModel),
+        ]
+        with contextlib.ExitStack() as stack:
+            for patch in patches:
+                stack.enter_context(patch)
+            # the functions print their own progress; keep the report readable
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            yield self
+
+
+def measure(fn, repeats, setup=None):
+    """
+    Run `fn` `repeats` times, calling `setup` untimed before each run.
+
+    Returns:
+        dict: 'median_s', 'min_s' and 'max_s' over the repetitions.
+    """
+    seconds = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        # a collection landing inside one repetition would dominate its timing
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            fn()
+            seconds.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return {'median_s': statistics.median(seconds), 'min_s': min(seconds), 'max_s': max(seconds)}
+
+
+def run_suite(sizes=SIZES, repeats=REPEATS):
+    """
+    Time every hot path on a synthetic regulation of each size in `sizes` (pages).
+
+    Returns:
+        dict: '<benchmark>/<pages>p' to its timings, page count and chunk count.
+    """
+    stack = OfflineStack()
+    results = {}
+    metadata = {'genre': "Decreto", 'code': "1076", 'year': 2015, 'theme': "Agua",
+                'status': "Vigente", 'title': "Decreto Unico Ambiental"}
+    with stack.patched():
+        for pages in sizes:
+            pdf = make_pdf(regulation_pages("1076", pages))
+            text = processes.get_text_from_pdf(pdf)
+            chunks = processes.split_text_into_chunks(text)
+            embeddings = fake_embed(chunks, dimensions=stack.dimensions)
+            records = processes.create_records_to_upsert(chunks, embeddings, metadata)
+
+            def store():
+                processes.pinecone_store_data(records, INDEX_NAME, NAMESPACE,
+                                              dimensions=stack.dimensions, incremental=True)
+
+            def ask():
+                processes.get_response(QUESTION, INDEX_NAME, NAMESPACE)
+
+            def loaded():
+                stack.reset()
+                store()
+
+            timings = {
+                'get_text_from_pdf': measure(lambda: processes.get_text_from_pdf(pdf), repeats),
+                'split_text_into_chunks': measure(lambda: processes.split_text_into_chunks(text), repeats),
+                'create_records_to_upsert': measure(
+                    lambda: processes.create_records_to_upsert(chunks, embeddings, metadata), repeats),
+                'pinecone_store_data': measure(store, repeats, setup=stack.reset),
+                'get_response': measure(ask, repeats, setup=loaded),
+            }
+            for name, timing in timings.items():
+                results[f"{name}/{pages}p"] = dict(timing, pages=pages, chunks=len(chunks))
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+
+def compare(results, baseline):
+    """
+    Return the benchmarks whose median exceeds its baseline threshold.
+
+    A benchmark may set its own 'tolerance' in the baseline; otherwise the
+    baseline's top-level 'tolerance' applies. Benchmarks missing from the
+    baseline are not checked.
+
+    Returns:
+        list (dict): 'name', 'baseline_s', 'median_s' and 'limit_s' of each regression.
+    """
+    regressions = []
+    default_tolerance = baseline.get('tolerance', TOLERANCE)
+    slack = baseline.get('min_slack_s', MIN_SLACK_SECONDS)
+    for name, result in results.items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        tolerance = reference.get('tolerance', default_tolerance)
+        expected = reference['median_s']
+        limit = max(expected * (1 + tolerance), expected + slack)
+        if result['median_s'] > limit:
+            regressions.append({'name': name, 'baseline_s': expected,
+                                'median_s': result['median_s'], 'limit_s': limit})
+    return regressions
+
+
+def render_table(results, baseline=None):
+    lines = ["| Benchmark | Chunks | Median ms | Min ms | Baseline ms |", "|---|---|---|---|---|"]
+    for name, result in results.items():
+        reference = (baseline or {}).get('results', {}).get(name)
+        reference_ms = f"{reference['median_s'] * 1000:.1f}" if reference else "-"
+        lines.append(f"| {name} | {result['chunks']} | {result['median_s'] * 1000:.1f} | "
+                     f"{result['min_s'] * 1000:.1f} | {reference_ms} |")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the ingestion and Q&A hot paths.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES),
+                        help="Comma-separated page counts of the synthetic regulations.")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", default=None, help="Also write this run's results as JSON.")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Save this run as the new baseline instead of checking it.")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Override the baseline's relative tolerance.")
+    args = parser.parse_args(argv)
+
+    results = run_suite(sizes=[int(size) for size in args.sizes.split(",")], repeats=args.repeats)
+    run = {'environment': environment(), 'repeats': args.repeats, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        baseline = dict(run, tolerance=args.tolerance if args.tolerance is not None else TOLERANCE,
+                        min_slack_s=MIN_SLACK_SECONDS)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(render_table(results))
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(render_table(results))
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create it.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.tolerance is not None:
+        baseline['tolerance'] = args.tolerance
+        for reference in baseline['results'].values():
+            reference.pop('tolerance', None)
+    print(render_table(results, baseline))
+    if baseline.get('environment') != run['environment']:
+        print("Baseline was recorded on a different machine; re-record it there with --update-baseline.")
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['median_s'] * 1000:.1f} ms "
+              f"> limit {regression['limit_s'] * 1000:.1f} ms "
+              f"(baseline {regression['baseline_s'] * 1000:.1f} ms)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+"""Cold-start report for the Streamlit pages:
+    1- Start a fresh interpreter per run, so every import is cold
+    2- Time the page's own imports, after Streamlit itself is loaded
+    3- Time the first script run of the page with Streamlit's AppTest, as the first render
+    4- Record the resident memory of the process and which heavy libraries got loaded
+    5- Write the medians as a Markdown table
+
+    python -m benchmarks.startup --runs 5 --output benchmarks/startup_report.md
+"""
+
+PAGES = {
+    'app': "app.py",
+    'upload': os.path.join("pages", "1_Upload Regulations.py"),
+}
+# libraries a page should only load once a request needs them
+HEAVY_MODULES = ("torch", "sentence_transformers", "voyageai", "pinecone", "openai", "boto3",
+                 "pypdf", "langchain_community", "langchain_openai", "langchain_text_splitters")
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+streamlit_seconds = time.perf_counter() - started
+started = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+import_seconds = time.perf_counter() - started
+started = time.perf_counter()
+app = AppTest.from_file({script!r}, default_timeout={timeout})
+app.run()
+render_seconds = time.perf_counter() - started
+print(json.dumps({{
+    'streamlit_s': streamlit_seconds,
+    'import_s': import_seconds,
+    'first_render_s': render_seconds,
+    'exceptions': [str(e.value) for e in app.exception],
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def page_modules(script):
+    """
+    Return the project modules a page script imports at its top level.
+    """
+    with open(script) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    local = [m for m in modules if os.path.exists(m.split(".")[0] + ".py")
+             or os.path.isdir(m.split(".")[0])]
+    return list(dict.fromkeys(local))
+
+
+def measure(script, timeout=60):
+    """
+    Run one cold start of `script` in a new interpreter and return its measurements.
+    """
+    code = _PROBE.format(modules=page_modules(script), script=script, timeout=timeout,
+                         heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            timeout=timeout * 2, env=env)
+    if result.returncode:
+        raise RuntimeError(f"{script} failed to start:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    """
+    Median of every timing and memory figure over `runs`.
+    """
+    summary = {key: statistics.median(run[key] for run in runs)
+               for key in ('streamlit_s', 'import_s', 'first_render_s', 'rss_mb')}
+    summary['heavy'] = runs[-1]['heavy']
+    summary['exceptions'] = runs[-1]['exceptions']
+    return summary
+
+
+def render_markdown(results, runs):
+    lines = [
+        "# Cold start of the Streamlit pages",
+        "",
+        f"Median of {runs} runs, each in a fresh interpreter. Import time excludes Streamlit itself.",
+        "",
+        "| Page | Imports s | First render s | Peak RSS MB | Heavy modules loaded |",
+        "|---|---|---|---|---|",
+    ]
+    for page, summary in results.items():
+        lines.append(f"| {page} | {summary['import_s']:.2f} | {summary['first_render_s']:.2f} | "
+                     f"{summary['rss_mb']:.0f} | {', '.join(summary['heavy']) or '-'} |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time and memory of the Streamlit pages.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pages", default=",".join(PAGES))
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "startup_report.md"))
+    parser.add_argument("--json", default=None, help="Also write the medians as JSON.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for page in args.pages.split(","):
+        runs = [measure(PAGES[page], timeout=args.timeout) for _ in range(args.runs)]
+        results[page] = summarize(runs)
+        if results[page]['exceptions']:
+            print(f"{page} raised while rendering: {results[page]['exceptions']}")
+    report = render_markdown(results, args.runs)
+    with open(args.output, 'w') as f:
+        f.write(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
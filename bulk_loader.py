@@ -0,0 +1,449 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+from utils.catalog import batch_write_items, build_catalog_item, get_dynamodb_client
+from utils.chunk_store import get_chunk_store, slim_metadata_enabled, slim_records
+from utils.compact import (SEARCH_DIMENSIONS, SEARCH_QUANTIZATION, compact_enabled, compact_records,
+                           get_full_vector_store)
+from utils.embedders import OPENAI_EMBEDDING_DIMENSIONS
+from utils.lexical import get_lexical_index
+from utils.extraction import get_chunks_with_pages
+from utils.reindex import document_prefix, regulation_key, reindex_document
+from utils.upsert import namespace_vector_count
+
+"""Bulk ingestion of regulations from the command line:
+    1- Read a manifest (CSV/JSONL) or a directory of PDFs named like the Upload page names them
+    2- Extract and split PDFs in a process pool
+    3- Embed chunks in concurrent batches
+    4- Write vectors and DynamoDB catalog items in batched workers
+    5- Record finished documents in a checkpoint so a crashed run resumes where it stopped
+
+Stages are connected by bounded queues, so a slow stage holds back the ones before it.
+
+    python bulk_loader.py --directory pdfs/ --index col-ambiente --namespace regulations
+    python bulk_loader.py --manifest regulations.csv --local
+"""
+
+load_dotenv()
+
+METADATA_FIELDS = ["genre", "status", "dependency", "theme", "title", "code", "year", "month", "day"]
+_DONE = object()
+
+
+def load_dictionaries(path="dictionaries.json"):
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+
+def file_name_for(metadata, dictionaries):
+    """
+    Return the S3 file name the Upload page gives to a regulation.
+    """
+    return (f"{dictionaries['genre_dict'][metadata['genre']]}#{metadata['year']}#{metadata['code']}"
+            f"#{dictionaries['theme_dict'][metadata['theme']]}"
+            f"#{dictionaries['status_dict'][metadata['status']]}.pdf")
+
+
+def _clean_metadata(row):
+    metadata = {key: row[key] for key in METADATA_FIELDS if row.get(key) not in (None, "")}
+    for key in ("year", "day"):
+        if key in metadata:
+            metadata[key] = int(metadata[key])
+    return metadata
+
+
+def read_manifest(path):
+    """
+    Read ingestion jobs from a CSV or JSONL manifest.
+
+    Each row has a `path` to the PDF plus the metadata fields collected by
+    `assemble_metadata_and_return_filename`. Relative paths are resolved
+    against the manifest directory.
+
+    Returns:
+        list (dict): Jobs with 'path' and 'metadata'.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    if path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    return [{'path': os.path.join(base, row['path']), 'metadata': _clean_metadata(row)}
+            for row in rows]
+
+
+def scan_directory(directory, dictionaries):
+    """
+    Build ingestion jobs from PDFs named `genre#year#code#theme#status.pdf`,
+    the scheme used by the Upload page, mapping the codes back to their names.
+
+    Returns:
+        list (dict): Jobs with 'path' and 'metadata'.
+    """
+    lookups = {name: {str(v): k for k, v in dictionaries[name].items()}
+               for name in ("genre_dict", "theme_dict", "status_dict")}
+    jobs = []
+    for file_name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(file_name)
+        parts = stem.split("#")
+        if extension.lower() != ".pdf" or len(parts) != 5:
+            print(f"Skipping {file_name}: name does not follow genre#year#code#theme#status.pdf")
+            continue
+        genre_code, year, code, theme_code, status_code = parts
+        genre = lookups["genre_dict"].get(genre_code)
+        theme = lookups["theme_dict"].get(theme_code)
+        status = lookups["status_dict"].get(status_code)
+        if genre is None or theme is None or status is None or not year.isdigit():
+            print(f"Skipping {file_name}: unknown genre, theme or status code, or year is not a number")
+            continue
+        metadata = {
+            "genre": genre,
+            "status": status,
+            "dependency": "",
+            "theme": theme,
+            "title": f"{genre} {code} de {year}",
+            "code": code,
+            "year": int(year),
+        }
+        jobs.append({'path': os.path.join(directory, file_name), 'metadata': metadata})
+    return jobs
+
+
+class Checkpoint:
+    """
+    Append-only record of finished documents, fsynced after every write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    @staticmethod
+    def key(job):
+        return f"{job['path']}|{regulation_key(job['metadata'])}"
+
+    def is_done(self, job):
+        return self.key(job) in self.done
+
+    def mark(self, jobs):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for job in jobs:
+                    f.write(self.key(job) + "\n")
+                    self.done.add(self.key(job))
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class StageStats:
+    """
+    Per-stage counters: documents, units (pages, chunks or vectors) and busy time.
+    """
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.documents = 0
+        self.units = 0
+        self.busy = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def add(self, units, seconds):
+        with self._lock:
+            self.documents += 1
+            self.units += units
+            self.busy += seconds
+
+    def fail(self):
+        with self._lock:
+            self.failures += 1
+
+    def summary(self, wall_seconds):
+        rate = self.units / wall_seconds if wall_seconds else 0.0
+        return (f"{self.name:<8} docs: {self.documents:>6} | {self.unit}: {self.units:>8} | "
+                f"{rate:10.1f} {self.unit}/s | busy: {self.busy:8.2f}s | failed: {self.failures}")
+
+
+def _extract(path, chunk_size, chunk_overlap):
+    # runs in a worker process; documents are already parallel, so pages are read in series
+    return get_chunks_with_pages(path, chunk_size=chunk_size,
+                                 chunk_overlap=chunk_overlap, processes=1)
+
+
+def run_pipeline(jobs, index, namespace, embed_fn, dynamodb, table_name, region, bucket_name,
+                 dictionaries, checkpoint, extract_workers=None, embed_workers=4,
+                 write_workers=2, queue_size=8, embed_batch_size=256, catalog_batch_size=25,
+                 chunk_size=1000, chunk_overlap=100, full_store=None, search_dimensions=None,
+                 chunk_store=None, lexical_index=None):
+    """
+    Ingest `jobs` through the extract, embed and write stages.
+
+    Args:
+        jobs (list): Output of `read_manifest` or `scan_directory`.
+        index (Index): Pinecone Index handle or a compatible stand-in.
+        namespace (str): Target namespace.
+        embed_fn (callable): Receives a list of texts and returns their vectors.
+        dynamodb (client): boto3 DynamoDB client or a compatible stand-in.
+        checkpoint (Checkpoint): Finished documents; they are skipped and new ones recorded.
+        queue_size (int, optional): Capacity of each queue between stages. Defaults to 8.
+        full_store (FullVectorStore, optional): When given, the index receives vectors
+            truncated to `search_dimensions` and the full ones are kept here for re-ranking.
+        chunk_store (ChunkStore, optional): When given, chunk text and regulation metadata
+            are kept here and vectors carry slim metadata.
+        lexical_index (LexicalIndex, optional): BM25 index updated with every document.
+    Returns:
+        dict (StageStats): Stats for the 'extract', 'embed' and 'write' stages.
+    """
+    # imported here so reading the manifest does not load the model clients
+    from utils.processes import create_records_to_upsert
+
+    stats = {'extract': StageStats("extract", "chunks"),
+             'embed': StageStats("embed", "chunks"),
+             'write': StageStats("write", "vectors")}
+    extracted = queue.Queue(maxsize=queue_size)
+    embedded = queue.Queue(maxsize=queue_size)
+    pending_items = []
+    pending_jobs = []
+    catalog_lock = threading.Lock()
+    extract_workers = extract_workers or os.cpu_count() or 1
+    todo = [job for job in jobs if not checkpoint.is_done(job)]
+    print(f"Documents: {len(jobs)} | Already done: {len(jobs) - len(todo)} | To ingest: {len(todo)}")
+
+    def flush_catalog(force=False):
+        with catalog_lock:
+            if not pending_items or (len(pending_items) < catalog_batch_size and not force):
+                return
+            items, done = list(pending_items), list(pending_jobs)
+            pending_items.clear()
+            pending_jobs.clear()
+            batch_write_items(dynamodb, table_name, items)
+            checkpoint.mark(done)
+
+    def new_pool():
+        # spawn: the embed and write threads are already running, and forking them can deadlock
+        return ProcessPoolExecutor(max_workers=extract_workers,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    def feed():
+        in_flight = deque()
+        # jobs that were in flight when a worker died, re-run one at a time to find the culprit
+        suspects = deque()
+        jobs_iter = iter(todo)
+        executor = None
+        try:
+            executor = new_pool()
+            while True:
+                if suspects:
+                    if not in_flight:
+                        job = suspects.popleft()
+                        in_flight.append((job, time.perf_counter(), True, executor.submit(
+                            _extract, job['path'], chunk_size, chunk_overlap)))
+                else:
+                    while len(in_flight) < 2 * extract_workers:
+                        job = next(jobs_iter, None)
+                        if job is None:
+                            break
+                        in_flight.append((job, time.perf_counter(), False, executor.submit(
+                            _extract, job['path'], chunk_size, chunk_overlap)))
+                if not in_flight:
+                    break
+                job, started, alone, future = in_flight.popleft()
+                try:
+                    chunks, pages = future.result()
+                except BrokenProcessPool as e:
+                    # the pool is unusable; replace it and keep going with the rest of the batch
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = new_pool()
+                    if alone:
+                        print(f"Extraction crashed a worker for {job['path']}: {e}")
+                        stats['extract'].fail()
+                    else:
+                        suspects.extend([job] + [queued for queued, _, _, _ in in_flight])
+                    in_flight.clear()
+                    continue
+                except Exception as e:
+                    print(f"Extraction failed for {job['path']}: {e}")
+                    stats['extract'].fail()
+                    continue
+                stats['extract'].add(len(chunks), time.perf_counter() - started)
+                extracted.put((job, chunks, pages))
+        except Exception as e:
+            print(f"Extraction stopped after {stats['extract'].documents} documents: {e}")
+            stats['extract'].fail()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            # always release the embed workers, or run_pipeline waits on them forever
+            for _ in range(embed_workers):
+                extracted.put(_DONE)
+
+    def embed():
+        while True:
+            item = extracted.get()
+            if item is _DONE:
+                return
+            job, chunks, pages = item
+            started = time.perf_counter()
+            try:
+                embeddings = []
+                for start in range(0, len(chunks), embed_batch_size):
+                    embeddings.extend(embed_fn(chunks[start:start + embed_batch_size]))
+                records = create_records_to_upsert(chunks, embeddings, job['metadata'], pages=pages)
+            except Exception as e:
+                print(f"Embedding failed for {job['path']}: {e}")
+                stats['embed'].fail()
+                continue
+            stats['embed'].add(len(chunks), time.perf_counter() - started)
+            embedded.put((job, records))
+
+    def write():
+        while True:
+            item = embedded.get()
+            if item is _DONE:
+                return
+            job, records = item
+            started = time.perf_counter()
+            try:
+                metadata = dict(job['metadata'])
+                if lexical_index is not None:
+                    lexical_index.add(namespace, records, prefix=document_prefix(metadata))
+                if chunk_store is not None:
+                    records = slim_records(records=records, store=chunk_store, replace=True)
+                if full_store is not None:
+                    records = compact_records(records=records, store=full_store, namespace=namespace,
+                                              dimensions=search_dimensions,
+                                              prefix=document_prefix(metadata))
+                reindex_document(index=index, namespace=namespace, records=records,
+                                 prefix=document_prefix(metadata), wait_timeout=0)
+                catalog_item = build_catalog_item(
+                    metadata=metadata, region=region, bucket_name=bucket_name,
+                    file_name=file_name_for(metadata, dictionaries),
+                    genres_dict=dictionaries['genre_dict'],
+                    status_dict=dictionaries['status_dict'],
+                    themes_dict=dictionaries['theme_dict'])
+                with catalog_lock:
+                    pending_items.append(catalog_item)
+                    pending_jobs.append(job)
+                flush_catalog()
+            except Exception as e:
+                print(f"Write failed for {job['path']}: {e}")
+                stats['write'].fail()
+                continue
+            stats['write'].add(len(records), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    producers = [threading.Thread(target=feed, name="extract")]
+    producers += [threading.Thread(target=embed, name=f"embed-{n}") for n in range(embed_workers)]
+    writers = [threading.Thread(target=write, name=f"write-{n}") for n in range(write_workers)]
+    for thread in producers + writers:
+        thread.start()
+    for thread in producers:
+        thread.join()
+    for _ in writers:
+        embedded.put(_DONE)
+    for thread in writers:
+        thread.join()
+    flush_catalog(force=True)
+
+    wall = time.perf_counter() - started
+    print(f"Finished in {wall:.2f}s")
+    for stage in stats.values():
+        print(stage.summary(wall))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load regulations into Pinecone and DynamoDB.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="CSV or JSONL file with a path and metadata per regulation.")
+    source.add_argument("--directory", help="Directory of PDFs named genre#year#code#theme#status.pdf.")
+    parser.add_argument("--index", default="col-ambiente")
+    parser.add_argument("--namespace", default="regulations")
+    parser.add_argument("--dimensions", type=int, default=OPENAI_EMBEDDING_DIMENSIONS)
+    parser.add_argument("--table", default="EnvRegDB")
+    parser.add_argument("--region", default="us-east-2")
+    parser.add_argument("--bucket", default=os.getenv("AWS_BUCKET_NAME", ""))
+    parser.add_argument("--checkpoint", default=os.path.join(".cache", "bulk_checkpoint.txt"))
+    parser.add_argument("--extract-workers", type=int, default=None)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--write-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--provider", default="openai",
+                        help="Embedding provider, e.g. 'sentence-transformers-parallel' to embed on "
+                             "local CPU cores. The chat must then embed queries with the same model.")
+    parser.add_argument("--local", action="store_true",
+                        help="Use in-memory stand-ins for Pinecone, DynamoDB and the embedding API.")
+    args = parser.parse_args(argv)
+    full_store = None
+
+    dictionaries = load_dictionaries()
+    jobs = read_manifest(args.manifest) if args.manifest else scan_directory(args.directory, dictionaries)
+
+    if args.local:
+        from utils.fakes import FakeDynamoDB, FakeIndex, fake_embed
+        index = FakeIndex(dimension=args.dimensions)
+        dynamodb = FakeDynamoDB()
+
+        def embed_fn(texts):
+            return fake_embed(texts, dimensions=args.dimensions)
+    else:
+        from utils.embedders import get_embedder
+        from utils.pinecone_client import ensure_index
+        from utils.processes import embed_chunks
+        dimensions = args.dimensions
+        if args.provider != "openai":
+            # local models fix their own vector size; load them before the index is created
+            embedder = get_embedder(args.provider).warm_up()
+            dimensions = embedder.dimensions
+        if compact_enabled():
+            # first-pass index at SEARCH_DIMENSIONS, full vectors kept for the re-rank
+            full_store = get_full_vector_store(args.index)
+            index = ensure_index(index_name=args.index, dimensions=SEARCH_DIMENSIONS,
+                                 quantization=SEARCH_QUANTIZATION)
+        else:
+            index = ensure_index(index_name=args.index, dimensions=dimensions)
+        dynamodb = get_dynamodb_client(args.region)
+
+        def embed_fn(texts):
+            return embed_chunks(lst_chunks=texts, dimensions=dimensions, provider=args.provider)
+
+    run_pipeline(jobs=jobs, index=index, namespace=args.namespace, embed_fn=embed_fn,
+                 dynamodb=dynamodb, table_name=args.table, region=args.region,
+                 bucket_name=args.bucket, dictionaries=dictionaries,
+                 checkpoint=Checkpoint(args.checkpoint),
+                 extract_workers=args.extract_workers, embed_workers=args.embed_workers,
+                 write_workers=args.write_workers, queue_size=args.queue_size,
+                 embed_batch_size=args.embed_batch_size, full_store=full_store,
+                 search_dimensions=SEARCH_DIMENSIONS,
+                 chunk_store=get_chunk_store() if slim_metadata_enabled() and not args.local else None,
+                 lexical_index=None if args.local else get_lexical_index(args.index))
+    print("Vectors in namespace: ", namespace_vector_count(index, args.namespace))
+    if not args.local and args.provider != "openai":
+        # the registry instance embed_chunks encoded with, not a second copy
+        embedder = get_embedder(args.provider, dimensions=dimensions)
+        if hasattr(embedder, "stats"):
+            print("Local embedding: {chunks} chunks | {chunks_per_second:.1f} chunks/s".format(**embedder.stats()))
+
+
+if __name__ == "__main__":
+    main()
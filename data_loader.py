@@ -1,13 +1,14 @@
 import streamlit as st
 import datetime
-import boto3
-import json
-from utils.processes import create_vector_for_pinecone, pinecone_store_data
+from utils.processes import ingest_pdf
+from utils.catalog import build_catalog_item, get_catalog_reader
+from utils.jobs import ACTIVE, STAGES, get_job_queue, stage_fraction
 
 """
     1- Collect and ensamble metadata and return file name
     2- Store metadata in DynamoDB
     3- Upsert embeddings
+    4- Show the progress of queued ingestion jobs
 """
 
 
@@ -79,35 +80,46 @@ def store_metadata_in_dynamodb(table_name, region, bucket_name, file_name, metad
         bucket_name (str): S3 bucket name.
         file_name (str): PDF file name.
         metadata (Dict): Collection of data regarding the pdf file.
-    Return: True if HTTPStatusCode equal to 200
+    Return: 200 once the item is written.
+    Raises:
+        RuntimeError: DynamoDB kept the item unprocessed after every retry.
     """
-    metadata['url'] = f"https://{bucket_name}.s3.{region}.amazonaws.com/{file_name}"
+    item = build_catalog_item(metadata=metadata, region=region, bucket_name=bucket_name,
+                              file_name=file_name, genres_dict=genres_dict,
+                              status_dict=status_dict, themes_dict=themes_dict)
 
-    hierarchy_code = genres_dict[metadata['genre']]  # partition key
-    theme = themes_dict[metadata['theme']]
-    status = status_dict[metadata['status']]
+    # shared client; the write also refreshes this process's cached catalog reads
+    get_catalog_reader(table_name, region).put_items([item])
+    return 200
 
-    sort_by = f"{metadata['code']}#{theme}#{status}"
 
-    metadata = json.dumps(metadata)
-
-    dynamodb = boto3.client('dynamodb', region)
-
-    item = {
-        "hierarchy_code": {'S': str(hierarchy_code)},
-        "sort_by": {'S': sort_by},
-        "metadata": {'S': metadata}
-    }
+def upsert_embeddings_to_pinecone(index_name, namespace, dimensions, pdf_file, metadata):
+    ingest_pdf(pdf_file=pdf_file, index_name=index_name, namespace=namespace, metadata=metadata,
+               dimensions=dimensions)
+    return True
 
-    response = dynamodb.put_item(
-        TableName=table_name,
-        Item=item
-    )
-    message = response['ResponseMetadata']['HTTPStatusCode']
-    return message
 
+def show_job_progress(job_ids, queue=None):
+    """Draw the progress of ingestion jobs, one bar per job, without waiting for them.
 
-def upsert_embeddings_to_pinecone(index_name, namespace, dimensions, pdf_file, metadata):
-    vector = create_vector_for_pinecone(pdf_file=pdf_file, metadata=metadata)
-    pinecone_store_data(vector, index_name, namespace, dimensions)
-    return True
+    Args:
+        job_ids (list): Ids returned by `submit_ingest`.
+        queue (JobQueue, optional): Defaults to the process-wide queue.
+    Return: True while any of the jobs is queued or running.
+    """
+    if not job_ids:
+        return False
+    queue = queue or get_job_queue()
+    active = False
+    for job in queue.list(job_ids):
+        counts = ", ".join(f"{stage}: {job['progress'][stage]}" for stage in STAGES
+                           if stage in job['progress'])
+        label = f"{job['name'] or job['id'][:8]} - {job['status']}" + (f" ({counts})" if counts else "")
+        if job['status'] == 'failed':
+            st.error(f"{label}: {job['error']}")
+            if st.button("Retry", key=f"retry_{job['id']}"):
+                active = queue.retry(job['id']) or active
+        else:
+            st.progress(stage_fraction(job), text=label)
+            active = active or job['status'] in ACTIVE
+    return active
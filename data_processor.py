@@ -1,46 +1,30 @@
 import streamlit as st
-import time
-from langchain_core.messages import AIMessage, HumanMessage
-from utils.processes import (get_text_from_pdf,
-                             openai_embed_data,
-                             split_text_into_chunks,
-                             create_records_to_upsert,
-                             pinecone_store_data,
-                             get_response,
-                             upload_fileobj_to_s3,
-                             openai_embed_document,
-                             create_vector_from_documents_to_upsert)
-
-
-@st.cache_resource(show_spinner=False)
+from utils.processes import upload_fileobj_to_s3
+from utils.chat import start_response_stream
+from utils.jobs import submit_ingest
+from utils.tracing import get_tracer, stage_rows
+from data_loader import show_job_progress
+
+
 def prepare_data(pdf_file, index_name, namespace, metadata):
+    """
+    Queue the ingestion of a PDF and show the progress of this session's jobs
+    in the sidebar, without waiting for them.
+
+    Returns:
+        str: Id of the queued job.
+    """
+    if "ingest_jobs" not in st.session_state:
+        st.session_state["ingest_jobs"] = []
+    job_id = submit_ingest(pdf_file=pdf_file, index_name=index_name, namespace=namespace,
+                           metadata=metadata)
+    st.session_state["ingest_jobs"].append(job_id)
     with st.sidebar:
-        with st.spinner('Preparing data...'):
-            time.sleep(0.5)
-            docs = get_text_from_pdf(pdf_file=pdf_file)
-            st.success('Data loaded.')
-            time.sleep(0.5)
-            lst_of_chunks = split_text_into_chunks(docs=docs)
-            st.success('Data chunked.')
-            time.sleep(0.5)
-            emmbeddings = openai_embed_data(lst_chunks=lst_of_chunks)
-            st.success('Data emmbedded.')
-            time.sleep(0.5)
-            vector = create_records_to_upsert(
-                lst_of_chunks=lst_of_chunks,
-                embeddings=emmbeddings,
-                metadata=metadata
-            )
-            st.success('Data prepared.')
-            pinecone_store_data(vectors=vector,
-                                index_name=index_name,
-                                namespace=namespace,
-                                dimension=1536)
-            data_prepared = True
-            return data_prepared
-
-
-def run_chat(index_name, namespace):
+        show_job_progress(st.session_state["ingest_jobs"])
+    return job_id
+
+
+def run_chat(index_name, namespace, filter=None):
     """
     Facilitates a chat interaction between a user and an AI. It manages user input, chat history,
     and AI responses, updating the conversation dynamically within a Streamlit application.
@@ -48,6 +32,7 @@ def run_chat(index_name, namespace):
     Args:
     index_name (str): The name of the index for the AI to use in generating responses.
     namespace (str): The context or scope within which the AI generates responses.
+    filter (dict, optional): Metadata filter built from the sidebar facets.
 
     This function uses the Streamlit library to manage the web application's state and UI components.
     """
@@ -58,13 +43,14 @@ def run_chat(index_name, namespace):
         st.session_state["chat_history"] = []
 
     if user_question is not None and user_question != "":
-        input_message = HumanMessage(content=user_question)
-        st.session_state["chat_history"].append(input_message)
-        response = AIMessage(content=get_response(
+        # langchain_core is only loaded once there is a conversation to draw
+        from langchain_core.messages import AIMessage, HumanMessage
+        # start embedding and retrieval now, while the history is drawn
+        response_stream = start_response_stream(
             query=user_question,
             index_name=index_name,
-            namespace=namespace))
-        st.session_state["chat_history"].append(response)
+            namespace=namespace,
+            filter=filter)
 
         for msg in st.session_state["chat_history"]:
             if isinstance(msg, HumanMessage):
@@ -74,6 +60,44 @@ def run_chat(index_name, namespace):
                 with st.chat_message("AI"):
                     st.write(msg.content)
 
+        with st.chat_message("Human"):
+            st.write(user_question)
+        with st.chat_message("AI"):
+            answer = st.write_stream(response_stream)
+
+        st.session_state["chat_history"].append(HumanMessage(content=user_question))
+        st.session_state["chat_history"].append(AIMessage(content=answer))
+
+
+def show_latency_panel(trace="chat", tracer=None):
+    """
+    Show the stage latencies of the last `trace` request, with the rolling
+    p50/p95 of every stage, in the current container (usually the sidebar).
+    """
+    tracer = tracer or get_tracer()
+    st.subheader("Latency")
+    last = tracer.last(trace)
+    if last is None:
+        st.caption("No request traced yet.")
+        return
+    st.caption(f"Last request: {last['seconds'] * 1000:.0f} ms")
+    st.markdown(markdown_table(["Stage", "ms"],
+                               [[row['stage'].replace("  ", "&nbsp;&nbsp;"), row['ms']]
+                                for row in stage_rows(last)]), unsafe_allow_html=True)
+    percentiles = tracer.percentiles(trace)
+    st.markdown(markdown_table(["Stage", "p50 ms", "p95 ms", "n"],
+                               [[stage, round(values['p50'] * 1000, 1), round(values['p95'] * 1000, 1),
+                                 values['count']] for stage, values in sorted(percentiles.items())]))
+
+
+def markdown_table(header, rows):
+    """
+    Render `rows` under `header` as a Markdown table.
+    """
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines += ["| " + " | ".join(str(cell) for cell in row) + " |" for row in rows]
+    return "\n".join(lines)
+
 
 def load_bucket_with_file(pdf_file, bucket_name, file_name):
     if st.button('Load file'):
@@ -1,12 +1,16 @@
 import streamlit as st
-from data_loader import assemble_metadata_and_return_filename, store_metadata_in_dynamodb, upsert_embeddings_to_pinecone
+from data_loader import assemble_metadata_and_return_filename, store_metadata_in_dynamodb, show_job_progress
 from dotenv import dotenv_values
-import json
 from utils.processes import upload_fileobj_to_s3
+from utils.jobs import JOB_POLL_SECONDS, submit_ingest
+from utils.facets import load_facets
+from utils.catalog import catalog_key, get_catalog_reader
 
 
 vars_env = dotenv_values(".env")
 aws_bucket_name = vars_env.get("AWS_BUCKET_NAME")
+catalog_table = "EnvRegDB"
+catalog_region = "us-east-2"
 
 if "pdf_ready" not in st.session_state:
     st.session_state.pdf_ready = False
@@ -26,8 +30,11 @@ if "database_button" not in st.session_state:
 if "vector_button" not in st.session_state:
     st.session_state.vector_button = False
 
-with open('dictionaries.json', 'r') as json_file:
-    dictionaries = json.load(json_file)
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = []
+
+# read from dictionaries.json once per process, not on every rerun
+dictionaries = load_facets().dictionaries
 genres_dict = dictionaries['genre_dict']
 themes_dict = dictionaries['theme_dict']
 status_dict = dictionaries['status_dict']
@@ -104,9 +111,20 @@ with tab3:
     else:
         st.session_state.database_button = True
 
+    if st.session_state.metadata_ready:
+        # served from the local catalog cache on reruns, not read again from DynamoDB
+        try:
+            existing = get_catalog_reader(catalog_table, catalog_region).get(
+                *catalog_key(metadata, genres_dict, status_dict, themes_dict))
+        except Exception as e:
+            print(f"Catalog lookup failed: {e}")
+            existing = None
+        if existing is not None:
+            st.info(f"Already in the catalog as \"{existing.get('title', '')}\"; feeding replaces it.")
+
     if st.button('Feed database', type="primary", disabled=st.session_state.database_button):
         with st.spinner('Feeding database...'):
-            response = store_metadata_in_dynamodb(table_name="EnvRegDB", region="us-east-2",
+            response = store_metadata_in_dynamodb(table_name=catalog_table, region=catalog_region,
                                                   bucket_name=aws_bucket_name, file_name=file_name,
                                                   metadata=metadata, genres_dict=genres_dict,
                                                   status_dict=status_dict, themes_dict=themes_dict)
@@ -129,15 +147,21 @@ with tab4:
     else:
         st.session_state.vector_button = True
     if st.button('Create vector and upsert it', type="primary", disabled=st.session_state.vector_button):
-        with st.spinner('Upserting file...'):
-            if upsert_embeddings_to_pinecone(
-                    index_name=index_name, namespace=namespace, dimensions=1536, pdf_file=pdf_file, metadata=metadata):
-                st.success("Vector already upserted!")
-            else:
-                st.error("Try again")
+        # ingestion runs on the job queue's workers; this rerun only stores the PDF
+        job_id = submit_ingest(pdf_file=pdf_file, index_name=index_name, namespace=namespace,
+                               metadata=metadata, name=file_name)
+        st.session_state.ingest_jobs.append(job_id)
+        st.success("File queued for upsertion.")
 
         st.session_state.vector_button = False
 
+    # only this block reruns while jobs progress; the rest of the page is left as drawn
+    @st.fragment(run_every=JOB_POLL_SECONDS if st.session_state.ingest_jobs else None)
+    def job_progress():
+        show_job_progress(st.session_state.ingest_jobs)
+
+    job_progress()
+
     if st.session_state.pdf_ready == False:
         st.warning(upload_file_message)
     else:
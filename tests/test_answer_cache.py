@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import patch
+from utils import processes
+from utils.answer_cache import SemanticAnswerCache
+from utils.fakes import FakeIndex
+from utils.lexical import LexicalIndex
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    def test_similar_queries_hit_and_distant_ones_miss(self):
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.store("idx", "ns", [1.0, 0.0, 0.0], "Ley 99 de 1993", seconds=2.0)
+        self.assertEqual(cache.lookup("idx", "ns", [0.99, 0.05, 0.0]), "Ley 99 de 1993")
+        self.assertIsNone(cache.lookup("idx", "ns", [0.0, 1.0, 0.0]))
+        self.assertIsNone(cache.lookup("idx", "other", [1.0, 0.0, 0.0]))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertGreater(stats['saved_seconds'], 1.9)
+
+    def test_questions_citing_different_codes_do_not_share_answers(self):
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.store("idx", "ns", [1.0, 0.0], "Decreto 1076: sector ambiente",
+                    question="¿Qué regula el Decreto 1076?")
+        # the two questions embed almost identically
+        self.assertIsNone(cache.lookup("idx", "ns", [0.999, 0.01], question="¿Qué regula el Decreto 1077?"))
+        self.assertIsNone(cache.lookup("idx", "ns", [1.0, 0.0], question="¿Qué regula el Decreto?"))
+        self.assertEqual(cache.lookup("idx", "ns", [0.999, 0.01], question="qué regula el decreto 1076"),
+                         "Decreto 1076: sector ambiente")
+        # a closer entry for another code does not hide the matching one
+        cache.store("idx", "ns", [0.999, 0.01], "Decreto 1077: sector vivienda",
+                    question="¿Qué regula el Decreto 1077?")
+        self.assertEqual(cache.lookup("idx", "ns", [0.999, 0.01], question="¿Qué regula el Decreto 1076?"),
+                         "Decreto 1076: sector ambiente")
+
+    def test_invalidate_drops_only_that_namespace(self):
+        cache = SemanticAnswerCache()
+        cache.store("idx", "ns", [1.0, 0.0], "a")
+        cache.store("idx", "other", [1.0, 0.0], "b")
+        cache.invalidate("idx", "ns")
+        self.assertIsNone(cache.lookup("idx", "ns", [1.0, 0.0]))
+        self.assertEqual(cache.lookup("idx", "other", [1.0, 0.0]), "b")
+
+    def test_answer_stored_during_a_write_does_not_survive_it(self):
+        cache = SemanticAnswerCache()
+        index = FakeIndex(dimension=2)
+        upsert = index.upsert
+
+        def answer_while_writing(**kwargs):
+            # a question answered from the old vectors while the upsert is in flight
+            cache.store("idx", "ns", [1.0, 0.0], "old answer")
+            return upsert(**kwargs)
+
+        index.upsert = answer_while_writing
+        with patch.object(processes, 'ensure_index', return_value=index), \
+                patch.object(processes, 'get_answer_cache', return_value=cache), \
+                patch.object(processes, 'get_lexical_index', return_value=LexicalIndex(":memory:")):
+            processes.pinecone_store_data([("d#1", [1.0, 0.0], {'text': "a"})], "idx", "ns", dimensions=2)
+        self.assertIsNone(cache.lookup("idx", "ns", [1.0, 0.0]))
+
+    def test_answer_retrieved_before_a_write_is_not_stored_after_it(self):
+        cache = SemanticAnswerCache()
+        index = FakeIndex(dimension=2)
+        retrieved = {}
+        upsert = index.upsert
+
+        def retrieve_while_writing(**kwargs):
+            # a question retrieves the old vectors while the upsert is in flight...
+            retrieved['retrieval'] = {'query_vector': [1.0, 0.0], 'scope': "", 'query': "pregunta",
+                                      'generation': cache.generation("idx", "ns")}
+            return upsert(**kwargs)
+
+        index.upsert = retrieve_while_writing
+        with patch.object(processes, 'ensure_index', return_value=index), \
+                patch.object(processes, 'get_answer_cache', return_value=cache), \
+                patch.object(processes, 'get_lexical_index', return_value=LexicalIndex(":memory:")):
+            processes.pinecone_store_data([("d#1", [1.0, 0.0], {'text': "a"})], "idx", "ns", dimensions=2)
+            # ...and its completion finishes after the write
+            processes.store_answer(retrieved['retrieval'], "idx", "ns", "old answer", seconds=1.0)
+        self.assertIsNone(cache.lookup("idx", "ns", [1.0, 0.0]))
+
+    def test_generation_changes_only_on_invalidate(self):
+        cache = SemanticAnswerCache()
+        generation = cache.generation("idx", "ns")
+        self.assertTrue(cache.store("idx", "ns", [1.0, 0.0], "a", generation=generation))
+        cache.invalidate("idx", "other")
+        self.assertTrue(cache.store("idx", "ns", [1.0, 0.0], "b", generation=generation))
+        cache.invalidate("idx", "ns")
+        self.assertFalse(cache.store("idx", "ns", [1.0, 0.0], "c", generation=generation))
+        self.assertIsNone(cache.lookup("idx", "ns", [1.0, 0.0]))
+
+    def test_ttl_and_size_eviction(self):
+        cache = SemanticAnswerCache(ttl=10, max_entries=2)
+        with patch('utils.answer_cache.time.monotonic', return_value=0):
+            cache.store("idx", "ns", [1.0, 0.0, 0.0], "a")
+        with patch('utils.answer_cache.time.monotonic', return_value=5):
+            cache.store("idx", "ns", [0.0, 1.0, 0.0], "b")
+            cache.store("idx", "ns", [0.0, 0.0, 1.0], "c")
+            self.assertIsNone(cache.lookup("idx", "ns", [1.0, 0.0, 0.0]))
+        with patch('utils.answer_cache.time.monotonic', return_value=20):
+            self.assertIsNone(cache.lookup("idx", "ns", [0.0, 1.0, 0.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
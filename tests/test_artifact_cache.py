@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+from utils import extraction
+from utils.artifact_cache import ArtifactCache, load_chunks, pdf_sha256
+from utils.extraction import get_chunks_with_pages, get_page_texts
+from utils.fakes import make_pdf
+
+
+def page_text(number):
+    return "\n".join(f"Articulo {number}.{line} texto de la pagina {number}" for line in range(30))
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "artifacts.sqlite")
+        self.cache = ArtifactCache(self.path, max_bytes=1024 * 1024)
+        self.pdf = make_pdf([page_text(n) for n in range(1, 6)])
+
+    def test_second_run_skips_extraction_and_splitting(self):
+        expected = get_chunks_with_pages(BytesIO(self.pdf), chunk_size=300, chunk_overlap=20,
+                                         processes=1, cache=self.cache)
+        # a restarted process opening the same file reuses the artifacts
+        reopened = ArtifactCache(self.path, max_bytes=1024 * 1024)
+        with mock.patch.object(extraction, 'iter_pdf_pages') as pages, \
+                mock.patch.object(extraction, 'split_pages_into_chunks') as split:
+            self.assertEqual(get_chunks_with_pages(self.pdf, chunk_size=300, chunk_overlap=20,
+                                                   cache=reopened), expected)
+            self.assertEqual(len(get_page_texts(BytesIO(self.pdf), cache=reopened)), 5)
+        pages.assert_not_called()
+        split.assert_not_called()
+
+    def test_new_splitter_parameters_reuse_pages(self):
+        get_chunks_with_pages(self.pdf, chunk_size=300, chunk_overlap=20, processes=1, cache=self.cache)
+        with mock.patch.object(extraction, 'iter_pdf_pages') as pages:
+            chunks, page_numbers = get_chunks_with_pages(self.pdf, chunk_size=500, chunk_overlap=50,
+                                                         cache=self.cache)
+        pages.assert_not_called()
+        self.assertEqual(len(chunks), len(page_numbers))
+        self.assertIn("pagina 5", chunks[-1])
+
+    def test_chunks_are_stored_as_spans(self):
+        chunks, _ = get_chunks_with_pages(self.pdf, chunk_size=300, chunk_overlap=20, processes=1,
+                                          cache=self.cache)
+        spans = self.cache.get(f"chunks:{pdf_sha256(self.pdf)}:300:20:v1")
+        self.assertTrue(all(len(span) == 3 for span in spans))
+        self.assertEqual(len(spans), len(chunks))
+
+    def test_least_recently_used_are_evicted(self):
+        cache = ArtifactCache(":memory:", max_bytes=1500)
+        for n in range(6):
+            cache.put(f"key{n}", os.urandom(400).hex())
+            if n:
+                cache.get("key0")
+        self.assertLessEqual(cache.total_bytes(), 1500)
+        self.assertIsNotNone(cache.get("key0"))
+        self.assertIsNone(cache.get("key1"))
+        # chunk spans whose pages were evicted are a miss, not an error
+        cache.put("chunks:abc:300:20:v1", [[1, 0, 10]])
+        self.assertIsNone(load_chunks(cache, "abc", 300, 20))
+
+
+if __name__ == '__main__':
+    unittest.main()
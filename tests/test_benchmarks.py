@@ -0,0 +1,42 @@
+import json
+import os
+import tempfile
+import unittest
+from benchmarks import hot_paths
+
+
+class TestHotPathBenchmarks(unittest.TestCase):
+    def test_suite_runs_offline_and_checks_its_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            self.assertEqual(hot_paths.main(["--sizes", "2", "--repeats", "1", "--baseline", baseline,
+                                             "--update-baseline"]), 0)
+            with open(baseline) as f:
+                recorded = json.load(f)
+            self.assertEqual(sorted(recorded['results']), [
+                "create_records_to_upsert/2p", "get_response/2p", "get_text_from_pdf/2p",
+                "pinecone_store_data/2p", "split_text_into_chunks/2p"])
+            self.assertGreater(recorded['results']["get_response/2p"]['chunks'], 0)
+
+            # a baseline far faster than this machine can run is reported as a regression
+            for reference in recorded['results'].values():
+                reference['median_s'] = 0.0
+            recorded['min_slack_s'] = 0.0
+            with open(baseline, 'w') as f:
+                json.dump(recorded, f)
+            self.assertEqual(hot_paths.main(["--sizes", "2", "--repeats", "1", "--baseline", baseline]), 1)
+
+    def test_thresholds(self):
+        baseline = {'tolerance': 0.5, 'min_slack_s': 0.005, 'results': {
+            'a': {'median_s': 0.100},
+            'b': {'median_s': 0.100, 'tolerance': 0.1},
+            'c': {'median_s': 0.001}}}
+        results = {'a': {'median_s': 0.140}, 'b': {'median_s': 0.140}, 'c': {'median_s': 0.004},
+                   'new': {'median_s': 9.0}}
+        regressions = hot_paths.compare(results, baseline)
+        self.assertEqual([r['name'] for r in regressions], ['b'])
+        self.assertAlmostEqual(regressions[0]['limit_s'], 0.110)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+import bulk_loader
+from utils import artifact_cache
+from utils.artifact_cache import ArtifactCache
+from bulk_loader import Checkpoint, load_dictionaries, run_pipeline, scan_directory
+from utils.fakes import FakeDynamoDB, FakeIndex, fake_embed, make_pdf
+
+
+class FakePool:
+    """
+    In-thread stand-in for the extraction pool; a job on `crash_path` breaks
+    the pool, failing every job submitted to it, as a dying worker does.
+    """
+    created = []
+
+    def __init__(self, crash_path=None, submit_error=None, **kwargs):
+        self.crash_path = crash_path
+        self.submit_error = submit_error
+        self.submitted = []
+        FakePool.created.append(self)
+
+    def submit(self, fn, path, *args):
+        if self.submit_error is not None:
+            raise self.submit_error
+        self.submitted.append(path)
+        pool = self
+
+        class LazyFuture(Future):
+            def result(self, timeout=None):
+                if pool.crash_path in pool.submitted:
+                    raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+                return fn(path, *args)
+        return LazyFuture()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class TestBulkLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # keep extraction artifacts away from the developer's .cache
+        patcher = mock.patch.object(artifact_cache, '_cache', ArtifactCache(":memory:", 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # spawned extraction workers start from a fresh import and only inherit the environment
+        patcher = mock.patch.dict(os.environ, {
+            'ARTIFACT_CACHE_PATH': os.path.join(self.tmp.name, "artifacts.sqlite")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for code in ("1076", "1077", "99"):
+            pages = [f"Articulo {p} del decreto {code} sobre el recurso hidrico\n" * 10
+                     for p in range(1, 4)]
+            with open(os.path.join(self.tmp.name, f"102#2015#{code}#108#1.pdf"), 'wb') as f:
+                f.write(make_pdf(pages))
+        self.dictionaries = load_dictionaries()
+        self.jobs = scan_directory(self.tmp.name, self.dictionaries)
+
+    def test_files_with_unknown_codes_are_skipped(self):
+        for name in ("999#2015#1#108#1.pdf", "102#2015#2#999#1.pdf", "102#2015#3#108#999.pdf",
+                     "102#año#4#108#1.pdf"):
+            with open(os.path.join(self.tmp.name, name), 'wb') as f:
+                f.write(make_pdf(["Articulo 1"]))
+        jobs = scan_directory(self.tmp.name, self.dictionaries)
+        self.assertEqual([job['metadata']['code'] for job in jobs], ["1076", "1077", "99"])
+
+    def run_loader(self, index, dynamodb, checkpoint, jobs=None):
+        return run_pipeline(
+            jobs=jobs or self.jobs, index=index, namespace="regulations",
+            embed_fn=lambda texts: fake_embed(texts, dimensions=16),
+            dynamodb=dynamodb, table_name="EnvRegDB", region="us-east-2",
+            bucket_name="bucket", dictionaries=self.dictionaries, checkpoint=checkpoint,
+            extract_workers=2, embed_workers=2, write_workers=2, queue_size=1,
+            catalog_batch_size=2)
+
+    def test_directory_names_map_to_metadata(self):
+        metadata = self.jobs[0]['metadata']
+        self.assertEqual((metadata['genre'], metadata['theme'], metadata['status']),
+                         ("Decreto", "Recurso Hídrico", "Activa"))
+
+    def test_pipeline_writes_vectors_and_catalog_and_resumes(self):
+        index, dynamodb = FakeIndex(dimension=16), FakeDynamoDB(unprocessed_rounds=1)
+        checkpoint = Checkpoint(os.path.join(self.tmp.name, "checkpoint.txt"))
+        stats = self.run_loader(index, dynamodb, checkpoint, jobs=self.jobs[:2])
+        self.assertEqual(stats['write'].documents, 2)
+        self.assertEqual(len(dynamodb.tables["EnvRegDB"]), 2)
+
+        resumed = Checkpoint(checkpoint.path)
+        stats = self.run_loader(index, dynamodb, resumed)
+        self.assertEqual(stats['extract'].documents, 1)
+        self.assertEqual(len(dynamodb.tables["EnvRegDB"]), 3)
+        chunks = {m['text'] for _, m in index.namespaces["regulations"].values()}
+        self.assertTrue(any("decreto 99" in c for c in chunks))
+
+    def test_extraction_pool_is_spawned(self):
+        with mock.patch.object(bulk_loader, 'ProcessPoolExecutor',
+                               wraps=bulk_loader.ProcessPoolExecutor) as pool:
+            stats = self.run_loader(FakeIndex(dimension=16), FakeDynamoDB(),
+                                    Checkpoint(os.path.join(self.tmp.name, "checkpoint.txt")))
+        # never fork while the embed and write threads run
+        self.assertEqual(pool.call_args.kwargs['mp_context'].get_start_method(), "spawn")
+        self.assertEqual(stats['write'].documents, 3)
+
+    def test_crashed_worker_fails_only_its_document(self):
+        crash_path = self.jobs[1]['path']
+        FakePool.created = []
+        with mock.patch.object(bulk_loader, 'ProcessPoolExecutor',
+                               lambda **kwargs: FakePool(crash_path=crash_path, **kwargs)):
+            stats = self.run_loader(FakeIndex(dimension=16), FakeDynamoDB(),
+                                    Checkpoint(os.path.join(self.tmp.name, "checkpoint.txt")))
+        self.assertEqual(stats['extract'].failures, 1)
+        self.assertEqual(stats['write'].documents, 2)
+        self.assertGreater(len(FakePool.created), 1)
+
+    def test_failing_feeder_does_not_hang_the_pipeline(self):
+        error = RuntimeError("cannot start workers")
+        with mock.patch.object(bulk_loader, 'ProcessPoolExecutor',
+                               lambda **kwargs: FakePool(submit_error=error, **kwargs)):
+            runner = threading.Thread(target=self.run_loader, daemon=True, args=(
+                FakeIndex(dimension=16), FakeDynamoDB(),
+                Checkpoint(os.path.join(self.tmp.name, "checkpoint.txt"))))
+            runner.start()
+            runner.join(timeout=30)
+        self.assertFalse(runner.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
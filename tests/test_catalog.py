@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+from utils import catalog
+from utils.catalog import (CatalogReader, batch_write_items, build_catalog_item, catalog_key,
+                           enrich_context, query_catalog)
+from utils.facets import load_facets
+from utils.fakes import FakeDynamoDB
+
+
+def regulation(code, theme="Recurso Hídrico", status="Activa"):
+    return {'genre': "Decreto", 'theme': theme, 'status': status, 'code': code,
+            'year': 2015, 'title': f"Decreto {code}"}
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.dictionaries = load_facets().dictionaries
+        self.dynamodb = FakeDynamoDB(page_size=2)
+        patcher = mock.patch.object(catalog.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def item(self, metadata):
+        return build_catalog_item(metadata, "us-east-2", "bucket", f"{metadata['code']}.pdf",
+                                  self.dictionaries['genre_dict'], self.dictionaries['status_dict'],
+                                  self.dictionaries['theme_dict'])
+
+    def key(self, metadata):
+        return catalog_key(metadata, self.dictionaries['genre_dict'], self.dictionaries['status_dict'],
+                           self.dictionaries['theme_dict'])
+
+    def test_batch_write_retries_unprocessed_with_backoff(self):
+        dynamodb = FakeDynamoDB(unprocessed_rounds=2)
+        items = [self.item(regulation(str(code))) for code in range(30)]
+        self.assertEqual(batch_write_items(dynamodb, "EnvRegDB", items), 30)
+        self.assertEqual(len(dynamodb.tables["EnvRegDB"]), 30)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.05, 0.1])
+
+        with self.assertRaises(RuntimeError):
+            batch_write_items(FakeDynamoDB(unprocessed_rounds=100), "EnvRegDB", items[:1])
+
+    def test_query_by_prefix_follows_pages(self):
+        batch_write_items(self.dynamodb, "EnvRegDB",
+                          [self.item(regulation(code)) for code in ("1076", "1077", "1078", "99")])
+        codes = [m['code'] for m in query_catalog(self.dynamodb, "EnvRegDB", "102", "107")]
+        self.assertEqual(codes, ["1076", "1077", "1078"])
+        self.assertEqual(len(query_catalog(self.dynamodb, "EnvRegDB", "102")), 4)
+
+    def test_reader_caches_reads_and_sees_its_writes(self):
+        reader = CatalogReader(self.dynamodb, "EnvRegDB", ttl=60)
+        first, second = regulation("1076"), regulation("1077")
+        reader.put_items([self.item(first)])
+        self.assertEqual(reader.get(*self.key(first))['url'], "https://bucket.s3.us-east-2.amazonaws.com/1076.pdf")
+        self.assertIsNone(reader.get(*self.key(second)))
+        self.assertEqual(len(reader.query("102", "107")), 1)
+        calls = self.dynamodb.read_calls
+        reader.get(*self.key(first))
+        reader.get(*self.key(second))
+        reader.query("102", "107")
+        self.assertEqual(self.dynamodb.read_calls, calls)
+
+        reader.put_items([self.item(second)])
+        self.assertEqual(reader.get(*self.key(second))['code'], "1077")
+        self.assertEqual(len(reader.query("102", "107")), 2)
+
+        expired = CatalogReader(self.dynamodb, "EnvRegDB", ttl=0)
+        expired.get(*self.key(first))
+        calls = self.dynamodb.read_calls
+        expired.get(*self.key(first))
+        self.assertEqual(self.dynamodb.read_calls, calls + 1)
+
+    def test_enrich_context_reads_catalog_once(self):
+        reader = CatalogReader(self.dynamodb, "EnvRegDB")
+        reader.put_items([self.item(regulation("1076")), self.item(regulation("1077"))])
+        matches = [{'id': f"{code}#{n}", 'score': 0.9,
+                    'metadata': dict(regulation(code), text=f"chunk {n}", title="chunk title")}
+                   for code in ("1076", "1077", "2000") for n in range(3)]
+        matches.append({'id': "loose", 'score': 0.1, 'metadata': {'text': "no regulation"}})
+        calls = self.dynamodb.read_calls
+        enriched = enrich_context({'namespace': "regulations", 'matches': matches}, reader, self.dictionaries)
+        self.assertEqual(self.dynamodb.read_calls, calls + 1)
+        by_id = {m['id']: m['metadata'] for m in enriched['matches']}
+        self.assertEqual(by_id["1077#2"]['url'], "https://bucket.s3.us-east-2.amazonaws.com/1077.pdf")
+        self.assertEqual(by_id["1077#2"]['title'], "chunk title")
+        self.assertNotIn('url', by_id["2000#0"])
+        self.assertEqual(by_id["loose"], {'text': "no regulation"})
+
+
+if __name__ == '__main__':
+    unittest.main()
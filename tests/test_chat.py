@@ -0,0 +1,115 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from utils import chat, tracing
+from utils.answer_cache import SemanticAnswerCache
+from utils.embedding_cache import EmbeddingCache
+from utils.lexical import LexicalIndex
+
+
+class FakeStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for piece in self.pieces:
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeEmbedder:
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return [[0.1] * self.dimensions for _ in texts]
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, pieces):
+        self.messages = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+        self.pieces = pieces
+
+    async def _complete(self, model, messages, stream):
+        self.messages = messages
+        return FakeStream(self.pieces)
+
+
+class TestStreamingResponse(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeAsyncOpenAI(["La ", "Ley ", None, "99."])
+        context = {'matches': [{'metadata': {'text': "Ley 99 de 1993"}}]}
+        self.embedder = FakeEmbedder(1536)
+        for target, value in (('utils.chat._get_client', lambda: self.client),
+                              ('utils.chat.warm_retriever', lambda index_name: True),
+                              ('utils.processes.pinecone_get_context', lambda **kwargs: context),
+                              ('utils.processes.get_embedder', lambda provider, dimensions: self.embedder),
+                              ('utils.processes.get_query_embedding_cache', lambda: self.cache),
+                              ('utils.processes.get_answer_cache', lambda: self.answers),
+                              ('utils.processes.get_lexical_index', lambda index_name: self.lexical)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = EmbeddingCache(normalize=True)
+        self.answers = SemanticAnswerCache()
+        self.lexical = LexicalIndex(":memory:")
+
+    def test_stream_yields_tokens_in_order(self):
+        pieces = list(chat.start_response_stream("¿Qué es la Ley 99?", "idx", "ns"))
+        self.assertEqual(pieces, ["La ", "Ley ", "99."])
+        self.assertIn("Ley 99 de 1993", self.client.messages[1]['content'])
+
+    def test_repeated_question_reuses_the_query_embedding(self):
+        list(chat.start_response_stream("¿Qué es la Ley 99?", "idx", "ns"))
+        list(chat.start_response_stream("¿qué es la ley 99?", "idx", "ns"))
+        self.assertEqual(self.embedder.calls, 1)
+
+    def test_similar_question_is_answered_from_the_cache(self):
+        first = "".join(chat.start_response_stream("¿Qué es la Ley 99?", "idx", "ns"))
+        with patch('utils.processes.pinecone_get_context', side_effect=AssertionError):
+            second = list(chat.start_response_stream("Qué es la ley 99", "idx", "ns"))
+        self.assertEqual(second, [first])
+        self.assertEqual(self.answers.stats()['hits'], 1)
+
+    def test_question_about_another_decree_is_not_answered_from_the_cache(self):
+        list(chat.start_response_stream("¿Qué regula el Decreto 1076?", "idx", "ns"))
+        list(chat.start_response_stream("¿Qué regula el Decreto 1077?", "idx", "ns"))
+        self.assertEqual(self.answers.stats()['hits'], 0)
+        self.assertIn("Decreto 1077", self.client.messages[1]['content'])
+
+    def test_code_lookup_skips_the_embedding(self):
+        self.lexical.add("ns", [
+            ("d-1076#a", None, {'genre': "Decreto", 'code': "1076", 'text': "Artículo 2.2.3.2.1 Uso del agua."}),
+            ("d-1076#b", None, {'genre': "Decreto", 'code': "1076", 'text': "Artículo 2.2.5.1 Emisiones."})])
+        with patch('utils.processes.pinecone_get_context', side_effect=AssertionError):
+            list(chat.start_response_stream("Decreto 1076 artículo 2.2.3", "idx", "ns"))
+        self.assertEqual(self.embedder.calls, 0)
+        self.assertIn("Uso del agua", self.client.messages[1]['content'])
+
+    def test_stream_is_traced_by_stage(self):
+        tracer = tracing.Tracer(log_path="", metrics_path="")
+        with patch.object(tracing, '_tracer', tracer):
+            list(chat.start_response_stream("¿Qué es la Ley 99?", "idx", "ns"))
+        trace = tracer.last("chat")
+        self.assertEqual(trace['attributes']['mode'], "stream")
+        self.assertEqual({child['name'] for child in trace['spans']},
+                         {"lexical_lookup", "embed_query", "answer_cache",
+                          "fuse_lexical", "resolve_context", "build_prompt", "completion"})
+        completion = trace['spans'][-1]['attributes']
+        self.assertIn('first_token_seconds', completion)
+        self.assertEqual(completion['response_bytes'], len("La Ley 99.".encode('utf-8')))
+
+    def test_errors_surface_in_the_consumer(self):
+        with patch('utils.processes.pinecone_get_context', side_effect=RuntimeError("down")):
+            with self.assertRaises(RuntimeError):
+                list(chat.start_response_stream("pregunta", "idx", "ns"))
+
+
+if __name__ == '__main__':
+    unittest.main()
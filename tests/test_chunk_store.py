@@ -0,0 +1,43 @@
+import json
+import unittest
+from utils.chunk_store import ChunkStore, resolve_context, slim_records
+from utils.processes import build_chat_messages, create_records_to_upsert
+
+METADATA = {"genre": "Ley", "status": "Activa", "dependency": "Congreso", "theme": "Generales",
+            "title": "Ley general ambiental", "code": "99", "year": 1993, "month": "Enero", "day": 1}
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ChunkStore(":memory:")
+        self.records = create_records_to_upsert(["agua potable", "suelo"], [[1, 0], [0, 1]],
+                                                 METADATA, pages=[1, 2])
+
+    def test_vectors_carry_only_key_and_filter_fields(self):
+        slim = slim_records(self.records, self.store)
+        metadata = slim[0][2]
+        self.assertEqual(set(metadata), {'genre', 'status', 'theme', 'year', 'dependency', 'doc', 'page'})
+        self.assertNotIn('text', metadata)
+        self.assertLess(len(json.dumps(metadata)), len(json.dumps(self.records[0][2])))
+        self.assertEqual([record[:2] for record in slim], [record[:2] for record in self.records])
+
+    def test_context_is_resolved_in_bulk(self):
+        slim = slim_records(self.records, self.store)
+        context = {'namespace': "ns", 'matches': [
+            {'id': slim[1][0], 'score': 0.9, 'metadata': slim[1][2]},
+            {'id': "legacy", 'score': 0.8, 'metadata': {'text': "vertimientos"}},
+            {'id': "unknown", 'score': 0.7, 'metadata': {'doc': "x"}}]}
+        resolved = resolve_context(context, self.store)
+        self.assertEqual([m['id'] for m in resolved['matches']], [slim[1][0], "legacy"])
+        self.assertEqual(resolved['matches'][0]['metadata'], {**METADATA, 'text': "suelo", 'page': 2})
+        self.assertIn("suelo", build_chat_messages("¿suelo?", resolved)[1]['content'])
+
+    def test_replace_drops_stale_chunks_of_the_regulation(self):
+        slim_records(self.records, self.store)
+        new = create_records_to_upsert(["agua potable"], [[1, 0]], METADATA, pages=[1])
+        slim_records(new, self.store, replace=True)
+        self.assertEqual(list(self.store.get_many([r[0] for r in self.records])), [new[0][0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
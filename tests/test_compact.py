@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from utils import processes
+from utils.compact import FullVectorStore, compact_query, compact_records, truncate_vectors
+from utils.fakes import FakeIndex
+from utils.lexical import LexicalIndex
+from utils.local_index import LocalIndex
+
+
+class TestCompactSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = FullVectorStore(os.path.join(self.tmp.name, "full.sqlite"))
+
+    def test_truncated_vectors_are_unit_length(self):
+        vectors = truncate_vectors([[3, 4, 12], [0, 0, 5]], 2)
+        np.testing.assert_allclose(vectors, [[0.6, 0.8], [0, 0]])
+
+    def test_store_replaces_stale_vectors_of_a_document(self):
+        self.store.put_many("ns", [("doc#1", [1, 0], None), ("doc#2", [0, 1], None),
+                                   ("other#1", [1, 1], None)])
+        self.store.put_many("ns", [("doc#2", [0.5, 0.5], None)], prefix="doc#")
+        found = self.store.get_many("ns", ["doc#1", "doc#2", "other#1"])
+        self.assertEqual(sorted(found), ["doc#2", "other#1"])
+        np.testing.assert_allclose(found["doc#2"], [0.5, 0.5])
+
+    def test_rerank_restores_the_full_precision_order(self):
+        # identical in the first two dimensions, told apart only by the rest
+        records = [("near", [1, 0, 0.9, 0], {'text': "near"}),
+                   ("far", [1, 0, -0.9, 0], {'text': "far"}),
+                   ("off", [0, 1, 0, 0], {'text': "off"})]
+        for quantization in (None, "int8"):
+            index = LocalIndex(os.path.join(self.tmp.name, str(quantization)), dimension=2,
+                               quantization=quantization)
+            index.upsert(compact_records(records, self.store, "ns", 2), namespace="ns")
+            results = compact_query(index, self.store, "ns", [1, 0, 1, 0], top_k=2,
+                                    dimensions=2, candidates=3)
+            self.assertEqual([m['id'] for m in results['matches']], ["near", "far"])
+            self.assertEqual(results['matches'][0]['metadata'], {'text': "near"})
+            self.assertGreater(results['matches'][0]['score'], results['matches'][1]['score'])
+
+    def test_store_and_query_paths_use_compact_mode(self):
+        index = FakeIndex(dimension=2)
+        with patch.object(processes, 'compact_enabled', return_value=True), \
+                patch.object(processes, 'SEARCH_DIMENSIONS', 2), \
+                patch.object(processes, 'get_full_vector_store', return_value=self.store), \
+                patch.object(processes, 'ensure_index', return_value=index) as ensure, \
+                patch.object(processes, 'get_index', return_value=index), \
+                patch.object(processes, 'index_is_ready', return_value=True), \
+                patch.object(processes, 'get_lexical_index', return_value=LexicalIndex(":memory:")):
+            processes.pinecone_store_data([("doc#1", [1, 0, 1], {'text': "a"}),
+                                           ("doc#2", [1, 0, -1], {'text': "b"})], "idx", "ns")
+            self.assertEqual(ensure.call_args.kwargs['dimensions'], 2)
+            self.assertEqual(len(index.fetch(["doc#1"], namespace="ns")['vectors']['doc#1']['values']), 2)
+            context = processes.pinecone_get_context("idx", "ns", [1, 0, -1], top_k=1)
+        self.assertEqual([m['id'] for m in context['matches']], ["doc#2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
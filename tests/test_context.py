@@ -0,0 +1,60 @@
+import unittest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.context import assemble_context
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def match(vector_id, text, score):
+    return {'id': vector_id, 'score': score, 'metadata': {'text': text}}
+
+
+class TestContextAssembly(unittest.TestCase):
+    def setUp(self):
+        text = " ".join(f"Artículo {n}. El titular del permiso debe reportar el vertimiento número {n} "
+                        f"a la autoridad ambiental competente." for n in range(1, 40))
+        splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=100)
+        self.chunks = splitter.split_text(text)
+
+    def test_overlapping_neighbours_are_stitched(self):
+        matches = [match(f"ley-1#{i}", chunk, 0.9 - i / 100) for i, chunk in enumerate(self.chunks[:3])]
+        result = assemble_context(matches, token_budget=10_000, count_tokens=count_words)
+        self.assertEqual(len(result['passages']), 1)
+        self.assertTrue(result['text'].startswith(self.chunks[0]))
+        self.assertTrue(result['text'].endswith(self.chunks[2]))
+        self.assertGreater(result['tokens_saved'], 0)
+
+    def test_chunks_of_other_regulations_are_not_stitched(self):
+        matches = [match("ley-1#a", self.chunks[0], 0.9), match("ley-2#b", self.chunks[1], 0.8)]
+        result = assemble_context(matches, token_budget=10_000, count_tokens=count_words)
+        self.assertEqual(result['passages'], [self.chunks[0], self.chunks[1]])
+
+    def test_near_duplicates_are_dropped(self):
+        matches = [match("a#1", self.chunks[4], 0.9), match("b#1", self.chunks[4] + " Fin.", 0.8),
+                   match("c#1", "Texto distinto sobre residuos sólidos y su disposición final.", 0.7)]
+        result = assemble_context(matches, token_budget=10_000, count_tokens=count_words)
+        self.assertEqual(len(result['passages']), 2)
+        self.assertEqual(result['passages'][0], self.chunks[4])
+
+    def test_budget_is_respected_best_first(self):
+        matches = [match(f"r{i}#1", chunk, i / 100) for i, chunk in enumerate(self.chunks[::3])]
+        result = assemble_context(matches, token_budget=120, count_tokens=count_words)
+        self.assertLessEqual(result['tokens'], 120)
+        self.assertEqual(result['passages'][0], matches[-1]['metadata']['text'])
+
+    def test_mmr_prefers_diverse_passages(self):
+        other = "Las licencias ambientales para minería requieren estudio de impacto ambiental previo."
+        similar = self.chunks[4][:200] + " y las demás obligaciones del permiso de vertimientos."
+        matches = [match("a#1", self.chunks[4], 0.9), match("b#1", similar, 0.89),
+                   match("c#1", other, 0.5)]
+        by_score = assemble_context(matches, token_budget=10_000, count_tokens=count_words)
+        self.assertEqual(by_score['passages'][1], similar)
+        diverse = assemble_context(matches, token_budget=10_000, mmr_lambda=0.3,
+                                   count_tokens=count_words)
+        self.assertEqual(diverse['passages'][1], other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from utils import embedders
+
+
+class TestEmbedderRegistry(unittest.TestCase):
+    def setUp(self):
+        embedders._embedders.clear()
+        self.addCleanup(embedders._embedders.clear)
+
+    @patch('langchain_openai.OpenAIEmbeddings')
+    def test_openai_client_is_built_once(self, mock_embeddings):
+        mock_embeddings.return_value.embed_documents.side_effect = \
+            lambda texts: [[float(len(t))] for t in texts]
+        first = embedders.get_embedder("openai")
+        second = embedders.get_embedder("openai", dimensions=1536)
+        self.assertIs(first, second)
+        mock_embeddings.assert_called_once()
+        self.assertEqual(first.embed(["a", "bb", "ccc"], batch_size=2), [[1.0], [2.0], [3.0]])
+        self.assertEqual(mock_embeddings.return_value.embed_documents.call_count, 2)
+
+    @patch('voyageai.Client')
+    def test_voyage_embeds_in_batches(self, mock_client):
+        mock_client.return_value.embed.side_effect = \
+            lambda texts, model, input_type: MagicMock(embeddings=[[1.0]] * len(texts))
+        embedder = embedders.get_embedder("voyage", batch_size=2)
+        self.assertEqual(len(embedder.embed(["a", "b", "c", "d", "e"])), 5)
+        self.assertEqual(mock_client.return_value.embed.call_count, 3)
+        self.assertIs(embedder, embedders.get_embedder("voyage", batch_size=2))
+
+    def test_fixed_size_models_ignore_the_requested_dimensions(self):
+        class FixedSize:
+            provider = "fixed"
+
+            def __init__(self, model="m", dimensions=None, batch_size=8):
+                self.dimensions = dimensions or 384
+
+        with patch.dict(embedders.PROVIDERS, {'fixed': FixedSize}):
+            warmed = embedders.get_embedder("fixed")
+            self.assertIs(embedders.get_embedder("fixed", dimensions=384), warmed)
+        self.assertEqual(len(embedders._embedders), 1)
+
+    def test_unknown_provider_is_rejected(self):
+        with self.assertRaises(ValueError):
+            embedders.get_embedder("cohere")
+
+
+if __name__ == '__main__':
+    unittest.main()
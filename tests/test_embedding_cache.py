@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from utils.embedding_cache import EmbeddingCache, embed_with_cache
+
+MODEL = "text-embedding-3-small"
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_normalized_queries_share_an_entry(self):
+        cache = EmbeddingCache(normalize=True)
+        cache.put("¿Qué dice la Ley 99?", MODEL, 1536, [0.1, 0.2])
+        self.assertEqual(cache.get("  ¿qué dice la  ley 99? ", MODEL, 1536), [0.1, 0.2])
+        self.assertIsNone(cache.get("¿Qué dice la Ley 99?", MODEL, 512))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = EmbeddingCache(max_memory_entries=2)
+        cache.put("a", MODEL, 2, [1.0, 0.0])
+        cache.put("b", MODEL, 2, [0.0, 1.0])
+        cache.get("a", MODEL, 2)
+        cache.put("c", MODEL, 2, [1.0, 1.0])
+        self.assertIsNotNone(cache.get("a", MODEL, 2))
+        self.assertIsNone(cache.get("b", MODEL, 2))
+
+    def test_disk_tier_survives_a_new_instance_and_is_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "embeddings.sqlite")
+            cache = EmbeddingCache(path=path, max_disk_entries=2)
+            cache.put_many(["a", "b", "c"], MODEL, 2,
+                           [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]])
+            self.assertEqual(cache.stats()['disk_entries'], 2)
+
+            reopened = EmbeddingCache(path=path)
+            self.assertEqual(reopened.get("c", MODEL, 2), [0.5, 0.5])
+            self.assertEqual(reopened.stats()['disk_hits'], 1)
+
+
+class TestEmbedWithCache(unittest.TestCase):
+    def test_only_misses_reach_the_embedder(self):
+        cache = EmbeddingCache()
+        calls = []
+
+        def embed(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        vectors, saved = embed_with_cache(cache, ["ab", "c"], MODEL, 1, embed)
+        self.assertEqual((vectors, saved), ([[2.0], [1.0]], 0))
+
+        vectors, saved = embed_with_cache(cache, ["c", "def", "ab", "def"], MODEL, 1, embed)
+        self.assertEqual(vectors, [[1.0], [3.0], [2.0], [3.0]])
+        self.assertEqual(saved, 2)
+        self.assertEqual(calls, [["ab", "c"], ["def"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from io import BytesIO
+from unittest import mock
+from utils import artifact_cache, extraction
+from utils.artifact_cache import ArtifactCache
+from utils.extraction import get_chunks_with_pages, iter_pdf_pages
+from utils.fakes import make_pdf
+
+
+def page_text(number):
+    return "\n".join(f"Articulo {number}.{line} texto de la pagina {number}"
+                     for line in range(30))
+
+
+class TestExtraction(unittest.TestCase):
+    def setUp(self):
+        # keep extraction artifacts away from the developer's .cache
+        patcher = mock.patch.object(artifact_cache, '_cache', ArtifactCache(":memory:", 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pdf = make_pdf([page_text(n) for n in range(1, 13)])
+
+    def test_pool_and_sequential_extraction_match(self):
+        sequential = list(iter_pdf_pages(BytesIO(self.pdf), processes=1))
+        with mock.patch.object(extraction, 'ProcessPoolExecutor',
+                               wraps=extraction.ProcessPoolExecutor) as pool:
+            pooled = list(iter_pdf_pages(BytesIO(self.pdf), processes=2,
+                                         pool_min_pages=1, pages_per_task=3))
+        # never fork the threaded caller
+        self.assertEqual(pool.call_args.kwargs['mp_context'].get_start_method(), "spawn")
+        self.assertEqual(sequential, pooled)
+        self.assertEqual([n for n, _ in pooled], list(range(1, 13)))
+        self.assertIn("Articulo 7.0", pooled[6][1])
+
+    def test_chunks_keep_their_page_number(self):
+        chunks, pages = get_chunks_with_pages(BytesIO(self.pdf), chunk_size=300,
+                                              chunk_overlap=20, processes=1)
+        self.assertEqual(len(chunks), len(pages))
+        self.assertEqual(pages, sorted(pages))
+        for chunk, page in zip(chunks, pages):
+            self.assertIn(f"pagina {page}", chunk)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from utils.answer_cache import SemanticAnswerCache
+from utils.facets import filter_key, load_facets, matches_filter
+from utils.fakes import FakeIndex
+from utils.lexical import LexicalIndex
+from utils.local_index import LocalIndex
+
+AGUA = {'genre': "Decreto", 'theme': "Recurso Hídrico", 'status': "Activa", 'year': 2015,
+        'dependency': "Ministerio de Ambiente", 'text': "Concesiones de aguas superficiales"}
+AIRE = {'genre': "Resolución", 'theme': "Recurso Atmosférico", 'status': "Derogada totalmente",
+        'year': 1995, 'dependency': "Ministerio de Ambiente", 'text': "Emisiones de fuentes fijas"}
+
+
+class TestFacets(unittest.TestCase):
+    def setUp(self):
+        self.facets = load_facets()
+
+    def test_vocabularies_are_loaded_once(self):
+        self.assertIs(load_facets(), self.facets)
+        self.assertIn("Recurso Hídrico", self.facets.themes)
+        self.assertIn("Activa", self.facets.statuses)
+
+    def test_build_filter(self):
+        self.assertIsNone(self.facets.build_filter(
+            year_range=(self.facets.min_year, self.facets.max_year)))
+        self.assertEqual(self.facets.build_filter(statuses=["Activa"]), {'status': {'$in': ["Activa"]}})
+        query_filter = self.facets.build_filter(themes=["Recurso Hídrico"], statuses=["Activa"],
+                                                year_range=(2000, 2020), dependency=" Ministerio de Ambiente ")
+        self.assertEqual(len(query_filter['$and']), 4)
+        self.assertTrue(matches_filter(AGUA, query_filter))
+        self.assertFalse(matches_filter(AIRE, query_filter))
+        with self.assertRaises(ValueError):
+            self.facets.build_filter(genres=["Tratado"])
+
+    def test_operators(self):
+        self.assertTrue(matches_filter(AGUA, {'$or': [{'year': {'$lt': 2000}}, {'genre': "Decreto"}]}))
+        self.assertFalse(matches_filter(AGUA, {'status': {'$nin': ["Activa"]}}))
+        self.assertFalse(matches_filter({}, {'year': {'$gte': 2000}}))
+
+    def test_indexes_apply_the_filter(self):
+        query_filter = self.facets.build_filter(statuses=["Activa"])
+        with tempfile.TemporaryDirectory() as tmp:
+            local = LocalIndex(tmp, dimension=2)
+            fake = FakeIndex(dimension=2)
+            for index in (local, fake):
+                index.upsert([("agua", [0, 1], AGUA), ("aire", [1, 0], AIRE)], namespace="ns")
+                matches = index.query(vector=[1, 0], top_k=2, namespace="ns", filter=query_filter)['matches']
+                self.assertEqual([m['id'] for m in matches], ["agua"])
+            local.upsert([("aire", [1, 0], dict(AIRE, status="Activa"))], namespace="ns")
+            matches = local.query(vector=[1, 0], top_k=1, namespace="ns", filter=query_filter)['matches']
+            self.assertEqual(matches[0]['id'], "aire")
+            lexical = LexicalIndex(os.path.join(tmp, "lexical.sqlite"))
+            lexical.add("ns", [("agua", None, AGUA), ("aire", None, AIRE)])
+            self.assertEqual([m['id'] for m in lexical.search("fuentes aguas", "ns", filter=query_filter)],
+                             ["agua"])
+
+    def test_answers_are_cached_per_filter(self):
+        cache = SemanticAnswerCache()
+        scope = filter_key(self.facets.build_filter(statuses=["Activa"]))
+        cache.store("idx", "ns", [1, 0], "solo vigentes", scope=scope)
+        self.assertIsNone(cache.lookup("idx", "ns", [1, 0]))
+        self.assertEqual(cache.lookup("idx", "ns", [1, 0], scope=scope), "solo vigentes")
+        cache.invalidate("idx", "ns")
+        self.assertIsNone(cache.lookup("idx", "ns", [1, 0], scope=scope))
+
+
+if __name__ == '__main__':
+    unittest.main()
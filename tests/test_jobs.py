@@ -0,0 +1,149 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from streamlit.testing.v1 import AppTest
+from utils import extraction, jobs, processes
+from utils.fakes import make_pdf
+from utils.jobs import JobQueue, stage_fraction, submit_ingest
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "jobs.sqlite")
+        self.uploads = os.path.join(self.tmp.name, "uploads")
+
+    def queue(self, runner, workers=2):
+        queue = JobQueue(self.path, self.uploads, workers=workers, runners={'ingest': runner})
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_job_reports_every_stage(self):
+        def runner(params, pdf_path, progress):
+            with open(pdf_path, 'rb') as f:
+                self.assertEqual(f.read(), b"%PDF")
+            for count, stage in enumerate(('extracted', 'chunked', 'embedded', 'upserted'), start=1):
+                progress(stage, count * params['n'])
+            return {'chunks': params['n']}
+
+        queue = self.queue(runner)
+        job_id = queue.submit('ingest', {'n': 2}, b"%PDF", name="decreto.pdf")
+        job = queue.wait(job_id, timeout=5)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['progress'], {'extracted': 2, 'chunked': 4, 'embedded': 6, 'upserted': 8})
+        self.assertEqual(job['result'], {'chunks': 2})
+        self.assertEqual(stage_fraction(job), 1.0)
+        # the PDF is only kept until its job succeeds
+        self.assertEqual(os.listdir(self.uploads), [])
+
+    def test_failed_job_can_be_retried(self):
+        attempts = []
+
+        def runner(params, pdf_path, progress):
+            attempts.append(pdf_path)
+            progress('extracted', 1)
+            if len(attempts) == 1:
+                raise RuntimeError("embedding service unavailable")
+            progress('chunked', 3)
+
+        queue = self.queue(runner)
+        job_id = queue.submit('ingest', {}, b"%PDF")
+        job = queue.wait(job_id, timeout=5)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], "embedding service unavailable")
+        self.assertEqual(stage_fraction(job), 0.25)
+        self.assertTrue(os.path.exists(attempts[0]))
+
+        self.assertTrue(queue.retry(job_id))
+        self.assertEqual(queue.wait(job_id, timeout=5)['status'], 'done')
+        self.assertFalse(queue.retry(job_id))
+
+    def test_interrupted_jobs_are_queued_again(self):
+        release = threading.Event()
+        queue = self.queue(lambda params, pdf_path, progress: release.wait(5), workers=1)
+        job_id = queue.submit('ingest', {}, b"%PDF")
+        while queue.get(job_id)['status'] != 'running':
+            pass
+        # a new process opening the same file finds the job it never finished
+        done = []
+        restarted = self.queue(lambda params, pdf_path, progress: done.append(pdf_path))
+        self.assertEqual(restarted.wait(job_id, timeout=5)['status'], 'done')
+        self.assertEqual(len(done), 1)
+        release.set()
+
+    def test_concurrency_is_capped(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def runner(params, pdf_path, progress):
+            with lock:
+                running.append(pdf_path)
+                peak.append(len(running))
+            threading.Event().wait(0.05)
+            with lock:
+                running.remove(pdf_path)
+
+        queue = self.queue(runner, workers=3)
+        job_ids = [queue.submit('ingest', {}, b"%PDF") for _ in range(9)]
+        for job_id in job_ids:
+            self.assertEqual(queue.wait(job_id, timeout=5)['status'], 'done')
+        self.assertEqual(max(peak), 3)
+        self.assertEqual(len(queue.list()), 9)
+
+    def test_submit_ingest_runs_every_stage_once(self):
+        pdf = make_pdf([f"Articulo {n}. Texto de la pagina {n}." for n in range(1, 4)])
+        queue = JobQueue(self.path, self.uploads, workers=1)
+        self.addCleanup(queue.close)
+        report = {'upserted': 3}
+        # with the artifact cache off the PDF is still extracted only once
+        with mock.patch.object(extraction, 'get_artifact_cache', return_value=None), \
+                mock.patch.object(extraction, 'iter_pdf_pages', wraps=extraction.iter_pdf_pages) as pages, \
+                mock.patch.object(processes, 'embed_chunks', side_effect=lambda chunks, **kw: [[0.1]] * len(chunks)), \
+                mock.patch.object(processes, 'pinecone_store_data', return_value=report) as store:
+            job_id = submit_ingest(pdf, "index", "regulations", {'code': "1076"}, name="1076.pdf",
+                                   queue=queue)
+            job = queue.wait(job_id, timeout=10)
+        self.assertEqual(job['status'], 'done', job['error'])
+        self.assertEqual(job['progress'], {'extracted': 3, 'chunked': 3, 'embedded': 3, 'upserted': 3})
+        self.assertEqual(pages.call_count, 1)
+        self.assertEqual(store.call_args.kwargs['namespace'], "regulations")
+        self.assertTrue(store.call_args.kwargs['incremental'])
+
+
+class TestUploadPage(unittest.TestCase):
+    def test_active_job_progress_refreshes_without_blocking_the_page(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        release, started = threading.Event(), threading.Event()
+
+        def runner(params, pdf_path, progress):
+            progress('extracted', 3)
+            started.set()
+            release.wait(10)
+
+        queue = JobQueue(os.path.join(tmp.name, "jobs.sqlite"), os.path.join(tmp.name, "uploads"),
+                         runners={'ingest': runner})
+        self.addCleanup(queue.close)
+        self.addCleanup(release.set)
+        job_id = queue.submit('ingest', {}, b"%PDF", name="decreto.pdf")
+        self.assertTrue(started.wait(5))
+        # a page that slept for its poll interval would not finish within the test timeout
+        with mock.patch.object(jobs, '_queue', queue), mock.patch.object(jobs, 'JOB_POLL_SECONDS', 30):
+            app = AppTest.from_file("pages/1_Upload Regulations.py", default_timeout=10)
+            app.session_state["ingest_jobs"] = [job_id]
+            began = time.perf_counter()
+            app.run()
+        self.assertFalse(app.exception)
+        self.assertLess(time.perf_counter() - began, 10)
+        self.assertEqual(queue.get(job_id)['status'], 'running')
+        self.assertTrue(any("decreto.pdf - running" in str(element.proto)
+                            for element in app.tabs[3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
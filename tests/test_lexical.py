@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+import unittest
+from utils.lexical import (LexicalIndex, code_tokens, is_code_lookup, reciprocal_rank_fusion,
+                           tokenize)
+
+
+def record(vector_id, text):
+    return (vector_id, None, {'text': text, 'code': "1076"})
+
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "idx.sqlite")
+        self.index = LexicalIndex(self.path)
+        self.index.add("ns", [
+            record("d-1076#a", "Artículo 2.2.3.2.1. Concesiones de aguas superficiales."),
+            record("d-1076#b", "Artículo 2.2.5.1.1. Emisiones atmosféricas de fuentes fijas."),
+            record("l-99#a", "Ley 99 de 1993, por la cual se crea el Ministerio del Medio Ambiente."),
+        ], prefix=None)
+
+    def test_tokens_keep_codes_and_their_prefixes(self):
+        self.assertEqual(tokenize("Artículo 2.2.3 del Decreto"), ["articulo", "2.2", "2.2.3", "decreto"])
+
+    def test_code_lookups_are_recognized(self):
+        self.assertTrue(is_code_lookup("Decreto 1076 artículo 2.2.3"))
+        self.assertTrue(is_code_lookup("ley 99"))
+        self.assertFalse(is_code_lookup("¿Qué dice la ley 99 sobre las licencias ambientales?"))
+        self.assertFalse(is_code_lookup("licencias ambientales"))
+        self.assertEqual(code_tokens("Decreto 1076 art 2.2.3"), {"1076", "2.2", "2.2.3"})
+
+    def test_bm25_ranks_the_article(self):
+        matches = self.index.search("artículo 2.2.3", "ns", top_k=2)
+        self.assertEqual(matches[0]['id'], "d-1076#a")
+        self.assertIn("Concesiones", matches[0]['metadata']['text'])
+        self.assertEqual(self.index.search("artículo 2.2.3", "other"), [])
+
+    def test_incremental_replace_and_persistence(self):
+        self.index.add("ns", [record("d-1076#c", "Artículo 2.2.3.2.1. Concesiones reformadas.")],
+                       prefix="d-1076#")
+        reopened = LexicalIndex(self.path)
+        self.assertEqual([m['id'] for m in reopened.search("concesiones emisiones", "ns")], ["d-1076#c"])
+        reopened.delete_namespace("ns")
+        self.assertEqual(reopened.search("ley", "ns"), [])
+
+    def test_lookup_takes_microseconds_once_loaded(self):
+        self.index.add("big", [record(f"d#{i}", f"Artículo {i}.1 texto de la norma número {i}")
+                               for i in range(5000)])
+        self.index.search("artículo 42", "big")
+        started = time.perf_counter()
+        self.index.search("artículo 4242.1", "big", top_k=5)
+        self.assertLess(time.perf_counter() - started, 0.05)
+
+    def test_reciprocal_rank_fusion(self):
+        vector = [{'id': "a", 'metadata': {'doc': "x"}}, {'id': "b", 'metadata': {}}]
+        lexical = [{'id': "b", 'metadata': {'text': "B"}}, {'id': "c", 'metadata': {'text': "C"}}]
+        fused = reciprocal_rank_fusion([vector, lexical], top_k=3)
+        self.assertEqual([m['id'] for m in fused], ["b", "a", "c"])
+        self.assertEqual(fused[0]['metadata'], {'text': "B"})
+
+
+if __name__ == '__main__':
+    unittest.main()
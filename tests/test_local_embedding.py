@@ -0,0 +1,54 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import numpy as np
+from utils import local_embedding
+
+
+class LengthModel:
+    """Encodes a text as [len, 1], so output order can be checked."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size, normalize_embeddings, **kwargs):
+        self.batches.append([len(t) for t in texts])
+        vectors = np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class TestParallelEmbedder(unittest.TestCase):
+    def setUp(self):
+        self.model = LengthModel()
+        patcher = patch.object(local_embedding, '_worker_model', self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_embedder(self, **options):
+        with patch.object(local_embedding, 'ProcessPoolExecutor',
+                          lambda **kwargs: ThreadPoolExecutor(max_workers=2)):
+            embedder = local_embedding.ParallelSentenceTransformerEmbedder(processes=2, **options)
+        self.addCleanup(embedder.close)
+        return embedder
+
+    def test_vectors_come_back_in_input_order(self):
+        texts = ["a" * n for n in (3, 10, 1, 7, 5)]
+        with patch.object(local_embedding, 'TEXTS_PER_TASK', 2):
+            vectors = self.make_embedder(normalize=False).encode(texts)
+        self.assertEqual(vectors[:, 0].tolist(), [3, 10, 1, 7, 5])
+        # inputs are grouped longest first so each batch pads to similar lengths
+        self.assertEqual(self.model.batches, [[10, 7], [5, 3], [1]])
+
+    def test_normalized_float16_output_and_stats(self):
+        embedder = self.make_embedder(half=True)
+        vectors = embedder.encode(["uno", "dos tres"])
+        self.assertEqual(vectors.dtype, np.float16)
+        np.testing.assert_allclose(np.linalg.norm(vectors.astype(np.float32), axis=1), 1.0, rtol=1e-3)
+        self.assertEqual(embedder.stats()['chunks'], 2)
+        self.assertEqual(embedder.dimensions, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
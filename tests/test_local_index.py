@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+from utils.local_index import LocalIndex
+from utils.reindex import reindex_document
+from utils.upsert import upsert_records
+
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_query_returns_nearest_with_metadata(self):
+        index = LocalIndex(self.tmp.name, dimension=3)
+        index.upsert([("a", [1, 0, 0], {'text': "agua"}),
+                      ("b", [0, 1, 0], {'text': "suelo"}),
+                      ("c", [0.9, 0.1, 0], {'text': "vertimientos"})], namespace="ns")
+        result = index.query(vector=[1, 0, 0], top_k=2, namespace="ns")
+        self.assertEqual([m['id'] for m in result['matches']], ["a", "c"])
+        self.assertEqual(result['matches'][0]['metadata'], {'text': "agua"})
+        self.assertAlmostEqual(result['matches'][0]['score'], 1.0, places=5)
+
+    def test_persistence_deletes_and_namespaces(self):
+        index = LocalIndex(self.tmp.name, dimension=2)
+        index.upsert([("a", [1, 0], {}), ("b", [0, 1], {})], namespace="ns")
+        index.upsert([("a", [1, 1], {})], namespace="other")
+        index.delete(ids=["a"], namespace="ns")
+
+        reopened = LocalIndex(self.tmp.name)
+        self.assertEqual(reopened.dimension, 2)
+        stats = reopened.describe_index_stats()
+        self.assertEqual(stats['namespaces'], {"ns": {'vector_count': 1},
+                                               "other": {'vector_count': 1}})
+        self.assertEqual(reopened.query(vector=[1, 0], top_k=5, namespace="ns")['matches'][0]['id'], "b")
+        reopened.delete(delete_all=True, namespace="other")
+        self.assertNotIn("other", reopened.describe_index_stats()['namespaces'])
+
+    def test_works_with_upsert_engine_and_reindex(self):
+        index = LocalIndex(self.tmp.name, dimension=4)
+        records = [(f"doc#{i}", np.random.rand(4).tolist(), {'text': str(i)}) for i in range(3000)]
+        report = upsert_records(index, records, namespace="ns", poll_interval=0)
+        self.assertTrue(report['confirmed'])
+        report = reindex_document(index, "ns", records[:2000], prefix="doc#", poll_interval=0)
+        self.assertEqual((report['upserted'], report['deleted']), (0, 1000))
+        self.assertEqual(index.describe_index_stats()['total_vector_count'], 2000)
+
+    def test_query_latency_on_tens_of_thousands_of_chunks(self):
+        index = LocalIndex(self.tmp.name, dimension=384)
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((20000, 384), dtype=np.float32)
+        index.upsert([(str(i), v, None) for i, v in enumerate(vectors)], namespace="ns")
+        started = time.perf_counter()
+        for _ in range(20):
+            index.query(vector=vectors[7], top_k=10, namespace="ns", include_metadata=False)
+        per_query = (time.perf_counter() - started) / 20
+        self.assertLess(per_query, 0.05)
+
+    def test_int8_index_keeps_ranking_and_persists(self):
+        index = LocalIndex(self.tmp.name, dimension=3, quantization="int8")
+        index.upsert([("a", [0.9, 0.1, 0], {}), ("b", [0, 1, 0], {}), ("c", [0.5, 0.5, 0.1], {})],
+                     namespace="ns")
+        reopened = LocalIndex(self.tmp.name)
+        self.assertEqual(reopened.quantization, "int8")
+        self.assertEqual(os.path.getsize(os.path.join(self.tmp.name, "ns", "vectors.i8")), 1024 * 3)
+        result = reopened.query(vector=[1, 0, 0], top_k=3, namespace="ns")
+        self.assertEqual([m['id'] for m in result['matches']], ["a", "c", "b"])
+        values = reopened.fetch(["a"], namespace="ns")['vectors']['a']['values']
+        np.testing.assert_allclose(values, [0.9, 0.1, 0], atol=0.01)
+
+    def test_rows_are_stored_normalized_and_fetched_as_written(self):
+        index = LocalIndex(self.tmp.name, dimension=2)
+        index.upsert([("a", [3.0, 4.0], {}), ("z", [0.0, 0.0], {})], namespace="ns")
+        ns = index._namespace("ns")
+        np.testing.assert_allclose(ns.matrix[ns.slots["a"]], [0.6, 0.8], rtol=1e-6)
+        vectors = index.fetch(["a", "z"], namespace="ns")['vectors']
+        np.testing.assert_allclose(vectors['a']['values'], [3.0, 4.0], rtol=1e-6)
+        self.assertEqual(vectors['z']['values'], [0.0, 0.0])
+
+    def test_index_written_with_raw_rows_is_normalized_on_open(self):
+        index = LocalIndex(self.tmp.name, dimension=2)
+        index.upsert([("a", [3.0, 4.0], {}), ("b", [0.0, 2.0], {})], namespace="ns")
+        ns = index._namespace("ns")
+        # the layout before rows were normalized: raw values and no norms file
+        ns.matrix[ns.slots["a"]] = [3.0, 4.0]
+        ns.matrix[ns.slots["b"]] = [0.0, 2.0]
+        ns.matrix.flush()
+        os.remove(ns.norms_path)
+
+        reopened = LocalIndex(self.tmp.name)
+        result = reopened.query(vector=[0, 1], top_k=2, namespace="ns")
+        self.assertEqual([m['id'] for m in result['matches']], ["b", "a"])
+        self.assertAlmostEqual(result['matches'][1]['score'], 0.8, places=5)
+        np.testing.assert_allclose(reopened.fetch(["a"], namespace="ns")['vectors']['a']['values'],
+                                   [3.0, 4.0], rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
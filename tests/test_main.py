@@ -1,21 +1,41 @@
 import unittest
 from unittest.mock import patch
-import app
+from streamlit.testing.v1 import AppTest
+from utils import tracing
 
 
 class TestMainApp(unittest.TestCase):
-    @patch('main.prepare_data')  # Mock the prepare_data function
-    # Mock the Streamlit button in the sidebar
-    @patch('streamlit.sidebar.button')
-    def test_prepare_data_button(self, mock_button, mock_prepare_data):
-        # Simulate button click
-        mock_button.return_value = True  # Simulate the button being clicked
+    @patch('utils.embedders.warm_up_embedders', lambda: [])
+    @patch('data_processor.start_response_stream')
+    def test_question_is_answered_with_the_sidebar_settings(self, mock_stream):
+        mock_stream.return_value = iter(["La Ley 99 ", "creó el Ministerio."])
+        app = AppTest.from_file("app.py", default_timeout=30).run()
+        self.assertFalse(app.exception)
+        mock_stream.assert_not_called()
 
-        # Run the app function to test the button click handling
-        app.run_chat()  # Assuming this is where your button click is handled
+        app.chat_input[0].set_value("¿Qué es la Ley 99?").run()
+        self.assertFalse(app.exception)
+        mock_stream.assert_called_once_with(query="¿Qué es la Ley 99?", index_name="col-ambiente",
+                                            namespace="regulations", filter=None)
+        self.assertEqual(len(app.session_state["chat_history"]), 2)
+        self.assertEqual(app.session_state["chat_history"][1].content, "La Ley 99 creó el Ministerio.")
 
-        # Check if prepare_data was called as a result
-        mock_prepare_data.assert_called_once()
+    @patch('utils.embedders.warm_up_embedders', lambda: [])
+    def test_latency_panel_shows_the_last_request(self):
+        tracer = tracing.Tracer(log_path="", metrics_path="")
+        with tracer.span("chat", mode="sync"):
+            with tracer.span("embed_query"):
+                pass
+        with patch.object(tracing, '_tracer', tracer):
+            app = AppTest.from_file("app.py", default_timeout=30).run()
+            self.assertFalse(app.exception)
+            self.assertFalse(app.sidebar.subheader[1:])
+            app.sidebar.toggle[0].set_value(True).run()
+        self.assertFalse(app.exception)
+        self.assertEqual(app.sidebar.subheader[-1].value, "Latency")
+        tables = [markdown.value for markdown in app.sidebar.markdown]
+        self.assertIn("embed_query", tables[-2])
+        self.assertIn("| total |", tables[-1])
 
 
 if __name__ == '__main__':
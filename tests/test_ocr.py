@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+from utils import processes
+from utils.fakes import FakeS3, FakeTextract, make_pdf
+from utils.ocr import OcrStage, PageCache, pdf_sha256
+
+
+def scan(code, pages=3):
+    return make_pdf([f"Decreto {code}\nPagina {page}" for page in range(1, pages + 1)])
+
+
+class TestOcrStage(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        self.cache = PageCache(":memory:")
+
+    def stage(self, textract, max_jobs=2, job_timeout=None):
+        return OcrStage(textract, self.s3, "bucket", self.cache, max_jobs=max_jobs, poll_seconds=0,
+                        job_timeout=job_timeout)
+
+    def test_jobs_run_concurrently_and_results_are_cached(self):
+        textract = FakeTextract(self.s3, polls_in_progress=2, blocks_per_response=3)
+        pdfs = [scan(code) for code in ("1076", "1077", "1078", "1079", "1080")]
+        results = self.stage(textract).run(pdfs + [pdfs[0]])
+        self.assertEqual(results[2]['pages'], ["Decreto 1078\nPagina 1", "Decreto 1078\nPagina 2",
+                                               "Decreto 1078\nPagina 3"])
+        self.assertEqual(results[5], results[0])
+        self.assertEqual(textract.calls['start_document_text_detection'], 5)
+        self.assertEqual(textract.max_running, 2)
+        self.assertTrue(all(not result['missing'] for result in results))
+
+        again = FakeTextract(self.s3)
+        results = self.stage(again).run(pdfs[:2])
+        self.assertEqual(again.calls, {})
+        self.assertEqual([result['cached'] for result in results], [3, 3])
+        # staged PDFs are kept under their hash and not uploaded twice
+        self.assertEqual(self.s3.calls['put_object'], 5)
+
+    def test_throttled_starts_wait_for_a_free_slot(self):
+        textract = FakeTextract(self.s3, polls_in_progress=1, max_jobs=1)
+        results = self.stage(textract, max_jobs=3).run([scan("1"), scan("2"), scan("3")])
+        self.assertEqual([r['pages'][0] for r in results], ["Decreto 1\nPagina 1", "Decreto 2\nPagina 1",
+                                                            "Decreto 3\nPagina 1"])
+        self.assertEqual(textract.max_running, 1)
+
+    def test_only_missing_pages_are_retried(self):
+        textract = FakeTextract(self.s3, drop_pages={2})
+        pdf = scan("1076")
+        result = self.stage(textract).run([pdf])[0]
+        self.assertEqual(result['pages'][1], "Decreto 1076\nPagina 2")
+        self.assertEqual(textract.calls['detect_document_text'], 1)
+
+        partial = scan("2000", pages=4)
+        self.cache.put_pages(pdf_sha256(partial), {1: "cached one", 4: "cached four"})
+        retry = FakeTextract(self.s3)
+        result = self.stage(retry).run([partial])[0]
+        self.assertEqual(result['pages'], ["cached one", "Decreto 2000\nPagina 2",
+                                           "Decreto 2000\nPagina 3", "cached four"])
+        self.assertEqual(retry.calls, {'detect_document_text': 2})
+
+    def test_stuck_jobs_fall_back_to_page_retries(self):
+        textract = FakeTextract(self.s3, polls_in_progress=10 ** 6)
+        result = self.stage(textract, job_timeout=0).run([scan("1076")])[0]
+        self.assertEqual(result['pages'][2], "Decreto 1076\nPagina 3")
+        self.assertEqual(result['missing'], [])
+        self.assertEqual(textract.calls['detect_document_text'], 3)
+
+    def test_batch_upsert_runs_the_jobs_together(self):
+        textract = FakeTextract(self.s3, polls_in_progress=2)
+        files = [(scan(code), {'code': code, 'title': f"Decreto {code}"}) for code in ("1", "2", "3")]
+        with mock.patch.object(processes, 'get_ocr_stage', return_value=self.stage(textract, max_jobs=3)), \
+                mock.patch.object(processes, 'embed_chunks',
+                                  side_effect=lambda lst_chunks, dimensions: [[0.1]] * len(lst_chunks)), \
+                mock.patch.object(processes, 'pinecone_store_data') as store:
+            processes.upsert_files_pinecone_batch("idx", "ns", files, dimensions=8)
+        self.assertEqual(textract.max_running, 3)
+        self.assertEqual(store.call_count, 3)
+        self.assertIn("Decreto 3", store.call_args.kwargs['vectors'][0][2]['text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
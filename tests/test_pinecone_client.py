@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from utils import pinecone_client
+
+
+class TestPineconeRegistry(unittest.TestCase):
+    def setUp(self):
+        pinecone_client.reset_registry()
+        self.pc = MagicMock()
+        self.pc.describe_index.return_value.status = {'ready': True}
+        self.pc.describe_index.return_value.dimension = 1536
+        patcher = patch('pinecone.Pinecone', return_value=self.pc)
+        self.mock_pinecone = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pinecone_client.reset_registry)
+
+    def test_client_and_index_are_shared(self):
+        first = pinecone_client.get_index("col-ambiente")
+        second = pinecone_client.get_index("col-ambiente")
+        self.assertIs(first, second)
+        self.mock_pinecone.assert_called_once()
+        self.pc.Index.assert_called_once()
+
+    def test_index_description_is_cached(self):
+        for _ in range(5):
+            self.assertTrue(pinecone_client.index_is_ready("col-ambiente"))
+        self.pc.describe_index.assert_called_once()
+        info = pinecone_client.describe_index("col-ambiente")
+        self.assertEqual(info['dimension'], 1536)
+
+    def test_expired_description_is_refreshed(self):
+        pinecone_client.describe_index("col-ambiente")
+        pinecone_client.describe_index("col-ambiente", ttl=0)
+        self.assertEqual(self.pc.describe_index.call_count, 2)
+
+    def test_ensure_index_lists_indexes_once(self):
+        self.pc.list_indexes.return_value.names.return_value = ["col-ambiente"]
+        pinecone_client.ensure_index("col-ambiente")
+        pinecone_client.ensure_index("col-ambiente")
+        self.pc.list_indexes.assert_called_once()
+        self.pc.create_index.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from utils.fakes import FakeIndex
+from utils.reindex import chunk_ids, document_prefix, reindex_document
+
+METADATA = {"genre": "Decreto", "year": 2015, "code": "1076", "theme": "Generales",
+            "status": "Activa", "title": "Decreto Único Reglamentario"}
+
+
+def make_records(chunks, metadata=METADATA):
+    ids = chunk_ids(chunks, metadata)
+    return [(i, [float(n + 1), 1.0], {**metadata, 'text': c})
+            for n, (i, c) in enumerate(zip(ids, chunks))]
+
+
+class TestChunkIds(unittest.TestCase):
+    def test_ids_are_stable_and_prefixed(self):
+        chunks = ["artículo 1", "artículo 2", "artículo 1"]
+        ids = chunk_ids(chunks, METADATA)
+        self.assertEqual(ids, chunk_ids(chunks, METADATA))
+        self.assertEqual(len(set(ids)), 3)
+        self.assertTrue(all(i.startswith(document_prefix(METADATA)) for i in ids))
+
+    def test_genre_and_metadata_change_the_ids(self):
+        ley = {**METADATA, "genre": "Ley"}
+        self.assertNotEqual(document_prefix(ley), document_prefix(METADATA))
+        corrected = {**METADATA, "title": "Decreto 1076 de 2015"}
+        self.assertNotEqual(chunk_ids(["a"], corrected), chunk_ids(["a"], METADATA))
+
+
+class TestReindexDocument(unittest.TestCase):
+    def test_only_changes_are_written(self):
+        index = FakeIndex(dimension=2)
+        other = {**METADATA, "code": "99", "genre": "Ley"}
+        reindex_document(index, "ns", make_records(["x"], other), poll_interval=0)
+        reindex_document(index, "ns", make_records(["a", "b", "c"]), poll_interval=0)
+
+        report = reindex_document(index, "ns", make_records(["a", "b2", "c", "d"]),
+                                  poll_interval=0)
+        self.assertEqual(report['upserted'], 2)
+        self.assertEqual(report['unchanged'], 2)
+        self.assertEqual(report['deleted'], 1)
+        self.assertTrue(report['confirmed'])
+        stored = {m['text'] for _, m in index.namespaces["ns"].values()}
+        self.assertEqual(stored, {"x", "a", "b2", "c", "d"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import hashlib
+import io
+import unittest
+from unittest import mock
+from utils import processes
+from utils.fakes import FakeS3
+from utils.s3_upload import MB, upload_fileobj, upload_url
+
+PART = 5 * MB
+
+
+class TrickleReader(io.RawIOBase):
+    """Non-seekable stream returning at most 64 KB per read, like an HTTP body."""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+        self.decode_content = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.data.read(min(size, 64 * 1024) if size and size > 0 else -1)
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.raw = TrickleReader(data)
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TestS3Upload(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        self.data = bytes(range(256)) * (12 * MB // 256) + b"tail"
+
+    def test_multipart_upload_then_skip_unchanged(self):
+        result = upload_fileobj(io.BytesIO(self.data), "bucket", "big.pdf", client=self.s3,
+                                part_size=PART, concurrency=2)
+        self.assertFalse(result['skipped'])
+        self.assertEqual(self.s3.calls['upload_part'], 3)
+        stored = self.s3.objects[("bucket", "big.pdf")]
+        self.assertEqual(stored['Body'], self.data)
+        self.assertEqual(stored['Metadata']['sha256'], hashlib.sha256(self.data).hexdigest())
+        self.assertNotIn('copy_object', self.s3.calls)
+
+        result = upload_fileobj(io.BytesIO(self.data), "bucket", "big.pdf", client=self.s3, part_size=PART)
+        self.assertTrue(result['skipped'])
+        self.assertEqual(result['bytes'], len(self.data))
+        self.assertEqual(self.s3.calls['upload_part'], 3)
+
+    def test_small_object_is_a_single_put(self):
+        result = upload_fileobj(io.BytesIO(b"%PDF small"), "bucket", "small.pdf", client=self.s3)
+        self.assertFalse(result['skipped'])
+        self.assertEqual(self.s3.calls['put_object'], 1)
+        self.assertNotIn('create_multipart_upload', self.s3.calls)
+
+    def test_url_is_hashed_before_upload_and_unchanged_url_is_not_sent(self):
+        with mock.patch("requests.get", return_value=FakeResponse(self.data)) as get:
+            result = upload_url("https://example.org/big.pdf", "bucket", "big.pdf", client=self.s3,
+                                part_size=PART)
+        self.assertTrue(get.call_args.kwargs['stream'])
+        self.assertFalse(result['skipped'])
+        stored = self.s3.objects[("bucket", "big.pdf")]
+        self.assertEqual(stored['Body'], self.data)
+        # recorded when the upload is created, not by a copy afterwards
+        self.assertEqual(stored['Metadata']['sha256'], hashlib.sha256(self.data).hexdigest())
+        self.assertNotIn('copy_object', self.s3.calls)
+
+        with mock.patch("requests.get", return_value=FakeResponse(self.data)):
+            result = upload_url("https://example.org/big.pdf", "bucket", "big.pdf", client=self.s3,
+                                part_size=PART)
+        self.assertTrue(result['skipped'])
+        self.assertEqual(result['bytes'], len(self.data))
+        self.assertEqual(self.s3.calls['create_multipart_upload'], 1)
+        self.assertEqual(self.s3.calls['upload_part'], 3)
+        self.assertNotIn('abort_multipart_upload', self.s3.calls)
+        self.assertEqual(self.s3.pending_uploads, 0)
+
+    def test_non_seekable_stream_is_skipped_when_unchanged(self):
+        upload_fileobj(io.BytesIO(self.data), "bucket", "big.pdf", client=self.s3, part_size=PART)
+        result = upload_fileobj(TrickleReader(self.data), "bucket", "big.pdf", client=self.s3,
+                                part_size=PART)
+        self.assertTrue(result['skipped'])
+        self.assertEqual(self.s3.calls['upload_part'], 3)
+
+    def test_failed_part_aborts_upload(self):
+        with mock.patch.object(self.s3, 'upload_part', side_effect=OSError("connection reset")):
+            with self.assertRaises(OSError):
+                upload_fileobj(io.BytesIO(self.data), "bucket", "big.pdf", client=self.s3, part_size=PART)
+        self.assertEqual(self.s3.calls['abort_multipart_upload'], 1)
+        self.assertEqual(self.s3.pending_uploads, 0)
+        self.assertNotIn(("bucket", "big.pdf"), self.s3.objects)
+
+    def test_process_helpers_use_shared_client(self):
+        with mock.patch("utils.s3_upload.get_s3_client", return_value=self.s3), \
+                mock.patch("requests.get", return_value=FakeResponse(b"%PDF from url")):
+            self.assertTrue(processes.upload_fileobj_to_s3(io.BytesIO(b"%PDF"), "bucket", "a.pdf"))
+            self.assertTrue(processes.upload_file_from_url("https://example.org/files/b.pdf?x=1", "bucket"))
+        self.assertEqual(self.s3.objects[("bucket", "b.pdf")]['Body'], b"%PDF from url")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from benchmarks.hot_paths import INDEX_NAME, NAMESPACE, QUESTION, OfflineStack, regulation_pages
+from utils import processes, tracing
+from utils.fakes import make_pdf
+from utils.tracing import Tracer, annotate, stage_rows
+
+
+def names(trace):
+    return [trace['name']] + [name for child in trace['spans'] for name in names(child)]
+
+
+class TestTracer(unittest.TestCase):
+    def test_spans_nest_under_the_request(self):
+        tracer = Tracer(log_path="", metrics_path="")
+        with tracer.span("chat", mode="sync"):
+            with tracer.span("embed_query"):
+                annotate(query_tokens=7)
+            with tracer.span("completion", prompt_tokens=100, request_bytes=2048):
+                pass
+        trace = tracer.last("chat")
+        self.assertEqual(names(trace), ["chat", "embed_query", "completion"])
+        self.assertEqual(trace['spans'][0]['attributes'], {'query_tokens': 7})
+        self.assertEqual([row['stage'] for row in stage_rows(trace)],
+                         ["chat", "  embed_query", "  completion"])
+        self.assertEqual(set(tracer.percentiles("chat")), {"total", "embed_query", "completion"})
+        # outside a span there is nothing to annotate
+        annotate(ignored=1)
+
+    def test_failed_stage_is_recorded_and_raised(self):
+        tracer = Tracer(log_path="", metrics_path="")
+        with self.assertRaises(RuntimeError):
+            with tracer.span("chat"):
+                with tracer.span("vector_query"):
+                    raise RuntimeError("down")
+        self.assertEqual(tracer.last("chat")['spans'][0]['error'], "RuntimeError: down")
+
+    def test_rolling_percentiles(self):
+        tracer = Tracer(window=10, log_path="", metrics_path="")
+        for seconds in [1.0] * 5 + [float(n) for n in range(1, 11)]:
+            span = tracing.Span("chat", None, {})
+            span.seconds = seconds
+            tracer._record(span)
+        percentiles = tracer.percentiles("chat")['total']
+        self.assertEqual(percentiles['count'], 10)
+        self.assertEqual(percentiles['p50'], 5.0)
+        self.assertEqual(percentiles['p95'], 10.0)
+
+    def test_json_log_and_prometheus_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs", "traces.jsonl")
+            metrics_path = os.path.join(tmp, "metrics.prom")
+            tracer = Tracer(log_path=log_path, metrics_path=metrics_path)
+            for _ in range(2):
+                with tracer.span("ingest"):
+                    with tracer.span("embed", chunk_tokens=50, pdf_bytes=1000):
+                        pass
+            with open(log_path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(lines[0]['type'], "trace")
+            self.assertEqual(names(lines[0]), ["ingest", "embed"])
+            with open(metrics_path) as f:
+                metrics = f.read()
+        self.assertIn("# TYPE qa_pdfs_stage_seconds summary", metrics)
+        self.assertIn('qa_pdfs_stage_seconds{trace="ingest",stage="embed",quantile="0.95"}', metrics)
+        self.assertIn('qa_pdfs_stage_seconds_count{trace="ingest",stage="total"} 2', metrics)
+        self.assertIn('qa_pdfs_tokens_total{trace="ingest",stage="embed",kind="chunk"} 100', metrics)
+        self.assertIn('qa_pdfs_bytes_total{trace="ingest",stage="embed",kind="pdf"} 2000', metrics)
+
+
+class TestInstrumentedPaths(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer(log_path="", metrics_path="")
+        patcher = patch.object(tracing, '_tracer', self.tracer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stack = OfflineStack()
+
+    def test_ingest_and_answer_are_broken_down_by_stage(self):
+        pdf = make_pdf(regulation_pages("1076", 2))
+        metadata = {'genre': "Decreto", 'code': "1076", 'year': 2015}
+        with self.stack.patched():
+            processes.ingest_pdf(pdf, INDEX_NAME, NAMESPACE, metadata)
+            processes.get_response(QUESTION, INDEX_NAME, NAMESPACE)
+
+        ingest = self.tracer.last("ingest")
+        self.assertEqual([child['name'] for child in ingest['spans']],
+                         ["extract", "split", "embed", "create_records", "upsert"])
+        upsert = ingest['spans'][-1]
+        self.assertIn("describe_index", names(upsert))
+        write = next(child for child in upsert['spans'] if child['name'] == "index_write")
+        self.assertGreater(write['attributes']['payload_bytes'], 0)
+        self.assertEqual(write['attributes']['upserted'], ingest['spans'][1]['attributes']['chunks'])
+
+        chat = self.tracer.last("chat")
+        self.assertEqual(names(chat), ["chat", "lexical_lookup", "embed_query", "answer_cache",
+                                       "describe_index", "vector_query", "fuse_lexical",
+                                       "resolve_context", "build_prompt", "completion"])
+        completion = chat['spans'][-1]['attributes']
+        self.assertGreater(completion['prompt_tokens'], 0)
+        self.assertGreater(completion['completion_tokens'], 0)
+        self.assertGreater(completion['request_bytes'], 0)
+        self.assertGreater(chat['spans'][-2]['attributes']['context_tokens'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from utils.fakes import FakeIndex
+from utils.upsert import batch_records, upsert_records
+
+
+def make_records(count, dimension=8, text="chunk"):
+    return [(f"doc-{i}", [float(i + 1)] * dimension, {'text': text})
+            for i in range(count)]
+
+
+class TestBatchRecords(unittest.TestCase):
+    def test_batches_are_bounded_by_count(self):
+        batches = batch_records(make_records(250), max_vectors=100)
+        self.assertEqual([len(b) for b in batches], [100, 100, 50])
+
+    def test_batches_are_bounded_by_size(self):
+        records = make_records(10, text="x" * 1000)
+        batches = batch_records(records, max_vectors=100, max_bytes=3000)
+        self.assertTrue(all(len(b) <= 2 for b in batches))
+        self.assertEqual(sum(len(b) for b in batches), 10)
+
+
+class TestUpsertRecords(unittest.TestCase):
+    def test_all_records_are_written_and_confirmed(self):
+        index = FakeIndex(dimension=8)
+        report = upsert_records(index, make_records(230), namespace="regulations",
+                                max_vectors=50, poll_interval=0)
+        self.assertEqual(report['upserted'], 230)
+        self.assertEqual(report['batches'], 5)
+        self.assertTrue(report['confirmed'])
+        self.assertEqual(len(index.namespaces["regulations"]), 230)
+
+    def test_failed_batches_are_retried(self):
+        index = FakeIndex(dimension=8, fail_times=2)
+        report = upsert_records(index, make_records(10), namespace="ns",
+                                backoff=0, poll_interval=0)
+        self.assertEqual(report['upserted'], 10)
+        self.assertEqual(index.upsert_calls, 3)
+
+    def test_waits_for_eventual_visibility(self):
+        index = FakeIndex(dimension=8, visibility_delay_calls=3)
+        report = upsert_records(index, make_records(5), namespace="ns",
+                                poll_interval=0)
+        self.assertTrue(report['confirmed'])
+        self.assertGreaterEqual(index.stats_calls, 4)
+
+    def test_reupserting_existing_ids_is_confirmed(self):
+        index = FakeIndex(dimension=8)
+        upsert_records(index, make_records(5), namespace="ns", poll_interval=0)
+        # three ids already stored, two new ones
+        report = upsert_records(index, make_records(7)[3:], namespace="ns",
+                                wait_timeout=5, poll_interval=0.01)
+        self.assertTrue(report['confirmed'])
+        self.assertLess(report['seconds'], 1)
+        self.assertEqual(len(index.namespaces["ns"]), 7)
+
+    def test_unconfirmed_write_times_out(self):
+        index = FakeIndex(dimension=8)
+        report = upsert_records(index, make_records(5), namespace="ns",
+                                expected_count=99, wait_timeout=0.05,
+                                poll_interval=0.01)
+        self.assertFalse(report['confirmed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
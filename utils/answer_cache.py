@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+import numpy as np
+from utils.lexical import code_tokens
+
+"""Semantic cache of chat answers:
+    1- Keep answers per (index, namespace, filter) with the embedding of their question
+    2- Return a stored answer when a new query is within a cosine threshold and cites
+       the same regulation and article numbers
+    3- Evict by TTL and least recent use
+    4- Drop a namespace's answers whenever that namespace is written, and refuse answers
+       retrieved before the write that arrive after it
+    5- Report hit rate and latency saved
+    """
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by query-embedding similarity, one bucket per (index, namespace).
+
+    Args:
+        threshold (float, optional): Minimum cosine similarity for a hit. Defaults to 0.95.
+        ttl (float, optional): Seconds an answer stays valid. Defaults to 3600.
+        max_entries (int, optional): Answers kept per bucket. Defaults to 500.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600.0, max_entries=500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._buckets = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, index_name, namespace, scope=""):
+        key = (index_name, namespace, scope)
+        if key not in self._buckets:
+            self._buckets[key] = {'vectors': None, 'entries': []}
+        return self._buckets[key]
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, bucket, now):
+        live = [entry for entry in bucket['entries'] if now - entry['created'] < self.ttl]
+        if len(live) != len(bucket['entries']):
+            bucket['entries'] = live
+            bucket['vectors'] = None
+
+    def lookup(self, index_name, namespace, query_vector, scope="", question=""):
+        """
+        Return the cached answer closest to `query_vector`, or None when no
+        stored question is within the threshold.
+
+        Args:
+            scope (str, optional): Further partition of the namespace, such as the
+                metadata filter the answer was retrieved with.
+            question (str, optional): Text of the query. Questions that differ only in
+                the numbers they cite embed almost identically, so a hit must also
+                cite the same numbers (`code_tokens`) as the stored question.
+        """
+        started = time.perf_counter()
+        query = self._unit(query_vector)
+        codes = code_tokens(question)
+        with self._lock:
+            bucket = self._bucket(index_name, namespace, scope)
+            now = time.monotonic()
+            self._expire(bucket, now)
+            if bucket['entries']:
+                if bucket['vectors'] is None:
+                    bucket['vectors'] = np.stack([e['vector'] for e in bucket['entries']])
+                scores = bucket['vectors'] @ query
+                for best in np.argsort(-scores):
+                    if scores[best] < self.threshold:
+                        break
+                    entry = bucket['entries'][best]
+                    if entry['codes'] != codes:
+                        continue
+                    entry['last_used'] = now
+                    self.hits += 1
+                    self.saved_seconds += max(
+                        0.0, entry['seconds'] - (time.perf_counter() - started))
+                    return entry['answer']
+            self.misses += 1
+            return None
+
+    def generation(self, index_name, namespace):
+        """
+        Return the namespace's write generation; capture it before retrieving
+        the context an answer is built from and pass it to `store`.
+        """
+        with self._lock:
+            return self._generations.get((index_name, namespace), 0)
+
+    def store(self, index_name, namespace, query_vector, answer, seconds=0.0, scope="", generation=None,
+              question=""):
+        """
+        Store `answer` for the question embedded as `query_vector`.
+
+        Args:
+            seconds (float, optional): Time the uncached answer took, used to report latency saved.
+            scope (str, optional): Partition used by `lookup`.
+            generation (int, optional): `generation()` when the context was retrieved; the
+                answer is dropped when the namespace has been written since.
+            question (str, optional): Text of the query, whose cited numbers a hit must match.
+        Returns:
+            bool: Whether the answer was stored.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations.get((index_name, namespace), 0):
+                return False
+            bucket = self._bucket(index_name, namespace, scope)
+            now = time.monotonic()
+            bucket['entries'].append({'vector': self._unit(query_vector), 'answer': answer,
+                                      'codes': code_tokens(question), 'created': now,
+                                      'last_used': now, 'seconds': seconds})
+            if len(bucket['entries']) > self.max_entries:
+                bucket['entries'].sort(key=lambda entry: entry['last_used'])
+                del bucket['entries'][:len(bucket['entries']) - self.max_entries]
+            bucket['vectors'] = None
+            return True
+
+    def invalidate(self, index_name, namespace):
+        """
+        Drop every answer cached for the namespace, e.g. after new vectors are written,
+        and start a new generation so answers retrieved before it are not stored.
+        """
+        with self._lock:
+            key = (index_name, namespace)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for key in [key for key in self._buckets if key[:2] == (index_name, namespace)]:
+                del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'saved_seconds': self.saved_seconds,
+                'entries': sum(len(b['entries']) for b in self._buckets.values()),
+            }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"Answer cache hit rate: {stats['hit_rate']:.1%} "
+                f"({stats['hits']}/{stats['hits'] + stats['misses']}) | "
+                f"Latency saved: {stats['saved_seconds']:.2f}s")
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Return the process-wide answer cache, configured by ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL and ANSWER_CACHE_SIZE.
+    """
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache(
+                    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+                    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "500")),
+                )
+    return _answer_cache
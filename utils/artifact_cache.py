@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+"""On-disk cache of PDF extraction artifacts, shared by every ingest path:
+    1- Key artifacts by the SHA-256 of the PDF content, plus the splitter parameters for chunks
+    2- Store page text as compressed JSON
+    3- Store chunks as (page, start, end) spans into the page text instead of copies
+    4- Evict the least recently used artifacts once the cache exceeds its size budget
+    5- Share one cache per process, in any process that opens the same file
+    """
+
+ARTIFACT_CACHE_PATH = os.getenv("ARTIFACT_CACHE_PATH", os.path.join(".cache", "artifacts.sqlite"))
+# 0 turns the cache off
+ARTIFACT_CACHE_MB = float(os.getenv("ARTIFACT_CACHE_MB", "256"))
+# bump when the splitter's behaviour changes, so stale chunk lists are not reused
+SPLITTER_VERSION = 1
+# eviction frees space down to this fraction of the budget, so it does not run on every write
+EVICT_TO = 0.9
+
+
+def pdf_sha256(pdf_bytes):
+    """
+    Return the hex SHA-256 of a PDF's bytes, the key of its artifacts.
+    """
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Size-bounded SQLite store of compressed JSON artifacts.
+
+    Several processes may open the same file; SQLite serializes their writes.
+
+    Args:
+        path (str): SQLite file; ':memory:' keeps the cache in memory.
+        max_bytes (int): Compressed bytes kept before the least recently used
+            artifacts are evicted.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS artifacts ("
+                         "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, "
+                         "last_used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts(last_used)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the artifact stored under `key`, or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT data FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, value):
+        """
+        Store a JSON-serializable artifact under `key`, evicting old ones if needed.
+        """
+        data = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode('utf-8'))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO artifacts (key, data, size, last_used) "
+                             "VALUES (?, ?, ?, ?)", (key, data, len(data), time.time()))
+            self._evict()
+            self._db.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - self.max_bytes * EVICT_TO
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM artifacts ORDER BY last_used, rowid"):
+            if target <= 0:
+                break
+            stale.append((key,))
+            target -= size
+        self._db.executemany("DELETE FROM artifacts WHERE key = ?", stale)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache():
+    """
+    Return the process-wide artifact cache at ARTIFACT_CACHE_PATH, or None when
+    ARTIFACT_CACHE_MB is 0.
+    """
+    global _cache
+    if ARTIFACT_CACHE_MB <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ArtifactCache(ARTIFACT_CACHE_PATH, int(ARTIFACT_CACHE_MB * 1024 * 1024))
+    return _cache
+
+
+def _pages_key(sha256):
+    return f"pages:{sha256}"
+
+
+def _chunks_key(sha256, chunk_size, chunk_overlap):
+    return f"chunks:{sha256}:{chunk_size}:{chunk_overlap}:v{SPLITTER_VERSION}"
+
+
+def load_pages(cache, sha256):
+    """
+    Return the cached page texts of a PDF, or None.
+    """
+    return cache.get(_pages_key(sha256))
+
+
+def store_pages(cache, sha256, pages):
+    cache.put(_pages_key(sha256), list(pages))
+
+
+def load_chunks(cache, sha256, chunk_size, chunk_overlap):
+    """
+    Return the cached (chunks, page numbers) of a PDF split with these
+    parameters, or None. Needs the page texts, which are read back too.
+    """
+    spans = cache.get(_chunks_key(sha256, chunk_size, chunk_overlap))
+    if spans is None:
+        return None
+    pages = load_pages(cache, sha256) if any(len(span) == 3 for span in spans) else []
+    if pages is None:
+        return None
+    chunks = []
+    page_numbers = []
+    for span in spans:
+        page = span[0]
+        chunks.append(pages[page - 1][span[1]:span[2]] if len(span) == 3 else span[1])
+        page_numbers.append(page)
+    return chunks, page_numbers
+
+
+def store_chunks(cache, sha256, chunk_size, chunk_overlap, pages, chunks, page_numbers):
+    """
+    Cache the chunks of a PDF as spans into its page texts; a chunk that is
+    not a substring of its page is kept as text.
+    """
+    spans = []
+    cursor = {}
+    for chunk, page in zip(chunks, page_numbers):
+        text = pages[page - 1]
+        # chunks come in order and overlap, so the next one starts after the last start
+        start = text.find(chunk, cursor.get(page, 0))
+        if start < 0:
+            start = text.find(chunk)
+        if start < 0:
+            spans.append([page, chunk])
+            continue
+        cursor[page] = start + 1
+        spans.append([page, start, start + len(chunk)])
+    cache.put(_chunks_key(sha256, chunk_size, chunk_overlap), spans)
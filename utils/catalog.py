@@ -0,0 +1,335 @@
+import json
+import os
+import threading
+import time
+from utils.compact import match_field
+from utils.facets import load_facets
+
+"""Regulation catalog stored in DynamoDB:
+    1- Build a catalog item from regulation metadata
+    2- Write items in BatchWriteItem requests of up to 25 items, retrying unprocessed
+       items with exponential backoff
+    3- Share one DynamoDB client per region across the process
+    4- Read items by hierarchy_code and sort_by prefix, or in bulk by key, through a
+       local TTL cache
+    5- Add catalog metadata to retrieved matches with a single bulk read
+    """
+
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+MAX_RETRIES = 8
+BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 2.0
+# seconds a catalog read is served from the local cache
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "300"))
+# empty leaves retrieved matches as the vector index returned them
+CATALOG_TABLE = os.getenv("CATALOG_TABLE", "")
+CATALOG_REGION = os.getenv("CATALOG_REGION", "us-east-2")
+
+
+def build_catalog_item(metadata, region, bucket_name, file_name, genres_dict, status_dict, themes_dict):
+    """Build the DynamoDB item describing a regulation.
+
+    Args:
+        metadata (Dict): Collection of data regarding the pdf file. Its 'url' key is set
+            to the S3 location of the file.
+        region (str): Geographical region where the bucket is at.
+        bucket_name (str): S3 bucket name.
+        file_name (str): PDF file name.
+    Return: Item in DynamoDB attribute-value format.
+    """
+    metadata['url'] = f"https://{bucket_name}.s3.{region}.amazonaws.com/{file_name}"
+
+    hierarchy_code, sort_by = catalog_key(metadata, genres_dict, status_dict, themes_dict)
+
+    return {
+        "hierarchy_code": {'S': hierarchy_code},
+        "sort_by": {'S': sort_by},
+        "metadata": {'S': json.dumps(metadata)}
+    }
+
+
+def catalog_key(metadata, genres_dict, status_dict, themes_dict):
+    """Return the (hierarchy_code, sort_by) key of a regulation's catalog item.
+
+    Raises:
+        KeyError: The genre, theme or status is not in its dictionary.
+    """
+    hierarchy_code = genres_dict[metadata['genre']]  # partition key
+    theme = themes_dict[metadata['theme']]
+    status = status_dict[metadata['status']]
+    return str(hierarchy_code), f"{metadata['code']}#{theme}#{status}"
+
+
+def _backoff(attempt):
+    time.sleep(min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+
+
+def batch_write_items(dynamodb, table_name, items):
+    """Write items with BatchWriteItem, resending unprocessed items with backoff.
+
+    Args:
+        dynamodb (client): boto3 DynamoDB client or a compatible stand-in.
+        table_name (str): Name of database table.
+        items (list): Items in DynamoDB attribute-value format.
+    Return: Number of items written.
+    Raises:
+        RuntimeError: Items were still unprocessed after MAX_RETRIES retries.
+    """
+    for start in range(0, len(items), BATCH_WRITE_LIMIT):
+        request = {table_name: [{'PutRequest': {'Item': item}}
+                                for item in items[start:start + BATCH_WRITE_LIMIT]]}
+        attempt = 0
+        while request:
+            response = dynamodb.batch_write_item(RequestItems=request)
+            request = response.get('UnprocessedItems') or {}
+            if request:
+                if attempt == MAX_RETRIES:
+                    left = sum(len(requests) for requests in request.values())
+                    raise RuntimeError(f"{left} catalog items unprocessed after {MAX_RETRIES} retries")
+                _backoff(attempt)
+                attempt += 1
+    return len(items)
+
+
+def _parse_item(item):
+    return json.loads(item['metadata']['S'])
+
+
+def query_catalog(dynamodb, table_name, hierarchy_code, sort_by_prefix=None):
+    """Return the metadata of every item of `hierarchy_code` whose sort_by starts
+    with `sort_by_prefix`, following pagination.
+
+    Args:
+        dynamodb (client): boto3 DynamoDB client or a compatible stand-in.
+        table_name (str): Name of database table.
+        hierarchy_code (str): Partition key, the genre code.
+        sort_by_prefix (str, optional): Start of the "code#theme#status" sort key.
+    Return: list (dict) of regulation metadata, in sort_by order.
+    """
+    condition = "hierarchy_code = :hierarchy_code"
+    values = {':hierarchy_code': {'S': str(hierarchy_code)}}
+    if sort_by_prefix:
+        condition += " AND begins_with(sort_by, :prefix)"
+        values[':prefix'] = {'S': sort_by_prefix}
+    request = {'TableName': table_name, 'KeyConditionExpression': condition,
+               'ExpressionAttributeValues': values}
+    found = []
+    while True:
+        response = dynamodb.query(**request)
+        found.extend(_parse_item(item) for item in response.get('Items', []))
+        if not response.get('LastEvaluatedKey'):
+            return found
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def batch_get_catalog(dynamodb, table_name, keys):
+    """Return {(hierarchy_code, sort_by): metadata} for the keys that exist, read
+    with BatchGetItem and retrying unprocessed keys with backoff.
+    """
+    keys = list(dict.fromkeys(keys))
+    found = {}
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': [{'hierarchy_code': {'S': hierarchy_code}, 'sort_by': {'S': sort_by}}
+                                         for hierarchy_code, sort_by in keys[start:start + BATCH_GET_LIMIT]]}}
+        attempt = 0
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                found[(item['hierarchy_code']['S'], item['sort_by']['S'])] = _parse_item(item)
+            request = response.get('UnprocessedKeys') or {}
+            if request:
+                if attempt == MAX_RETRIES:
+                    raise RuntimeError(f"Catalog keys unprocessed after {MAX_RETRIES} retries")
+                _backoff(attempt)
+                attempt += 1
+    return found
+
+
+class CatalogReader:
+    """
+    Catalog reads and writes of one table, with reads cached locally for `ttl` seconds.
+
+    Writes through the reader drop the cached reads they affect, so this process
+    sees its own writes at once; writes from other processes show up within `ttl`.
+
+    Args:
+        dynamodb (client): boto3 DynamoDB client or a compatible stand-in.
+        table_name (str): Name of database table.
+        ttl (float, optional): Cache lifetime in seconds. Defaults to CATALOG_TTL.
+    """
+
+    def __init__(self, dynamodb, table_name, ttl=None):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.ttl = CATALOG_TTL if ttl is None else ttl
+        self._items = {}
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, cache, key):
+        entry = cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def query(self, hierarchy_code, sort_by_prefix=""):
+        """
+        Return the metadata of the items of `hierarchy_code` whose sort_by starts
+        with `sort_by_prefix`.
+        """
+        key = (str(hierarchy_code), sort_by_prefix or "")
+        with self._lock:
+            entry = self._fresh(self._queries, key)
+        if entry is not None:
+            return list(entry[1])
+        found = query_catalog(self.dynamodb, self.table_name, key[0], key[1])
+        with self._lock:
+            self._queries[key] = (time.monotonic() + self.ttl, found)
+        return list(found)
+
+    def get_many(self, keys):
+        """
+        Return {(hierarchy_code, sort_by): metadata} for the keys that exist,
+        reading the uncached ones in one bulk request.
+        """
+        keys = {(str(hierarchy_code), sort_by) for hierarchy_code, sort_by in keys}
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._fresh(self._items, key)
+                if entry is None:
+                    missing.append(key)
+                elif entry[1] is not None:
+                    found[key] = entry[1]
+        if missing:
+            fetched = batch_get_catalog(self.dynamodb, self.table_name, missing)
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                for key in missing:
+                    # absent keys are cached too, so a miss is not asked for again
+                    self._items[key] = (expires, fetched.get(key))
+            found.update(fetched)
+        return found
+
+    def get(self, hierarchy_code, sort_by):
+        """
+        Return the metadata of one regulation, or None when it is not in the catalog.
+        """
+        return self.get_many([(hierarchy_code, sort_by)]).get((str(hierarchy_code), sort_by))
+
+    def put_items(self, items):
+        """
+        Write items with `batch_write_items` and drop the cached reads they affect.
+
+        Return: Number of items written.
+        """
+        written = batch_write_items(self.dynamodb, self.table_name, items)
+        self.invalidate([(item['hierarchy_code']['S'], item['sort_by']['S']) for item in items])
+        return written
+
+    def invalidate(self, keys=None):
+        """
+        Drop the cached reads of `keys`, or every cached read when no keys are given.
+        """
+        with self._lock:
+            if keys is None:
+                self._items.clear()
+                self._queries.clear()
+                return
+            for key in keys:
+                self._items.pop(key, None)
+                stale = [query for query in self._queries
+                         if query[0] == key[0] and key[1].startswith(query[1])]
+                for query in stale:
+                    del self._queries[query]
+
+
+_clients = {}
+_readers = {}
+_clients_lock = threading.Lock()
+
+
+def get_dynamodb_client(region):
+    """
+    Return the process-wide boto3 DynamoDB client of `region`.
+    """
+    client = _clients.get(region)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(region)
+            if client is None:
+                import boto3
+                client = boto3.client('dynamodb', region)
+                _clients[region] = client
+    return client
+
+
+def get_catalog_reader(table_name, region):
+    """
+    Return the process-wide catalog reader of `table_name`, on the shared client of `region`.
+    """
+    key = (table_name, region)
+    reader = _readers.get(key)
+    if reader is None:
+        client = get_dynamodb_client(region)
+        with _clients_lock:
+            reader = _readers.get(key)
+            if reader is None:
+                reader = CatalogReader(client, table_name)
+                _readers[key] = reader
+    return reader
+
+
+def enrich_context(context, reader, dictionaries):
+    """
+    Add the catalog metadata of each match's regulation, e.g. its S3 'url', to
+    the match metadata in one bulk catalog read.
+
+    Fields the match already carries win over the catalog's. Matches whose
+    regulation cannot be keyed or is not in the catalog are kept as they are.
+
+    Args:
+        context (dict): {'namespace', 'matches'} from `resolve_context`.
+        reader (CatalogReader): Catalog to read from.
+        dictionaries (dict): Contents of dictionaries.json.
+    """
+    if not context:
+        return context
+    matches = match_field(context, 'matches') or []
+    keys = {}
+    for match in matches:
+        metadata = match_field(match, 'metadata') or {}
+        try:
+            keys[match_field(match, 'id')] = catalog_key(metadata, dictionaries['genre_dict'],
+                                                         dictionaries['status_dict'],
+                                                         dictionaries['theme_dict'])
+        except KeyError:
+            continue
+    try:
+        found = reader.get_many(keys.values()) if keys else {}
+    except Exception as e:
+        # the catalog only adds detail; answer from the chunks alone when it is unreachable
+        print(f"Catalog lookup failed: {e}")
+        found = {}
+    enriched = []
+    for match in matches:
+        vector_id = match_field(match, 'id')
+        metadata = match_field(match, 'metadata') or {}
+        regulation = found.get(keys.get(vector_id))
+        if regulation:
+            metadata = dict(regulation, **metadata)
+        enriched.append({'id': vector_id, 'score': match_field(match, 'score'), 'metadata': metadata})
+    return {'namespace': match_field(context, 'namespace'), 'matches': enriched}
+
+
+def resolve_catalog(context):
+    """
+    Apply `enrich_context` with the CATALOG_TABLE reader, or return `context`
+    unchanged when no catalog table is configured.
+    """
+    if not CATALOG_TABLE or not context:
+        return context
+    return enrich_context(context, get_catalog_reader(CATALOG_TABLE, CATALOG_REGION),
+                          load_facets().dictionaries)
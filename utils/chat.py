@@ -0,0 +1,133 @@
+import asyncio
+import queue
+import threading
+import time
+from utils.pinecone_client import get_index, index_is_ready
+from utils.processes import (CHAT_MODEL, build_chat_messages, completion_usage, messages_size,
+                             retrieve_context, store_answer)
+from utils.tracing import span
+
+"""Asynchronous, streaming version of `get_response`:
+    1- Run one background event loop per process, shared by every Streamlit session
+    2- Retrieve the context with `retrieve_context` off the event loop, while the retriever is warmed up
+    3- Answer from the semantic answer cache when a similar question was asked
+    4- Stream the chat completion token by token
+    5- Expose the stream as a plain generator for `st.write_stream`
+    6- Time each stage under one "chat" span, as `get_response` does
+    """
+
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+_END = object()
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="chat-event-loop",
+                                 daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _get_client():
+    # only touched from the background loop, so the HTTP pool stays on one loop
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI()
+    return _client
+
+
+def warm_retriever(index_name):
+    """
+    Open the shared index handle and check readiness ahead of the query.
+    """
+    with span("warm_retriever"):
+        get_index(index_name)
+        return index_is_ready(index_name)
+
+
+async def astream_response(query, index_name, namespace, top_k=10, filter=None):
+    """
+    Yield the answer to `query` as the chat model produces it.
+
+    Args:
+        query (str): The text of the user's query.
+        index_name (str): Pinecone index name from which to retrieve contextual data.
+        namespace (str): Pinecone namespace associated with the index.
+        top_k (int, optional): Number of matches used as context. Defaults to 10.
+        filter (dict, optional): Metadata filter from `Facets.build_filter`.
+
+    Yields:
+        str: Pieces of the AI-generated response.
+    """
+    started = time.perf_counter()
+    with span("chat", mode="stream", namespace=namespace):
+        # the retriever is warmed while the query is embedded
+        retrieval, _ = await asyncio.gather(
+            asyncio.to_thread(retrieve_context, query, index_name, namespace, top_k, filter),
+            asyncio.to_thread(warm_retriever, index_name))
+        if retrieval['answer'] is not None:
+            yield retrieval['answer']
+            return
+        with span("build_prompt"):
+            messages = build_chat_messages(query, retrieval['context'])
+        with span("completion", model=CHAT_MODEL, request_bytes=messages_size(messages)) as completion:
+            stream = await _get_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                stream=True,
+            )
+            pieces = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not pieces:
+                        completion.set(first_token_seconds=round(time.perf_counter() - started, 4))
+                    pieces.append(chunk.choices[0].delta.content)
+                    yield pieces[-1]
+            answer = "".join(pieces)
+            # streamed chunks carry no usage, so the tokens are counted locally
+            completion.set(**completion_usage(None, messages, answer))
+        store_answer(retrieval, index_name, namespace, answer, seconds=time.perf_counter() - started)
+
+
+def start_response_stream(query, index_name, namespace, top_k=10, filter=None):
+    """
+    Start answering `query` on the background loop right away and return a
+    generator over the answer pieces.
+
+    The work begins before the generator is consumed, so the caller can render
+    the chat history while the query is embedded and the context retrieved.
+
+    Returns:
+        generator (str): Pieces of the response, suitable for `st.write_stream`.
+    """
+    pieces = queue.Queue()
+
+    async def produce():
+        try:
+            async for piece in astream_response(query, index_name, namespace, top_k=top_k,
+                                                filter=filter):
+                pieces.put(piece)
+        except Exception as e:
+            pieces.put(e)
+        finally:
+            pieces.put(_END)
+
+    asyncio.run_coroutine_threadsafe(produce(), _get_loop())
+
+    def consume():
+        while True:
+            piece = pieces.get()
+            if piece is _END:
+                return
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+
+    return consume()
@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+from utils.compact import match_field
+from utils.reindex import regulation_key
+
+"""Chunk text and regulation metadata kept outside the vector index:
+    1- Store each regulation's metadata once and each chunk's text and page by chunk ID
+    2- Slim vector metadata down to a document key and the filterable fields
+    3- Resolve retrieved matches back to full metadata and text in one bulk lookup
+    """
+
+# SLIM_METADATA=1 stores slim vectors; records written before keep their full metadata
+SLIM_METADATA = os.getenv("SLIM_METADATA") == "1"
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", os.path.join(".cache", "chunk_store.sqlite"))
+# metadata kept on every vector so queries can still filter on it
+FILTER_FIELDS = ('genre', 'status', 'theme', 'year', 'dependency')
+DOCUMENT_KEY = 'doc'
+
+
+def slim_metadata_enabled():
+    """
+    Return True when vectors carry only a document key and the filterable fields.
+    """
+    return SLIM_METADATA
+
+
+class ChunkStore:
+    """
+    SQLite key-value store of regulation metadata and chunk text.
+
+    Args:
+        path (str): SQLite file; ':memory:' keeps the store in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS documents ("
+                         "doc_key TEXT PRIMARY KEY, metadata TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks ("
+                         "id TEXT PRIMARY KEY, doc_key TEXT NOT NULL, text TEXT NOT NULL, page INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_doc_key ON chunks(doc_key)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def put_chunks(self, records, replace=False):
+        """
+        Store the metadata and text of (id, values, metadata) records.
+
+        Args:
+            records (list): Records whose metadata holds the regulation fields plus 'text'
+                and optionally 'page'.
+            replace (bool, optional): Drop other chunks of the same regulations, for
+                records that hold every chunk of their regulation.
+        Returns:
+            dict: Document key of each record id.
+        """
+        documents = {}
+        chunks = []
+        keys = {}
+        for vector_id, _, metadata in records:
+            fields = {key: value for key, value in metadata.items() if key not in ('text', 'page')}
+            doc_key = regulation_key(fields)
+            documents[doc_key] = json.dumps(fields, ensure_ascii=False, default=str)
+            chunks.append((vector_id, doc_key, metadata.get('text', ""), metadata.get('page')))
+            keys[vector_id] = doc_key
+        with self._lock:
+            if replace:
+                for doc_key in documents:
+                    ids = [chunk[0] for chunk in chunks if chunk[1] == doc_key]
+                    placeholders = ",".join("?" * len(ids))
+                    self._db.execute(f"DELETE FROM chunks WHERE doc_key = ? AND id NOT IN ({placeholders})",
+                                     [doc_key] + ids)
+            self._db.executemany("INSERT OR REPLACE INTO documents (doc_key, metadata) VALUES (?, ?)",
+                                 documents.items())
+            self._db.executemany("INSERT OR REPLACE INTO chunks (id, doc_key, text, page) "
+                                 "VALUES (?, ?, ?, ?)", chunks)
+            self._db.commit()
+        return keys
+
+    def get_many(self, ids):
+        """
+        Return {id: metadata} with the regulation metadata, 'text' and 'page' of each stored id.
+        """
+        ids = list(ids)
+        rows = {}
+        documents = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for row in self._db.execute(
+                        f"SELECT id, doc_key, text, page FROM chunks WHERE id IN ({placeholders})", part):
+                    rows[row[0]] = row
+            doc_keys = list({row[1] for row in rows.values()})
+            for start in range(0, len(doc_keys), 500):
+                part = doc_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for doc_key, metadata in self._db.execute(
+                        f"SELECT doc_key, metadata FROM documents WHERE doc_key IN ({placeholders})", part):
+                    documents[doc_key] = json.loads(metadata)
+        found = {}
+        for vector_id, doc_key, text, page in rows.values():
+            metadata = dict(documents.get(doc_key, {}), text=text)
+            if page is not None:
+                metadata['page'] = page
+            found[vector_id] = metadata
+        return found
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chunk_store():
+    """
+    Return the process-wide chunk store at CHUNK_STORE_PATH.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChunkStore(CHUNK_STORE_PATH)
+    return _store
+
+
+def slim_records(records, store, replace=False):
+    """
+    Move chunk text and regulation metadata into `store` and return records
+    whose metadata holds only the document key, page and filterable fields.
+
+    Args:
+        records (list): (id, values, metadata) records from `create_records_to_upsert`.
+        store (ChunkStore): Where the text and metadata are kept.
+        replace (bool, optional): Records hold every chunk of their regulation.
+    Returns:
+        list (tuple): (id, values, slim metadata) records.
+    """
+    if not records:
+        return []
+    keys = store.put_chunks(records, replace=replace)
+    slimmed = []
+    for vector_id, values, metadata in records:
+        slim = {key: metadata[key] for key in FILTER_FIELDS if key in metadata}
+        slim[DOCUMENT_KEY] = keys[vector_id]
+        if metadata.get('page') is not None:
+            slim['page'] = metadata['page']
+        slimmed.append((vector_id, values, slim))
+    return slimmed
+
+
+def resolve_context(context, store=None):
+    """
+    Replace slim match metadata with the stored text and regulation metadata.
+
+    Matches that already carry their text, e.g. vectors written before slim
+    mode was turned on, are kept as they are. Every other id is looked up in
+    one bulk read of `store`, which defaults to the process-wide chunk store.
+
+    Returns:
+        dict: {'namespace', 'matches'} with dict matches, or None for no context.
+    """
+    if not context:
+        return context
+    matches = match_field(context, 'matches') or []
+    missing = [match_field(match, 'id') for match in matches
+               if 'text' not in (match_field(match, 'metadata') or {})]
+    found = (store or get_chunk_store()).get_many(missing) if missing else {}
+    resolved = []
+    for match in matches:
+        vector_id = match_field(match, 'id')
+        metadata = match_field(match, 'metadata') or {}
+        if vector_id in found:
+            metadata = dict(found[vector_id], **{key: value for key, value in metadata.items()
+                                                 if key != DOCUMENT_KEY})
+        elif 'text' not in metadata:
+            # the chunk was never stored here; skip it rather than send an empty context
+            continue
+        resolved.append({'id': vector_id, 'score': match_field(match, 'score'), 'metadata': metadata})
+    return {'namespace': match_field(context, 'namespace'), 'matches': resolved}
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+
+"""Compact first-pass search with a full-precision re-rank:
+    1- Truncate embeddings to their leading dimensions (Matryoshka) and renormalize them
+    2- Keep the full-precision vectors in a SQLite side store, per index and namespace
+    3- Query the compact index for a wider set of candidates
+    4- Re-rank the candidates by cosine similarity against their full-precision vectors
+    """
+
+# 0 keeps the full embedding size and turns compact mode off
+SEARCH_DIMENSIONS = int(os.getenv("SEARCH_DIMENSIONS", "0"))
+# 'int8' additionally quantizes the first-pass vectors (local backend only)
+SEARCH_QUANTIZATION = os.getenv("SEARCH_QUANTIZATION") or None
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "40"))
+FULL_VECTOR_PATH = os.getenv("FULL_VECTOR_PATH", os.path.join(".cache", "full_vectors"))
+
+
+def compact_enabled():
+    """
+    Return True when the first-pass index holds truncated vectors.
+    """
+    return SEARCH_DIMENSIONS > 0
+
+
+def truncate_vectors(vectors, dimensions):
+    """
+    Keep the first `dimensions` components of each vector and rescale it to unit length.
+
+    `text-embedding-3` models are trained so that a prefix of the embedding is
+    itself a usable embedding; renormalizing keeps cosine scores comparable.
+
+    Args:
+        vectors (list or ndarray): One vector per row, or a single vector.
+        dimensions (int): Number of leading components to keep.
+    Returns:
+        ndarray: float32 array with the same leading shape.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)[..., :dimensions]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _record_parts(record):
+    if isinstance(record, dict):
+        return record['id'], record['values'], record.get('metadata')
+    return record[0], record[1], record[2] if len(record) > 2 else None
+
+
+class FullVectorStore:
+    """
+    Full-precision vectors of one index, looked up by id for the re-rank pass.
+
+    Args:
+        path (str): SQLite file holding the vectors of every namespace.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors ("
+                         "namespace TEXT NOT NULL, id TEXT NOT NULL, vector BLOB NOT NULL, "
+                         "PRIMARY KEY (namespace, id))")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def put_many(self, namespace, records, prefix=None):
+        """
+        Store the vectors of `records`. With `prefix`, other ids starting with it
+        are removed, mirroring the stale-chunk deletes of `reindex_document`.
+        """
+        rows = []
+        for record in records:
+            vector_id, values, _ = _record_parts(record)
+            rows.append((namespace, vector_id, np.asarray(values, dtype=np.float32).tobytes()))
+        with self._lock:
+            if prefix is not None:
+                keep = {row[1] for row in rows}
+                stale = [(namespace, vector_id) for (vector_id,) in self._db.execute(
+                    "SELECT id FROM vectors WHERE namespace = ? AND substr(id, 1, ?) = ?",
+                    (namespace, len(prefix), prefix)) if vector_id not in keep]
+                self._db.executemany("DELETE FROM vectors WHERE namespace = ? AND id = ?", stale)
+            self._db.executemany("INSERT OR REPLACE INTO vectors (namespace, id, vector) "
+                                 "VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def get_many(self, namespace, ids):
+        """
+        Return {id: float32 vector} for the ids that are stored.
+        """
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for vector_id, blob in self._db.execute(
+                        f"SELECT id, vector FROM vectors WHERE namespace = ? AND id IN ({placeholders})",
+                        [namespace] + part):
+                    found[vector_id] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            self._db.execute("DELETE FROM vectors WHERE namespace = ?", (namespace,))
+            self._db.commit()
+
+    def count(self, namespace):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM vectors WHERE namespace = ?",
+                                    (namespace,)).fetchone()[0]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_full_vector_store(index_name):
+    """
+    Return the process-wide full-precision store of `index_name`, under FULL_VECTOR_PATH.
+    """
+    store = _stores.get(index_name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(index_name)
+            if store is None:
+                store = FullVectorStore(os.path.join(FULL_VECTOR_PATH, f"{index_name}.sqlite"))
+                _stores[index_name] = store
+    return store
+
+
+def compact_records(records, store, namespace, dimensions, prefix=None):
+    """
+    Save the full-precision vectors of `records` in `store` and return the
+    records with truncated vectors, ready for the first-pass index.
+
+    Args:
+        records (list): (id, values, metadata) tuples or Pinecone-style dicts.
+        store (FullVectorStore): Side store for the re-rank pass.
+        namespace (str): Namespace the records are written to.
+        dimensions (int): First-pass vector size.
+        prefix (str, optional): Document prefix whose other stored vectors are stale.
+    Returns:
+        list (tuple): (id, truncated values, metadata) records.
+    """
+    if not records:
+        return []
+    store.put_many(namespace, records, prefix=prefix)
+    parts = [_record_parts(record) for record in records]
+    truncated = truncate_vectors([values for _, values, _ in parts], dimensions)
+    return [(vector_id, truncated[i].tolist(), metadata)
+            for i, (vector_id, _, metadata) in enumerate(parts)]
+
+
+def match_field(match, name, default=None):
+    """
+    Read `name` from a query match or response, whether Pinecone returned an
+    object or a local or fake index returned a dict.
+    """
+    if isinstance(match, dict):
+        return match.get(name, default)
+    return getattr(match, name, default)
+
+
+def rerank(matches, query_vector, full_vectors, top_k):
+    """
+    Order first-pass `matches` by cosine similarity to the full-precision query.
+
+    Candidates without a stored full vector keep their first-pass score.
+
+    Returns:
+        list (dict): The best `top_k` matches as {'id', 'score', 'metadata'} dicts.
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = float(np.linalg.norm(query))
+    if norm:
+        query = query / norm
+    scored = []
+    for match in matches:
+        vector_id = match_field(match, 'id')
+        score = match_field(match, 'score', 0.0)
+        full = full_vectors.get(vector_id)
+        if full is not None:
+            full_norm = float(np.linalg.norm(full))
+            score = float(full @ query) / full_norm if full_norm else 0.0
+        scored.append({'id': vector_id, 'score': score, 'metadata': match_field(match, 'metadata') or {}})
+    scored.sort(key=lambda match: match['score'], reverse=True)
+    return scored[:top_k]
+
+
+def compact_query(index, store, namespace, query_vector, top_k=10, dimensions=None,
+                  candidates=None, **query_options):
+    """
+    Search the compact index and re-rank the candidates at full precision.
+
+    Args:
+        index (Index): First-pass index holding truncated vectors.
+        store (FullVectorStore): Full-precision vectors of the same index.
+        namespace (str): Namespace to search.
+        query_vector (list): Full-precision query embedding.
+        top_k (int, optional): Matches returned. Defaults to 10.
+        dimensions (int, optional): First-pass vector size. Defaults to SEARCH_DIMENSIONS.
+        candidates (int, optional): First-pass matches to re-rank. Defaults to RERANK_CANDIDATES.
+    Returns:
+        dict: {'namespace', 'matches'} like a Pinecone query response.
+    """
+    dimensions = dimensions or SEARCH_DIMENSIONS
+    candidates = max(candidates or RERANK_CANDIDATES, top_k)
+    results = index.query(namespace=namespace,
+                          vector=truncate_vectors(query_vector, dimensions).tolist(),
+                          top_k=candidates,
+                          include_values=False,
+                          include_metadata=True,
+                          **query_options)
+    matches = match_field(results, 'matches') or []
+    full_vectors = store.get_many(namespace, [match_field(match, 'id') for match in matches])
+    return {'namespace': namespace,
+            'matches': rerank(matches, query_vector, full_vectors, top_k)}
+
+
+def reset_stores():
+    """
+    Drop the cached side stores, e.g. after FULL_VECTOR_PATH changes in tests.
+    """
+    with _stores_lock:
+        _stores.clear()
@@ -0,0 +1,206 @@
+import os
+import re
+import threading
+from utils.compact import match_field
+from utils.reindex import record_prefix
+
+"""Assembly of the retrieved chunks into the prompt context:
+    1- Drop near-duplicate chunks, keeping the better-scored one
+    2- Stitch chunks of the same regulation whose text overlaps into one passage
+    3- Optionally reorder passages by maximal marginal relevance (MMR)
+    4- Pack passages into a token budget measured with the chat model's tokenizer
+    5- Report the tokens saved against joining every match
+    """
+
+SEPARATOR = "\n\n---\n\n"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# empty disables MMR; 1.0 ranks by relevance only, lower values favour diversity
+CONTEXT_MMR_LAMBDA = os.getenv("CONTEXT_MMR_LAMBDA") or None
+DUPLICATE_THRESHOLD = 0.8
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+# a passage cut to fewer tokens than this is left out instead
+MIN_PASSAGE_TOKENS = 50
+
+_encoders = {}
+_encoder_lock = threading.Lock()
+
+
+def get_token_counter(model="gpt-3.5-turbo"):
+    """
+    Return a function counting the tokens of a text for `model`.
+
+    tiktoken downloads its encoding on first use; when that is not possible the
+    counter falls back to an estimate of one token per four characters.
+    """
+    counter = _encoders.get(model)
+    if counter is None:
+        with _encoder_lock:
+            counter = _encoders.get(model)
+            if counter is None:
+                try:
+                    import tiktoken
+                    encoding = tiktoken.encoding_for_model(model)
+                    counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+                except Exception as e:
+                    print(f"Tokenizer for {model} unavailable, estimating tokens: {e}")
+                    counter = lambda text: (len(text) + 3) // 4
+                _encoders[model] = counter
+    return counter
+
+
+def _shingles(text, size=5):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def similarity(a, b):
+    """
+    Jaccard similarity of two shingle sets.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(left, right):
+    # length of the longest suffix of `left` that starts `right`
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def dedupe_passages(passages, threshold=DUPLICATE_THRESHOLD):
+    """
+    Drop passages contained in, or too similar to, a better-scored passage.
+
+    Args:
+        passages (list): Dicts with 'text', 'score' and 'shingles', best first.
+    """
+    kept = []
+    for passage in passages:
+        duplicate = any(passage['text'] in other['text']
+                        or similarity(passage['shingles'], other['shingles']) >= threshold
+                        for other in kept)
+        if not duplicate:
+            kept.append(passage)
+    return kept
+
+
+def merge_adjacent(passages):
+    """
+    Stitch passages of the same regulation where one ends with the text the
+    next one starts with, as the splitter's chunk overlap leaves them.
+    """
+    successors = {}
+    predecessors = set()
+    for i, left in enumerate(passages):
+        for j, right in enumerate(passages):
+            if i == j or i in successors or j in predecessors or left['key'] != right['key']:
+                continue
+            size = _overlap(left['text'], right['text'])
+            if size:
+                successors[i] = (j, size)
+                predecessors.add(j)
+    merged = []
+    used = set()
+    for head in range(len(passages)):
+        if head in predecessors:
+            continue
+        passage = dict(passages[head])
+        used.add(head)
+        current = head
+        while current in successors and successors[current][0] not in used:
+            current, size = successors[current]
+            passage['text'] += passages[current]['text'][size:]
+            passage['score'] = max(passage['score'], passages[current]['score'])
+            used.add(current)
+        passage['shingles'] = _shingles(passage['text'])
+        merged.append(passage)
+    # passages whose overlaps form a cycle have no head; keep them as they are
+    merged += [passages[i] for i in range(len(passages)) if i not in used]
+    merged.sort(key=lambda passage: passage['score'], reverse=True)
+    return merged
+
+
+def mmr_order(passages, mmr_lambda):
+    """
+    Order passages by maximal marginal relevance: each pick maximizes
+    `mmr_lambda * score - (1 - mmr_lambda) * similarity to the passages already picked`.
+    """
+    remaining = list(passages)
+    ordered = []
+    while remaining:
+        best = max(remaining, key=lambda p: mmr_lambda * p['score'] - (1 - mmr_lambda) * max(
+            (similarity(p['shingles'], q['shingles']) for q in ordered), default=0.0))
+        remaining.remove(best)
+        ordered.append(best)
+    return ordered
+
+
+def _truncate_to_tokens(text, tokens, count_tokens):
+    # cut on word boundaries, shrinking until the text fits
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def assemble_context(matches, token_budget=None, mmr_lambda=None, count_tokens=None):
+    """
+    Turn retrieved matches into the passages sent to the chat model.
+
+    Args:
+        matches (list): Query matches whose metadata holds the chunk 'text'.
+        token_budget (int, optional): Maximum context tokens. Defaults to CONTEXT_TOKEN_BUDGET.
+        mmr_lambda (float, optional): Enables MMR ordering. Defaults to CONTEXT_MMR_LAMBDA.
+        count_tokens (callable, optional): Token counter. Defaults to the chat model's tokenizer.
+    Returns:
+        dict: 'text' of the packed context, 'passages' kept, 'tokens' used,
+        'tokens_before' for joining every match and 'tokens_saved'.
+    """
+    token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    if mmr_lambda is None and CONTEXT_MMR_LAMBDA is not None:
+        mmr_lambda = float(CONTEXT_MMR_LAMBDA)
+    count_tokens = count_tokens or get_token_counter()
+
+    passages = []
+    for match in matches:
+        text = (match_field(match, 'metadata') or {}).get('text', "")
+        if text:
+            vector_id = match_field(match, 'id') or ""
+            passages.append({'text': text, 'score': match_field(match, 'score') or 0.0,
+                             'key': record_prefix(vector_id), 'shingles': _shingles(text)})
+    tokens_before = count_tokens(SEPARATOR.join(p['text'] for p in passages)) if passages else 0
+
+    passages.sort(key=lambda passage: passage['score'], reverse=True)
+    passages = merge_adjacent(dedupe_passages(passages))
+    if mmr_lambda is not None:
+        passages = mmr_order(passages, mmr_lambda)
+
+    packed = []
+    used = 0
+    separator_tokens = count_tokens(SEPARATOR)
+    for passage in passages:
+        cost = count_tokens(passage['text']) + (separator_tokens if packed else 0)
+        if used + cost <= token_budget:
+            packed.append(passage['text'])
+            used += cost
+            continue
+        room = token_budget - used - (separator_tokens if packed else 0)
+        if room >= MIN_PASSAGE_TOKENS:
+            packed.append(_truncate_to_tokens(passage['text'], room, count_tokens))
+        break
+
+    text = SEPARATOR.join(packed)
+    tokens = count_tokens(text) if packed else 0
+    return {'text': text, 'passages': packed, 'tokens': tokens,
+            'tokens_before': tokens_before, 'tokens_saved': max(0, tokens_before - tokens)}
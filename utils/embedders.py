@@ -0,0 +1,173 @@
+import importlib
+import inspect
+import os
+import threading
+
+"""Registry of embedding providers shared by the whole process:
+    1- Load each model or client once, on first use, behind a lock
+    2- Expose one batched `embed(texts)` API for OpenAI, Voyage and SentenceTransformer
+    3- Warm models up at start-up so the first request does not pay the load cost
+    """
+
+OPENAI_EMBEDDING_MODEL = 'text-embedding-3-small'
+OPENAI_EMBEDDING_DIMENSIONS = 1536
+VOYAGE_EMBEDDING_MODEL = 'voyage-large-2'
+SENTENCE_TRANSFORMER_MODEL = 'all-MiniLM-L6-v2'
+
+
+class OpenAIEmbedder:
+    """
+    OpenAI embeddings through one reused `OpenAIEmbeddings` client.
+    """
+
+    provider = "openai"
+
+    def __init__(self, model=OPENAI_EMBEDDING_MODEL, dimensions=OPENAI_EMBEDDING_DIMENSIONS,
+                 batch_size=1000):
+        from langchain_openai import OpenAIEmbeddings
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self._client = OpenAIEmbeddings(model=model, dimensions=dimensions, chunk_size=batch_size)
+
+    def embed(self, texts, batch_size=None):
+        """
+        Embed `texts` in requests of at most `batch_size` inputs.
+        """
+        if batch_size is None or batch_size == self.batch_size:
+            return self._client.embed_documents(list(texts))
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(self._client.embed_documents(list(texts[start:start + batch_size])))
+        return vectors
+
+    def warm_up(self):
+        # building the client is the whole start-up cost; avoid a billed request
+        return self
+
+
+class VoyageEmbedder:
+    """
+    Voyage embeddings through one reused `voyageai.Client`.
+    """
+
+    provider = "voyage"
+
+    def __init__(self, model=VOYAGE_EMBEDDING_MODEL, dimensions=None, batch_size=128):
+        import voyageai
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self._client = voyageai.Client()
+
+    def embed(self, texts, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            result = self._client.embed(list(texts[start:start + batch_size]),
+                                        model=self.model, input_type=None)
+            vectors.extend(result.embeddings)
+        return vectors
+
+    def warm_up(self):
+        return self
+
+
+class SentenceTransformerEmbedder:
+    """
+    Local SentenceTransformer model, loaded from disk once per process.
+    """
+
+    provider = "sentence-transformers"
+
+    def __init__(self, model=SENTENCE_TRANSFORMER_MODEL, dimensions=None, batch_size=64):
+        from sentence_transformers import SentenceTransformer
+        self.model = model
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model)
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=None):
+        """
+        Return the embeddings as a NumPy array.
+        """
+        return self._model.encode(list(texts), batch_size=batch_size or self.batch_size)
+
+    def embed(self, texts, batch_size=None):
+        return self.encode(texts, batch_size=batch_size).tolist()
+
+    def warm_up(self):
+        # the first encode initializes kernels and tokenizer caches
+        self.encode(["warm up"])
+        return self
+
+
+PROVIDERS = {
+    OpenAIEmbedder.provider: OpenAIEmbedder,
+    VoyageEmbedder.provider: VoyageEmbedder,
+    SentenceTransformerEmbedder.provider: SentenceTransformerEmbedder,
+}
+
+# providers whose module is only imported when first requested
+LAZY_PROVIDERS = {
+    "sentence-transformers-parallel": "utils.local_embedding",
+}
+
+_embedders = {}
+_lock = threading.Lock()
+
+
+def get_embedder(provider="openai", model=None, dimensions=None, batch_size=None):
+    """
+    Return the shared embedder for (provider, model, dimensions), loading it on first use.
+
+    Args:
+        provider (str, optional): 'openai', 'voyage', 'sentence-transformers' or
+            'sentence-transformers-parallel'. Defaults to 'openai'.
+        model (str, optional): Model name. Defaults to the provider's default model.
+        dimensions (int, optional): Vector size, for providers that accept one; ignored
+            for providers whose model fixes it.
+        batch_size (int, optional): Default number of texts per request or encode batch.
+    Returns:
+        Embedder: Object with `embed(texts, batch_size=None)` and `warm_up()`.
+    """
+    if provider not in PROVIDERS and provider in LAZY_PROVIDERS:
+        importlib.import_module(LAZY_PROVIDERS[provider])
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {provider}")
+    # resolve defaults first so equivalent requests share one instance
+    defaults = inspect.signature(PROVIDERS[provider]).parameters
+    model = model or defaults['model'].default
+    if defaults['dimensions'].default is None:
+        # the model fixes the vector size, so a requested size must not load a second copy
+        dimensions = None
+    else:
+        dimensions = dimensions or defaults['dimensions'].default
+    batch_size = batch_size or defaults['batch_size'].default
+    key = (provider, model, dimensions, batch_size)
+    embedder = _embedders.get(key)
+    if embedder is None:
+        with _lock:
+            embedder = _embedders.get(key)
+            if embedder is None:
+                embedder = PROVIDERS[provider](model=model, dimensions=dimensions,
+                                               batch_size=batch_size)
+                _embedders[key] = embedder
+    return embedder
+
+
+def warm_up_embedders(providers=None):
+    """
+    Load and warm up the embedders named in `providers`, or in the comma-separated
+    EMBEDDING_WARMUP variable (default 'openai'), with their default settings.
+    """
+    if providers is None:
+        providers = [p.strip() for p in os.getenv("EMBEDDING_WARMUP", "openai").split(",") if p.strip()]
+    warmed = []
+    for provider in providers:
+        # warm-up is best effort; a missing key should surface on first real use
+        try:
+            warmed.append(get_embedder(provider).warm_up())
+        except Exception as e:
+            print(f"Could not warm up {provider} embedder: {e}")
+    return warmed
@@ -0,0 +1,265 @@
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+"""Two-tier cache for embedding vectors:
+    1- Build cache keys from text, model name and dimensions
+    2- Keep hot vectors in an in-memory LRU
+    3- Optionally persist vectors in SQLite with size-based eviction
+    4- Count hits and misses
+    5- Share one query-embedding cache per process
+    6- Share one persistent, content-addressed chunk-embedding store per process
+    """
+
+
+def normalize_query(text):
+    """
+    Normalize query text so trivially different spellings share a cache entry.
+    """
+    return " ".join(text.lower().split())
+
+
+def embedding_key(text, model, dimensions, normalize=False):
+    """
+    Return a hex digest identifying (text, model, dimensions).
+    """
+    if normalize:
+        text = normalize_query(text)
+    raw = f"{model}\x1f{dimensions}\x1f{text}".encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _pack(vector):
+    return struct.pack(f"<{len(vector)}f", *vector)
+
+
+def _unpack(blob):
+    return list(struct.unpack(f"<{len(blob) // 4}f", blob))
+
+
+class EmbeddingCache:
+    """
+    In-memory LRU of embedding vectors backed by an optional SQLite file.
+
+    Args:
+        max_memory_entries (int, optional): Vectors kept in memory. Defaults to 1024.
+        path (str, optional): SQLite file for the disk tier. None keeps the cache in memory only.
+        max_disk_entries (int, optional): Vectors kept on disk before the least
+            recently used are evicted. Defaults to 100000.
+        normalize (bool, optional): Normalize text before hashing, for user queries.
+    """
+
+    def __init__(self, max_memory_entries=1024, path=None, max_disk_entries=100_000,
+                 normalize=False):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.normalize = normalize
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            self._db.commit()
+
+    def key(self, text, model, dimensions):
+        return embedding_key(text, model, dimensions, normalize=self.normalize)
+
+    def get(self, text, model, dimensions):
+        """
+        Return the cached vector or None, updating hit/miss counters.
+        """
+        return self.get_many([text], model, dimensions)[0]
+
+    def get_many(self, texts, model, dimensions):
+        """
+        Return cached vectors for `texts`, None where there is no entry.
+        """
+        keys = [self.key(text, model, dimensions) for text in texts]
+        results = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[position] = vector
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(position)
+            if missing and self._db is not None:
+                found = self._disk_get(list(missing))
+                for key, vector in found.items():
+                    self._remember(key, vector)
+                    for position in missing.pop(key):
+                        results[position] = vector
+                        self.hits += 1
+                        self.disk_hits += 1
+            self.misses += sum(len(positions) for positions in missing.values())
+        return results
+
+    def put(self, text, model, dimensions, vector):
+        self.put_many([text], model, dimensions, [vector])
+
+    def put_many(self, texts, model, dimensions, vectors):
+        """
+        Store vectors for `texts` in both tiers.
+        """
+        items = [(self.key(text, model, dimensions), list(vector))
+                 for text, vector in zip(texts, vectors)]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            if self._db is not None and items:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, _pack(vector), now) for key, vector in items])
+                self._evict_disk()
+                self._db.commit()
+
+    def stats(self):
+        """
+        Return hit/miss counters and tier sizes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute(
+                    "SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, keys):
+        found = {}
+        # stay below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                part).fetchall()
+            for key, blob in rows:
+                found[key] = _unpack(blob)
+        if found:
+            now = time.time()
+            self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key in found])
+            self._db.commit()
+        return found
+
+    def _evict_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_used, rowid LIMIT ?)", (excess,))
+
+
+_query_cache = None
+_chunk_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache():
+    """
+    Return the process-wide query-embedding cache shared by every Streamlit session.
+
+    The disk tier is enabled by setting QUERY_EMBEDDING_CACHE_PATH.
+    """
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = EmbeddingCache(
+                    max_memory_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+                    path=os.getenv("QUERY_EMBEDDING_CACHE_PATH") or None,
+                    normalize=True,
+                )
+    return _query_cache
+
+
+def get_chunk_embedding_cache():
+    """
+    Return the process-wide store of chunk embeddings used by the ingest paths.
+
+    Entries are keyed by a hash of (chunk text, model, dimensions) and persist in
+    CHUNK_EMBEDDING_CACHE_PATH (default `.cache/chunk_embeddings.sqlite`), bounded
+    by CHUNK_EMBEDDING_CACHE_SIZE entries.
+    """
+    global _chunk_cache
+    if _chunk_cache is None:
+        with _query_cache_lock:
+            if _chunk_cache is None:
+                _chunk_cache = EmbeddingCache(
+                    max_memory_entries=int(os.getenv("CHUNK_EMBEDDING_MEMORY_SIZE", "4096")),
+                    path=os.getenv("CHUNK_EMBEDDING_CACHE_PATH",
+                                   os.path.join(".cache", "chunk_embeddings.sqlite")),
+                    max_disk_entries=int(os.getenv("CHUNK_EMBEDDING_CACHE_SIZE", "200000")),
+                )
+    return _chunk_cache
+
+
+def embed_with_cache(cache, texts, model, dimensions, embed_fn):
+    """
+    Embed `texts`, sending only cache misses to `embed_fn`.
+
+    Args:
+        cache (EmbeddingCache): Cache to read from and fill.
+        texts (list): Texts to embed.
+        model (str): Model name, part of the cache key.
+        dimensions (int): Vector size, part of the cache key.
+        embed_fn (callable): Receives the list of missing texts and returns their vectors.
+    Returns:
+        tuple: (vectors in the order of `texts`, number of texts served from the cache)
+    """
+    vectors = cache.get_many(texts, model, dimensions)
+    missing = {}
+    for position, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(texts[position], []).append(position)
+    if missing:
+        missing_texts = list(missing)
+        fresh = embed_fn(missing_texts)
+        cache.put_many(missing_texts, model, dimensions, fresh)
+        for text, vector in zip(missing_texts, fresh):
+            for position in missing[text]:
+                vectors[position] = vector
+    saved = len(texts) - sum(len(positions) for positions in missing.values())
+    return vectors, saved
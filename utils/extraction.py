@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from utils.artifact_cache import (get_artifact_cache, load_chunks, load_pages, pdf_sha256,
+                                  store_chunks, store_pages)
+
+"""Streaming, page-parallel PDF text extraction:
+    1- Read the PDF bytes once from a path or a file-like object
+    2- Yield page text in order, extracting large PDFs in a process pool
+    3- Split the page stream into chunks that keep their page number
+    4- Reuse the page text and chunks of PDFs already seen, from the artifact cache
+    """
+
+# PDFs with fewer pages are extracted in-process; the pool start-up costs more.
+POOL_MIN_PAGES = 40
+PAGES_PER_TASK = 8
+
+_worker_reader = None
+
+
+def read_pdf_bytes(pdf_file):
+    """
+    Return the raw bytes of a PDF given a path, a file-like object or the bytes themselves.
+    """
+    if isinstance(pdf_file, bytes):
+        return pdf_file
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as f:
+            return f.read()
+    if hasattr(pdf_file, 'getvalue'):
+        return pdf_file.getvalue()
+    if hasattr(pdf_file, 'seek'):
+        pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def _init_worker(pdf_bytes):
+    from pypdf import PdfReader
+    global _worker_reader
+    _worker_reader = PdfReader(BytesIO(pdf_bytes))
+
+
+def _extract_range(start, stop):
+    return [_worker_reader.pages[p].extract_text() or "" for p in range(start, stop)]
+
+
+def iter_pdf_pages(pdf_file, processes=None, pool_min_pages=POOL_MIN_PAGES,
+                   pages_per_task=PAGES_PER_TASK):
+    """
+    Yield (page_number, text) for every page of a PDF, in order.
+
+    Large PDFs are extracted by a pool of worker processes. At most two tasks per
+    worker are in flight, so the text held in memory stays bounded whatever
+    the page count.
+
+    Args:
+        pdf_file (str | file-like): Path or file-like object with the PDF.
+        processes (int, optional): Worker processes. Defaults to the CPU count.
+        pool_min_pages (int, optional): Page count from which the pool is used. Defaults to 40.
+        pages_per_task (int, optional): Pages extracted per worker task. Defaults to 8.
+    Yields:
+        tuple: (page number starting at 1, page text)
+    """
+    from pypdf import PdfReader
+    pdf_bytes = read_pdf_bytes(pdf_file)
+    reader = PdfReader(BytesIO(pdf_bytes))
+    total_pages = len(reader.pages)
+    processes = processes or os.cpu_count() or 1
+
+    if processes == 1 or total_pages < pool_min_pages:
+        for p in range(total_pages):
+            yield p + 1, reader.pages[p].extract_text() or ""
+        return
+
+    ranges = [(start, min(start + pages_per_task, total_pages))
+              for start in range(0, total_pages, pages_per_task)]
+    # spawn: this runs from threaded callers (Streamlit, job and loader workers), where fork can deadlock
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(pdf_bytes,),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+        next_range = 0
+        while pending or next_range < len(ranges):
+            while next_range < len(ranges) and len(pending) < 2 * processes:
+                start, stop = ranges[next_range]
+                pending.append((start, executor.submit(_extract_range, start, stop)))
+                next_range += 1
+            start, future = pending.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+
+
+def split_pages_into_chunks(pages, chunk_size=1000, chunk_overlap=100):
+    """
+    Split a stream of (page_number, text) into chunks that keep their page.
+
+    Args:
+        pages (iterable): Output of `iter_pdf_pages`.
+        chunk_size (int, optional): Maximum chunk length. Defaults to 1000.
+        chunk_overlap (int, optional): Overlap between chunks. Defaults to 100.
+    Yields:
+        tuple: (page number, chunk of text)
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    for page_number, text in pages:
+        for chunk in text_splitter.split_text(text):
+            yield page_number, chunk
+
+
+def get_page_texts(pdf_file, processes=None, cache=None):
+    """
+    Return the text of every page of a PDF, from the artifact cache when the
+    same PDF content was extracted before.
+
+    Args:
+        cache (ArtifactCache, optional): Defaults to the process-wide artifact cache.
+    """
+    pdf_bytes = read_pdf_bytes(pdf_file)
+    cache = cache or get_artifact_cache()
+    sha256 = pdf_sha256(pdf_bytes) if cache is not None else None
+    pages = load_pages(cache, sha256) if cache is not None else None
+    if pages is None:
+        pages = [text for _, text in iter_pdf_pages(BytesIO(pdf_bytes), processes=processes)]
+        if cache is not None:
+            store_pages(cache, sha256, pages)
+    return pages
+
+
+def _split_page_texts(page_texts, chunk_size, chunk_overlap):
+    lst_of_chunks = []
+    pages = []
+    for page_number, chunk in split_pages_into_chunks(
+            enumerate(page_texts, start=1), chunk_size=chunk_size, chunk_overlap=chunk_overlap):
+        lst_of_chunks.append(chunk)
+        pages.append(page_number)
+    return lst_of_chunks, pages
+
+
+def get_chunks_with_pages(pdf_file, chunk_size=1000, chunk_overlap=100, processes=None, cache=None,
+                          page_texts=None):
+    """
+    Extract and split a PDF, returning parallel lists of chunks and page numbers.
+
+    A PDF already split with the same parameters is served from the artifact
+    cache without extraction or splitting; one extracted before is only split.
+
+    Args:
+        cache (ArtifactCache, optional): Defaults to the process-wide artifact cache.
+        page_texts (list, optional): Page texts of this PDF already extracted by the
+            caller, split instead of extracting the PDF again.
+    """
+    cache = cache or get_artifact_cache()
+    if cache is None:
+        if page_texts is not None:
+            return _split_page_texts(page_texts, chunk_size, chunk_overlap)
+        lst_of_chunks = []
+        pages = []
+        for page_number, chunk in split_pages_into_chunks(
+                iter_pdf_pages(pdf_file, processes=processes),
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap):
+            lst_of_chunks.append(chunk)
+            pages.append(page_number)
+        return lst_of_chunks, pages
+
+    pdf_bytes = read_pdf_bytes(pdf_file)
+    sha256 = pdf_sha256(pdf_bytes)
+    cached = load_chunks(cache, sha256, chunk_size, chunk_overlap)
+    if cached is not None:
+        return cached
+    if page_texts is None:
+        page_texts = get_page_texts(pdf_bytes, processes=processes, cache=cache)
+    lst_of_chunks, pages = _split_page_texts(page_texts, chunk_size, chunk_overlap)
+    store_chunks(cache, sha256, chunk_size, chunk_overlap, page_texts, lst_of_chunks, pages)
+    return lst_of_chunks, pages
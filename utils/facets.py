@@ -0,0 +1,129 @@
+import datetime
+import json
+import threading
+
+"""Metadata filters built from the facets in dictionaries.json:
+    1- Load the genre, theme and status vocabularies once per process
+    2- Build a Pinecone metadata filter from the selected facets
+    3- Evaluate the same filter against metadata for the local indexes
+    """
+
+FACETS_PATH = "dictionaries.json"
+MIN_YEAR = 1900
+
+
+class Facets:
+    """
+    Facet vocabularies of the regulations catalog.
+
+    Args:
+        dictionaries (dict): Contents of dictionaries.json.
+    """
+
+    def __init__(self, dictionaries):
+        self.dictionaries = dictionaries
+        self.genres = tuple(dictionaries['genre_dict'])
+        self.themes = tuple(dictionaries['theme_dict'])
+        self.statuses = tuple(dictionaries['status_dict'])
+        self.min_year = MIN_YEAR
+        self.max_year = datetime.datetime.now().year
+
+    def build_filter(self, genres=(), themes=(), statuses=(), year_range=None, dependency=None):
+        """
+        Return the Pinecone metadata filter for the selected facets, or None
+        when nothing is selected.
+
+        Args:
+            genres, themes, statuses (list, optional): Allowed values; empty allows any.
+            year_range (tuple, optional): Inclusive (first, last) year; the full range allows any.
+            dependency (str, optional): Exact dependency name.
+        Raises:
+            ValueError: A value is not part of its facet vocabulary.
+        """
+        clauses = []
+        for field, selected, vocabulary in (('genre', genres, self.genres),
+                                            ('theme', themes, self.themes),
+                                            ('status', statuses, self.statuses)):
+            unknown = [value for value in selected or () if value not in vocabulary]
+            if unknown:
+                raise ValueError(f"Unknown {field}: {', '.join(unknown)}")
+            if selected:
+                clauses.append({field: {'$in': list(selected)}})
+        if year_range is not None:
+            first, last = int(year_range[0]), int(year_range[1])
+            if first > self.min_year or last < self.max_year:
+                clauses.append({'year': {'$gte': first, '$lte': last}})
+        if dependency:
+            clauses.append({'dependency': {'$eq': dependency.strip()}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+_facets = {}
+_facets_lock = threading.Lock()
+
+
+def load_facets(path=FACETS_PATH):
+    """
+    Return the facets of `path`, read from disk only the first time.
+    """
+    facets = _facets.get(path)
+    if facets is None:
+        with _facets_lock:
+            facets = _facets.get(path)
+            if facets is None:
+                with open(path, 'r') as json_file:
+                    facets = Facets(json.load(json_file))
+                _facets[path] = facets
+    return facets
+
+
+_OPERATORS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand,
+}
+
+
+def matches_filter(metadata, filter):
+    """
+    Return True when `metadata` satisfies a Pinecone-style metadata filter.
+
+    Supports $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $and and $or, and the
+    shorthand {field: value} for $eq.
+    """
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                try:
+                    if not _OPERATORS[operator](value, operand):
+                        return False
+                except TypeError:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def filter_key(filter):
+    """
+    Return a stable string for `filter`, for caches keyed by filter.
+    """
+    return json.dumps(filter, sort_keys=True, ensure_ascii=False) if filter else ""
@@ -0,0 +1,441 @@
+import hashlib
+import io
+import math
+import re
+import threading
+from utils.facets import matches_filter
+
+"""Local in-memory stand-ins for external services, used by tests and offline runs:
+    1- FakeIndex: subset of the Pinecone Index API (upsert, query, fetch, list, delete, stats)
+    2- make_pdf: build a small text PDF in memory
+    3- fake_embed: deterministic embeddings without network access
+    4- FakeDynamoDB: subset of the DynamoDB client API (put_item, batch_write_item,
+       query, batch_get_item)
+    5- FakeS3: subset of the S3 client API (single and multipart uploads, head, copy)
+    6- FakeTextract: asynchronous and single-page text detection of `make_pdf` PDFs
+    """
+
+
+def _record_parts(record):
+    """
+    Normalize a tuple or dict record into (id, values, metadata).
+    """
+    if isinstance(record, dict):
+        return record['id'], list(record['values']), record.get('metadata') or {}
+    vector_id, values = record[0], record[1]
+    metadata = record[2] if len(record) > 2 else {}
+    return vector_id, list(values), metadata or {}
+
+
+class FakeIndex:
+    """
+    In-memory Pinecone Index stand-in.
+
+    Args:
+        dimension (int, optional): Vector size reported by stats. Defaults to 1536.
+        fail_times (int, optional): Number of upsert calls that raise before succeeding.
+        visibility_delay_calls (int, optional): Number of `describe_index_stats`
+            calls before new writes become visible, mimicking eventual consistency.
+    """
+
+    def __init__(self, dimension=1536, fail_times=0, visibility_delay_calls=0):
+        self.dimension = dimension
+        self.fail_times = fail_times
+        self.visibility_delay_calls = visibility_delay_calls
+        self.namespaces = {}
+        self.upsert_calls = 0
+        self.stats_calls = 0
+        self._pending_stats = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace="", **kwargs):
+        with self._lock:
+            self.upsert_calls += 1
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise ConnectionError("simulated upsert failure")
+            store = self.namespaces.setdefault(namespace, {})
+            for record in vectors:
+                vector_id, values, metadata = _record_parts(record)
+                store[vector_id] = (values, metadata)
+            self._pending_stats = self.visibility_delay_calls
+        return {'upserted_count': len(vectors)}
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            self.stats_calls += 1
+            if self._pending_stats > 0:
+                self._pending_stats -= 1
+                return {'dimension': self.dimension, 'namespaces': {},
+                        'total_vector_count': 0}
+            namespaces = {name: {'vector_count': len(store)}
+                          for name, store in self.namespaces.items()}
+            return {
+                'dimension': self.dimension,
+                'namespaces': namespaces,
+                'total_vector_count': sum(len(s) for s in self.namespaces.values()),
+            }
+
+    def fetch(self, ids, namespace=""):
+        store = self.namespaces.get(namespace, {})
+        vectors = {i: {'id': i, 'values': store[i][0], 'metadata': store[i][1]}
+                   for i in ids if i in store}
+        return {'namespace': namespace, 'vectors': vectors}
+
+    def list(self, prefix=None, namespace="", limit=100):
+        ids = sorted(i for i in self.namespaces.get(namespace, {})
+                     if prefix is None or i.startswith(prefix))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def delete(self, ids=None, delete_all=False, namespace="", filter=None):
+        with self._lock:
+            store = self.namespaces.get(namespace, {})
+            if delete_all:
+                store.clear()
+            else:
+                for vector_id in ids or []:
+                    store.pop(vector_id, None)
+        return {}
+
+    def query(self, vector, top_k=10, namespace="", include_values=False,
+              include_metadata=True, filter=None, **kwargs):
+        store = self.namespaces.get(namespace, {})
+        norm_q = sum(v * v for v in vector) ** 0.5 or 1.0
+        scored = []
+        for vector_id, (values, metadata) in store.items():
+            if not matches_filter(metadata or {}, filter):
+                continue
+            norm_v = sum(v * v for v in values) ** 0.5 or 1.0
+            score = sum(a * b for a, b in zip(vector, values)) / (norm_q * norm_v)
+            scored.append((score, vector_id, values, metadata))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        matches = []
+        for score, vector_id, values, metadata in scored[:top_k]:
+            match = {'id': vector_id, 'score': score}
+            if include_values:
+                match['values'] = values
+            if include_metadata:
+                match['metadata'] = metadata
+            matches.append(match)
+        return {'namespace': namespace, 'matches': matches}
+
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages_text):
+    """
+    Build a PDF with one page per string in `pages_text`, using Helvetica and
+    one text line per input line. Only Latin-1 characters are supported.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+               "/Encoding /WinAnsiEncoding >>"]
+    page_refs = []
+    for text in pages_text:
+        lines = ["BT /F1 10 Tf 12 TL 40 800 Td"]
+        for line in text.split("\n"):
+            lines.append(f"({_pdf_escape(line)}) Tj T*")
+        lines.append("ET")
+        stream = "\n".join(lines).encode('latin-1')
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode('latin-1')
+                       + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>")
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode()
+    return bytes(out)
+
+
+def fake_embed(texts, dimensions=1536):
+    """
+    Return deterministic unit vectors derived from a hash of each text.
+    Texts sharing words get similar vectors, which keeps retrieval tests meaningful.
+    """
+    vectors = []
+    for text in texts:
+        vector = [0.0] * dimensions
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            position = int.from_bytes(digest[:4], 'little') % dimensions
+            vector[position] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        vectors.append([v / norm for v in vector])
+    return vectors
+
+
+class FakeDynamoDB:
+    """
+    In-memory DynamoDB client stand-in keyed by (hierarchy_code, sort_by).
+
+    Args:
+        unprocessed_rounds (int, optional): Number of batch calls that leave their
+            last item or key unprocessed, mimicking throttling.
+        page_size (int, optional): Items per `query` page. Defaults to 100.
+    """
+
+    def __init__(self, unprocessed_rounds=0, page_size=100):
+        self.tables = {}
+        self.unprocessed_rounds = unprocessed_rounds
+        self.page_size = page_size
+        self.batch_calls = 0
+        self.read_calls = 0
+        self._lock = threading.Lock()
+
+    def _store(self, table_name, item):
+        key = (item['hierarchy_code']['S'], item['sort_by']['S'])
+        self.tables.setdefault(table_name, {})[key] = item
+
+    def put_item(self, TableName, Item, **kwargs):
+        with self._lock:
+            self._store(TableName, Item)
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        unprocessed = {}
+        with self._lock:
+            self.batch_calls += 1
+            for table_name, requests in RequestItems.items():
+                if self.unprocessed_rounds > 0 and requests:
+                    unprocessed[table_name] = requests[-1:]
+                    requests = requests[:-1]
+                for request in requests:
+                    self._store(table_name, request['PutRequest']['Item'])
+            if unprocessed:
+                self.unprocessed_rounds -= 1
+        return {'UnprocessedItems': unprocessed,
+                'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues,
+              ExclusiveStartKey=None, Limit=None, **kwargs):
+        # supports "hierarchy_code = :v" with an optional "AND begins_with(sort_by, :p)"
+        hierarchy_code = ExpressionAttributeValues[
+            re.search(r"hierarchy_code = (:\w+)", KeyConditionExpression).group(1)]['S']
+        prefix = re.search(r"begins_with\(sort_by, (:\w+)\)", KeyConditionExpression)
+        prefix = ExpressionAttributeValues[prefix.group(1)]['S'] if prefix else ""
+        with self._lock:
+            self.read_calls += 1
+            keys = sorted(key for key in self.tables.get(TableName, {})
+                          if key[0] == hierarchy_code and key[1].startswith(prefix))
+            if ExclusiveStartKey:
+                start = (ExclusiveStartKey['hierarchy_code']['S'], ExclusiveStartKey['sort_by']['S'])
+                keys = [key for key in keys if key > start]
+            page = keys[:Limit or self.page_size]
+            response = {'Items': [self.tables[TableName][key] for key in page]}
+        if len(keys) > len(page):
+            response['LastEvaluatedKey'] = {'hierarchy_code': {'S': page[-1][0]},
+                                            'sort_by': {'S': page[-1][1]}}
+        return response
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        unprocessed = {}
+        with self._lock:
+            self.read_calls += 1
+            for table_name, request in RequestItems.items():
+                keys = request['Keys']
+                if self.unprocessed_rounds > 0 and keys:
+                    unprocessed[table_name] = {'Keys': keys[-1:]}
+                    keys = keys[:-1]
+                table = self.tables.get(table_name, {})
+                responses[table_name] = [table[key] for key in
+                                         ((k['hierarchy_code']['S'], k['sort_by']['S']) for k in keys)
+                                         if key in table]
+            if unprocessed:
+                self.unprocessed_rounds -= 1
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+
+class FakeS3Error(Exception):
+    """
+    Error shaped like botocore's ClientError, with the code under response['Error'].
+    """
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeS3:
+    """
+    In-memory S3 client stand-in covering single and multipart uploads.
+
+    Attributes:
+        objects (dict): {(bucket, key): {'Body': bytes, 'Metadata': dict}}.
+        calls (dict): Number of calls per method name.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count('head_object')
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise FakeS3Error("404")
+        return {'ContentLength': len(stored['Body']), 'Metadata': dict(stored['Metadata'])}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._count('get_object')
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise FakeS3Error("NoSuchKey")
+        return {'Body': io.BytesIO(stored['Body']), 'Metadata': dict(stored['Metadata'])}
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+        self._count('put_object')
+        body = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self.objects[(Bucket, Key)] = {'Body': body, 'Metadata': dict(Metadata or {})}
+        return {'ETag': hashlib.md5(body).hexdigest()}
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None, **kwargs):
+        self._count('create_multipart_upload')
+        with self._lock:
+            upload_id = f"upload-{len(self._uploads) + 1}"
+            self._uploads[upload_id] = {'Metadata': dict(Metadata or {}), 'parts': {}}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count('upload_part')
+        etag = hashlib.md5(Body).hexdigest()
+        with self._lock:
+            self._uploads[UploadId]['parts'][PartNumber] = (etag, Body)
+        return {'ETag': etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count('complete_multipart_upload')
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+            body = b""
+            for part in MultipartUpload['Parts']:
+                etag, data = upload['parts'][part['PartNumber']]
+                if etag != part['ETag']:
+                    raise FakeS3Error("InvalidPart")
+                body += data
+            self.objects[(Bucket, Key)] = {'Body': body, 'Metadata': upload['Metadata']}
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._count('abort_multipart_upload')
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, MetadataDirective='COPY', **kwargs):
+        self._count('copy_object')
+        with self._lock:
+            source = self.objects[(CopySource['Bucket'], CopySource['Key'])]
+            metadata = dict(Metadata or {}) if MetadataDirective == 'REPLACE' else dict(source['Metadata'])
+            self.objects[(Bucket, Key)] = {'Body': source['Body'], 'Metadata': metadata}
+        return {}
+
+    @property
+    def pending_uploads(self):
+        return len(self._uploads)
+
+
+class FakeTextract:
+    """
+    Textract client stand-in that "recognizes" the embedded text of PDFs built
+    with `make_pdf`, reading staged documents from a FakeS3.
+
+    Args:
+        s3 (FakeS3): Where asynchronous jobs read their documents.
+        polls_in_progress (int, optional): IN_PROGRESS answers before a job finishes.
+        drop_pages (set, optional): Page numbers every asynchronous job leaves out,
+            finishing with PARTIAL_SUCCESS.
+        blocks_per_response (int, optional): Blocks per result page. Defaults to 50.
+        max_jobs (int, optional): Running jobs above which starts are throttled.
+    """
+
+    def __init__(self, s3, polls_in_progress=0, drop_pages=(), blocks_per_response=50, max_jobs=None):
+        self.s3 = s3
+        self.polls_in_progress = polls_in_progress
+        self.drop_pages = set(drop_pages)
+        self.blocks_per_response = blocks_per_response
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self.calls = {}
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _running(self):
+        return sum(1 for job in self.jobs.values() if job['polls'] <= self.polls_in_progress)
+
+    @staticmethod
+    def _blocks(pdf_bytes, skip=()):
+        from pypdf import PdfReader
+        blocks = []
+        for number, page in enumerate(PdfReader(io.BytesIO(pdf_bytes)).pages, start=1):
+            if number in skip:
+                continue
+            blocks.append({'BlockType': 'PAGE', 'Page': number})
+            blocks += [{'BlockType': 'LINE', 'Page': number, 'Text': line}
+                       for line in (page.extract_text() or "").split("\n") if line.strip()]
+        return blocks
+
+    def start_document_text_detection(self, DocumentLocation, **kwargs):
+        location = DocumentLocation['S3Object']
+        with self._lock:
+            self._count('start_document_text_detection')
+            if self.max_jobs is not None and self._running() >= self.max_jobs:
+                raise FakeS3Error("LimitExceededException")
+            body = self.s3.objects[(location['Bucket'], location['Name'])]['Body']
+            job_id = f"job-{len(self.jobs) + 1}"
+            self.jobs[job_id] = {'blocks': self._blocks(body, self.drop_pages), 'polls': 0,
+                                 'partial': bool(self.drop_pages)}
+            self.max_running = max(self.max_running, self._running())
+        return {'JobId': job_id}
+
+    def get_document_text_detection(self, JobId, NextToken=None, **kwargs):
+        with self._lock:
+            self._count('get_document_text_detection')
+            job = self.jobs[JobId]
+            if NextToken is None:
+                job['polls'] += 1
+                if job['polls'] <= self.polls_in_progress:
+                    return {'JobStatus': 'IN_PROGRESS'}
+            start = int(NextToken or 0)
+            end = start + self.blocks_per_response
+            response = {'JobStatus': 'PARTIAL_SUCCESS' if job['partial'] else 'SUCCEEDED',
+                        'Blocks': job['blocks'][start:end]}
+            if end < len(job['blocks']):
+                response['NextToken'] = str(end)
+            return response
+
+    def detect_document_text(self, Document, **kwargs):
+        with self._lock:
+            self._count('detect_document_text')
+        return {'Blocks': self._blocks(Document['Bytes'])}
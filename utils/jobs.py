@@ -0,0 +1,278 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+"""Local job queue that runs ingestion outside the Streamlit script thread:
+    1- Persist every job, its parameters and its per-stage progress in SQLite
+    2- Keep the uploaded PDF on disk until its job succeeds
+    3- Run queued jobs on a pool of JOB_WORKERS worker threads, started on first use
+    4- Report progress by stage: extracted, chunked, embedded, upserted
+    5- Put jobs interrupted by a restart back in the queue
+    """
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(".cache", "jobs.sqlite"))
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", os.path.join(".cache", "job_uploads"))
+# jobs running at once in this process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# how often a page showing active jobs refreshes their progress
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+STAGES = ('extracted', 'chunked', 'embedded', 'upserted')
+ACTIVE = ('queued', 'running')
+
+
+def _run_ingest(params, pdf_path, progress):
+    # imported here so the queue itself does not load the ingestion stack
+    from utils.processes import ingest_pdf
+    return ingest_pdf(pdf_path, index_name=params['index_name'], namespace=params['namespace'],
+                      metadata=params['metadata'], progress=progress)
+
+
+RUNNERS = {'ingest': _run_ingest}
+
+
+class JobQueue:
+    """
+    Persistent queue of ingestion jobs with a worker pool.
+
+    Only one process should own a queue file: on start-up, jobs left running
+    are assumed to have been interrupted and are queued again.
+
+    Args:
+        path (str): SQLite file with the job states.
+        upload_dir (str): Where submitted PDFs wait for their job.
+        workers (int, optional): Jobs run at once. Defaults to JOB_WORKERS.
+        runners (dict, optional): Job kind to callable(params, pdf_path, progress).
+            Defaults to RUNNERS.
+    """
+
+    def __init__(self, path, upload_dir, workers=None, runners=None):
+        self.path = path
+        self.upload_dir = upload_dir
+        self.workers = workers or JOB_WORKERS
+        self.runners = runners or RUNNERS
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(upload_dir, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                         "id TEXT PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, "
+                         "params TEXT NOT NULL, status TEXT NOT NULL, stage TEXT, "
+                         "progress TEXT NOT NULL, error TEXT, result TEXT, "
+                         "created REAL NOT NULL, updated REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created)")
+        interrupted = self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+        self._db.commit()
+        if interrupted:
+            print(f"Jobs re-queued after a restart: {interrupted}")
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._threads = []
+        self._closed = False
+        if self._count('queued'):
+            self._start_workers()
+
+    def _count(self, status):
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def _start_workers(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _pdf_path(self, job_id):
+        return os.path.join(self.upload_dir, f"{job_id}.pdf")
+
+    def submit(self, kind, params, pdf_bytes, name=""):
+        """
+        Queue a job and return its id right away.
+
+        Args:
+            kind (str): Runner name, e.g. 'ingest'.
+            params (dict): JSON-serializable runner parameters.
+            pdf_bytes (bytes): PDF the job works on, kept until the job succeeds.
+            name (str, optional): Label shown with the job's progress.
+        """
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with open(self._pdf_path(job_id), 'wb') as f:
+            f.write(pdf_bytes)
+        now = time.time()
+        with self._wake:
+            self._db.execute("INSERT INTO jobs (id, kind, name, params, status, progress, created, updated) "
+                             "VALUES (?, ?, ?, ?, 'queued', '{}', ?, ?)",
+                             (job_id, kind, name, json.dumps(params, default=str), now, now))
+            self._db.commit()
+            self._wake.notify()
+        self._start_workers()
+        return job_id
+
+    def retry(self, job_id):
+        """
+        Queue a failed job again; its PDF is still on disk.
+        """
+        with self._wake:
+            updated = self._db.execute("UPDATE jobs SET status = 'queued', error = NULL, updated = ? "
+                                       "WHERE id = ? AND status = 'failed'", (time.time(), job_id)).rowcount
+            self._db.commit()
+            self._wake.notify()
+        if updated:
+            self._start_workers()
+        return bool(updated)
+
+    def get(self, job_id):
+        """
+        Return the job as a dict, or None.
+        """
+        jobs = self.list([job_id])
+        return jobs[0] if jobs else None
+
+    def list(self, job_ids=None, limit=50):
+        """
+        Return jobs as dicts with 'id', 'kind', 'name', 'status', 'stage',
+        'progress' ({stage: count}), 'error', 'result', 'created' and 'updated',
+        newest first.
+
+        Args:
+            job_ids (list, optional): Only these jobs. Defaults to the latest `limit` jobs.
+        """
+        columns = "id, kind, name, status, stage, progress, error, result, created, updated"
+        with self._lock:
+            if job_ids is None:
+                rows = self._db.execute(f"SELECT {columns} FROM jobs ORDER BY created DESC LIMIT ?",
+                                        (limit,)).fetchall()
+            else:
+                job_ids = list(job_ids)
+                placeholders = ",".join("?" * len(job_ids))
+                rows = self._db.execute(f"SELECT {columns} FROM jobs WHERE id IN ({placeholders}) "
+                                        f"ORDER BY created DESC", job_ids).fetchall() if job_ids else []
+        keys = columns.split(", ")
+        jobs = [dict(zip(keys, row)) for row in rows]
+        for job in jobs:
+            job['progress'] = json.loads(job['progress'])
+            job['result'] = json.loads(job['result']) if job['result'] else None
+        return jobs
+
+    def wait(self, job_id, timeout=None, interval=0.05):
+        """
+        Block until the job is no longer queued or running and return it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] not in ACTIVE:
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} still {job['status']}")
+            time.sleep(interval)
+
+    def close(self):
+        """
+        Stop the workers once their current job ends.
+        """
+        with self._wake:
+            self._closed = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _claim(self):
+        # under the lock, so two workers never take the same job
+        row = self._db.execute("SELECT id, kind, params FROM jobs WHERE status = 'queued' "
+                               "ORDER BY created LIMIT 1").fetchone()
+        if row is not None:
+            self._db.execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ?",
+                             (time.time(), row[0]))
+            self._db.commit()
+        return row
+
+    def _update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+            self._db.commit()
+
+    def _work(self):
+        while True:
+            with self._wake:
+                job = self._claim()
+                while job is None:
+                    if self._closed:
+                        return
+                    self._wake.wait(timeout=5)
+                    job = self._claim()
+            self._run(*job)
+
+    def _run(self, job_id, kind, params):
+        progress = {}
+
+        def report(stage, count):
+            progress[stage] = count
+            self._update(job_id, stage=stage, progress=json.dumps(progress))
+
+        started = time.perf_counter()
+        try:
+            result = self.runners[kind](json.loads(params), self._pdf_path(job_id), report)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e))
+            return
+        print(f"Job {job_id} done in {time.perf_counter() - started:.1f}s")
+        self._update(job_id, status='done', result=json.dumps(result, default=str))
+        try:
+            os.remove(self._pdf_path(job_id))
+        except OSError:
+            pass
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Return the process-wide job queue at JOB_DB_PATH, shared by every Streamlit session.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(JOB_DB_PATH, JOB_UPLOAD_DIR)
+    return _queue
+
+
+def submit_ingest(pdf_file, index_name, namespace, metadata, name="", queue=None):
+    """
+    Queue the ingestion of an uploaded PDF and return the job id.
+
+    Args:
+        pdf_file (str | file-like): Path or file-like object with the PDF.
+        index_name (str): Index the chunks are written to.
+        namespace (str): Namespace within the index.
+        metadata (dict): Regulation metadata stored with every chunk.
+        name (str, optional): Label shown with the job's progress.
+        queue (JobQueue, optional): Defaults to the process-wide queue.
+    """
+    from utils.extraction import read_pdf_bytes
+    params = {'index_name': index_name, 'namespace': namespace, 'metadata': metadata}
+    return (queue or get_job_queue()).submit('ingest', params, read_pdf_bytes(pdf_file),
+                                             name=name or getattr(pdf_file, 'name', ""))
+
+
+def stage_fraction(job):
+    """
+    Return the share of STAGES the job has completed, for a progress bar.
+    """
+    if job['status'] == 'done':
+        return 1.0
+    if job['stage'] not in STAGES:
+        return 0.0
+    return (STAGES.index(job['stage']) + 1) / len(STAGES)
@@ -0,0 +1,277 @@
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from utils.compact import match_field
+from utils.facets import filter_key, matches_filter
+
+"""Local BM25 index over the ingested chunks, for exact article and code lookups:
+    1- Tokenize text so codes like 1076 or 2.2.3.1 stay whole and match by prefix
+    2- Add and replace a regulation's chunks incrementally, persisted in SQLite
+    3- Score queries with BM25 against in-memory postings
+    4- Fuse lexical and vector rankings with reciprocal rank fusion (RRF)
+    5- Recognize queries that are plain code lookups
+    """
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(".cache", "lexical"))
+# k in 1 / (k + rank); 60 is the value from the original RRF paper
+RRF_K = 60
+STOPWORDS = {"a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "o",
+             "para", "por", "que", "se", "su", "un", "una", "y"}
+GENRE_WORDS = {"articulo", "art", "ley", "decreto", "resolucion", "circular", "acuerdo", "codigo",
+               "ordenanza", "norma", "numeral", "paragrafo", "literal", "inciso"}
+# regulation fields indexed with each chunk, so "Decreto 1076" matches its chunks
+INDEXED_FIELDS = ('genre', 'code', 'year')
+_TOKEN = re.compile(r"\d+(?:\.\d+)+|\w+")
+
+
+def tokenize(text):
+    """
+    Lowercase, accent-free tokens without stopwords.
+
+    A dotted code such as 2.2.3.1 also yields its prefixes 2.2 and 2.2.3, so an
+    article lookup matches the chunks of its sub-articles.
+    """
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode()
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if token in STOPWORDS:
+            continue
+        if "." in token:
+            parts = token.split(".")
+            tokens.extend(".".join(parts[:n]) for n in range(2, len(parts)))
+        tokens.append(token)
+    return tokens
+
+
+def is_code_lookup(query, max_words=8):
+    """
+    Return True for short queries made of regulation words and numbers,
+    e.g. "Decreto 1076 artículo 2.2.3".
+    """
+    tokens = [t for t in _TOKEN.findall(unicodedata.normalize('NFKD', query.lower())
+                                       .encode('ascii', 'ignore').decode()) if t not in STOPWORDS]
+    if not tokens or len(tokens) > max_words:
+        return False
+    has_number = any(t[0].isdigit() for t in tokens)
+    words = [t for t in tokens if not t[0].isdigit()]
+    return has_number and all(word in GENRE_WORDS or len(word) <= 2 for word in words)
+
+
+def code_tokens(query):
+    """
+    Return the numeric tokens of a query, which a lexical hit must all contain.
+    """
+    return {t for t in tokenize(query) if t[0].isdigit()}
+
+
+class _Namespace:
+    """
+    In-memory postings of one namespace.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self.terms = {}
+        self.total_length = 0
+
+    def add(self, vector_id, counts):
+        self.remove(vector_id)
+        self.terms[vector_id] = counts
+        length = sum(counts.values())
+        self.lengths[vector_id] = length
+        self.total_length += length
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[vector_id] = tf
+
+    def remove(self, vector_id):
+        counts = self.terms.pop(vector_id, None)
+        if counts is None:
+            return
+        self.total_length -= self.lengths.pop(vector_id)
+        for term in counts:
+            ids = self.postings.get(term)
+            if ids is not None:
+                ids.pop(vector_id, None)
+                if not ids:
+                    del self.postings[term]
+
+
+class LexicalIndex:
+    """
+    BM25 index of one vector index's chunks, one set of postings per namespace.
+
+    Args:
+        path (str): SQLite file persisting chunk terms and metadata.
+        k1 (float, optional): BM25 term-frequency saturation. Defaults to 1.2.
+        b (float, optional): BM25 length normalization. Defaults to 0.75.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks ("
+                         "namespace TEXT NOT NULL, id TEXT NOT NULL, metadata TEXT NOT NULL, "
+                         "terms TEXT NOT NULL, PRIMARY KEY (namespace, id))")
+        self._db.commit()
+        self._namespaces = {}
+        # ids allowed by recent filters, dropped whenever the index changes
+        self._allowed = {}
+        self._lock = threading.RLock()
+
+    def _namespace(self, namespace):
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            # postings are rebuilt from the stored term counts on first use
+            ns = _Namespace()
+            for vector_id, terms in self._db.execute(
+                    "SELECT id, terms FROM chunks WHERE namespace = ?", (namespace,)):
+                ns.add(vector_id, json.loads(terms))
+            self._namespaces[namespace] = ns
+        return ns
+
+    def add(self, namespace, records, prefix=None):
+        """
+        Index (id, values, metadata) records whose metadata holds the chunk 'text'.
+
+        Args:
+            prefix (str, optional): Regulation prefix; its other chunks are removed.
+        """
+        rows = []
+        counts = {}
+        for record in records:
+            vector_id, metadata = record[0], (record[2] if len(record) > 2 else None) or {}
+            text = " ".join([str(metadata.get(field, "")) for field in INDEXED_FIELDS]
+                            + [metadata.get('text', "")])
+            counts[vector_id] = Counter(tokenize(text))
+            rows.append((namespace, vector_id, json.dumps(metadata, ensure_ascii=False, default=str),
+                         json.dumps(counts[vector_id])))
+        with self._lock:
+            ns = self._namespace(namespace)
+            if prefix is not None:
+                stale = [vector_id for vector_id in ns.terms
+                         if vector_id.startswith(prefix) and vector_id not in counts]
+                for vector_id in stale:
+                    ns.remove(vector_id)
+                self._db.executemany("DELETE FROM chunks WHERE namespace = ? AND id = ?",
+                                     [(namespace, vector_id) for vector_id in stale])
+            for vector_id, terms in counts.items():
+                ns.add(vector_id, dict(terms))
+            self._allowed.clear()
+            self._db.executemany("INSERT OR REPLACE INTO chunks (namespace, id, metadata, terms) "
+                                 "VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+            self._allowed.clear()
+            self._db.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+            self._db.commit()
+
+    def _allowed_ids(self, namespace, filter):
+        key = (namespace, filter_key(filter))
+        allowed = self._allowed.get(key)
+        if allowed is None:
+            allowed = {vector_id for vector_id, metadata in self._db.execute(
+                "SELECT id, metadata FROM chunks WHERE namespace = ?", (namespace,))
+                if matches_filter(json.loads(metadata), filter)}
+            if len(self._allowed) >= 32:
+                self._allowed.pop(next(iter(self._allowed)))
+            self._allowed[key] = allowed
+        return allowed
+
+    def search(self, query, namespace, top_k=10, filter=None):
+        """
+        Return the BM25 `top_k` matches of `query` as {'id', 'score', 'metadata'} dicts,
+        among the chunks whose metadata satisfies `filter` when one is given.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            ns = self._namespace(namespace)
+            n = len(ns.lengths)
+            if not n or not terms:
+                return []
+            allowed = self._allowed_ids(namespace, filter) if filter else None
+            average = ns.total_length / n or 1.0
+            scores = {}
+            for term in terms:
+                ids = ns.postings.get(term)
+                if not ids:
+                    continue
+                idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+                for vector_id, tf in ids.items():
+                    if allowed is not None and vector_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * ns.lengths[vector_id] / average)
+                    scores[vector_id] = scores.get(vector_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            metadata = self._metadata(namespace, [vector_id for vector_id, _ in top])
+            return [{'id': vector_id, 'score': score, 'metadata': metadata.get(vector_id, {})}
+                    for vector_id, score in top]
+
+    def contains_all(self, vector_id, namespace, terms):
+        """
+        Return True when chunk `vector_id` contains every term in `terms`.
+        """
+        with self._lock:
+            counts = self._namespace(namespace).terms.get(vector_id, {})
+            return all(term in counts for term in terms)
+
+    def _metadata(self, namespace, ids):
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        return {vector_id: json.loads(metadata) for vector_id, metadata in self._db.execute(
+            f"SELECT id, metadata FROM chunks WHERE namespace = ? AND id IN ({placeholders})",
+            [namespace] + ids)}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(index_name):
+    """
+    Return the process-wide lexical index of `index_name`, under LEXICAL_INDEX_PATH.
+    """
+    index = _indexes.get(index_name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(index_name)
+            if index is None:
+                index = LexicalIndex(os.path.join(LEXICAL_INDEX_PATH, f"{index_name}.sqlite"))
+                _indexes[index_name] = index
+    return index
+
+
+def reciprocal_rank_fusion(rankings, top_k=10, k=RRF_K):
+    """
+    Fuse ranked match lists: each match scores the sum of 1 / (k + rank) over
+    the lists it appears in.
+
+    Returns:
+        list (dict): The best `top_k` matches, keeping the first metadata seen
+        that carries the chunk text.
+    """
+    scores = {}
+    matches = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, start=1):
+            vector_id = match_field(match, 'id')
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (k + rank)
+            metadata = match_field(match, 'metadata') or {}
+            if vector_id not in matches or ('text' in metadata and 'text' not in matches[vector_id]):
+                matches[vector_id] = metadata
+    top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+    return [{'id': vector_id, 'score': score, 'metadata': matches[vector_id]} for vector_id, score in top]
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils.embedders import PROVIDERS, SENTENCE_TRANSFORMER_MODEL
+
+"""Multi-core SentenceTransformer encoding for bulk ingestion without the API:
+    1- Load the model once in each of a pool of CPU worker processes
+    2- Sort inputs by length so each batch pads to similar lengths
+    3- Return vectors in input order, optionally normalized and as float16
+    4- Report throughput in chunks/s
+    """
+
+# texts sent to a worker per task; large enough to amortize inter-process copies
+TEXTS_PER_TASK = 512
+
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_task(texts, batch_size, normalize):
+    return _worker_model.encode(texts, batch_size=batch_size, normalize_embeddings=normalize,
+                                convert_to_numpy=True, show_progress_bar=False)
+
+
+class ParallelSentenceTransformerEmbedder:
+    """
+    SentenceTransformer encoding spread over a pool of CPU worker processes.
+
+    Args:
+        model (str, optional): Model name. Defaults to 'all-MiniLM-L6-v2'.
+        dimensions (int, optional): Ignored; the model fixes the vector size.
+        batch_size (int, optional): Encode batch size inside each worker. Defaults to 64.
+        processes (int, optional): Worker processes. Defaults to LOCAL_EMBEDDING_PROCESSES
+            or the CPU count.
+        normalize (bool, optional): Return unit-length vectors. Defaults to True.
+        half (bool, optional): Return float16 vectors. Defaults to LOCAL_EMBEDDING_FLOAT16=1.
+    """
+
+    provider = "sentence-transformers-parallel"
+
+    def __init__(self, model=SENTENCE_TRANSFORMER_MODEL, dimensions=None, batch_size=64,
+                 processes=None, normalize=True, half=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.half = os.getenv("LOCAL_EMBEDDING_FLOAT16") == "1" if half is None else half
+        self.processes = processes or int(os.getenv("LOCAL_EMBEDDING_PROCESSES", "0")) \
+            or os.cpu_count() or 1
+        threads = max(1, (os.cpu_count() or 1) // self.processes)
+        # spawn: forking a process that already holds torch threads can deadlock
+        self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                         mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker, initargs=(model, threads))
+        self.dimensions = dimensions
+        self.chunks = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def encode(self, texts, batch_size=None):
+        """
+        Return the embeddings of `texts` as a NumPy array, in input order.
+        """
+        started = time.perf_counter()
+        texts = list(texts)
+        batch_size = batch_size or self.batch_size
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        tasks = [order[start:start + TEXTS_PER_TASK] for start in range(0, len(order), TEXTS_PER_TASK)]
+        futures = [self._pool.submit(_encode_task, [texts[i] for i in task], batch_size, self.normalize)
+                   for task in tasks]
+        vectors = None
+        for task, future in zip(tasks, futures):
+            result = future.result()
+            if vectors is None:
+                vectors = np.empty((len(texts), result.shape[1]),
+                                   dtype=np.float16 if self.half else np.float32)
+            vectors[task] = result
+        if vectors is None:
+            vectors = np.empty((0, self.dimensions or 0), dtype=np.float16 if self.half else np.float32)
+        self.dimensions = vectors.shape[1] or self.dimensions
+        with self._lock:
+            self.chunks += len(texts)
+            self.seconds += time.perf_counter() - started
+        return vectors
+
+    def embed(self, texts, batch_size=None):
+        return self.encode(texts, batch_size=batch_size).tolist()
+
+    def warm_up(self):
+        # start the workers and load the model before the first real batch
+        list(self._pool.map(_encode_task, [["warm up"]] * self.processes,
+                            [1] * self.processes, [self.normalize] * self.processes))
+        if self.dimensions is None:
+            self.dimensions = self.encode(["warm up"]).shape[1]
+        return self
+
+    def stats(self):
+        """
+        Return chunks encoded, busy seconds and chunks/s since the pool started.
+        """
+        with self._lock:
+            return {'chunks': self.chunks, 'seconds': self.seconds,
+                    'chunks_per_second': self.chunks / self.seconds if self.seconds else 0.0}
+
+    def close(self):
+        self._pool.shutdown()
+
+
+PROVIDERS[ParallelSentenceTransformerEmbedder.provider] = ParallelSentenceTransformerEmbedder
@@ -0,0 +1,367 @@
+import json
+import os
+import sqlite3
+import threading
+from urllib.parse import quote, unquote
+import numpy as np
+from utils.facets import filter_key, matches_filter
+
+"""Local vector index with the same interface as a Pinecone Index:
+    1- Keep each namespace as a memory-mapped float32 matrix plus a SQLite table of ids and metadata
+    2- Upsert, fetch, list by prefix and delete vectors
+    3- Store rows normalized, with their norms aside for fetch, so a top-k cosine query
+       is one vectorized matrix product and an argpartition
+    4- Restrict queries with Pinecone-style metadata filters, cached as row masks
+    5- Optionally store vectors as int8 codes with one scale per vector
+    6- Persist everything under one directory per index
+    """
+
+INITIAL_CAPACITY = 1024
+DEFAULT_NAMESPACE_DIR = "__default__"
+# int8 rows are widened to float32 this many at a time while scoring
+SCORE_BLOCK_ROWS = 16384
+
+
+def _open_matrix(path, dtype, capacity, columns):
+    # (re)size the backing file and map it as a (capacity, columns) matrix
+    itemsize = np.dtype(dtype).itemsize
+    if not os.path.exists(path) or os.path.getsize(path) < capacity * columns * itemsize:
+        with open(path, 'ab') as f:
+            f.truncate(capacity * columns * itemsize)
+    return np.memmap(path, dtype=dtype, mode='r+', shape=(capacity, columns))
+
+
+class _Namespace:
+    """
+    Vectors of one namespace: rows of a memory-mapped matrix addressed by slot.
+    """
+
+    def __init__(self, path, dimension, quantization=None):
+        self.path = path
+        self.dimension = dimension
+        self.quantization = quantization
+        os.makedirs(path, exist_ok=True)
+        self.dtype = np.int8 if quantization == "int8" else np.float32
+        self.matrix_path = os.path.join(path, "vectors.i8" if quantization == "int8" else "vectors.f32")
+        self.scales_path = os.path.join(path, "scales.f32")
+        self.norms_path = os.path.join(path, "norms.f32")
+        # indexes written before rows were stored normalized have no norms file
+        legacy = os.path.exists(self.matrix_path) and not os.path.exists(self.norms_path)
+        self.db = sqlite3.connect(os.path.join(path, "metadata.sqlite"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS vectors ("
+                        "slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT)")
+        self.db.commit()
+
+        itemsize = np.dtype(self.dtype).itemsize
+        if os.path.exists(self.matrix_path):
+            self.capacity = os.path.getsize(self.matrix_path) // (dimension * itemsize)
+        else:
+            self.capacity = INITIAL_CAPACITY
+        self._map(self.capacity)
+
+        self.ids = [None] * self.capacity
+        self.slots = {}
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        for slot, vector_id in self.db.execute("SELECT slot, id FROM vectors"):
+            self.ids[slot] = vector_id
+            self.slots[vector_id] = slot
+            self.alive[slot] = True
+        self.size = max(self.slots.values()) + 1 if self.slots else 0
+        self.free = [slot for slot in range(self.size) if not self.alive[slot]]
+        # row masks of recent filters, dropped whenever the namespace changes
+        self._masks = {}
+        if legacy:
+            for slot in self.slots.values():
+                values = self.matrix[slot].astype(np.float32)
+                if self.scales is not None:
+                    values *= self.scales[slot, 0]
+                self._store(slot, values)
+            self._flush()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _map(self, capacity):
+        self.matrix = _open_matrix(self.matrix_path, self.dtype, capacity, self.dimension)
+        self.norms = _open_matrix(self.norms_path, np.float32, capacity, 1)
+        self.scales = None
+        if self.quantization == "int8":
+            self.scales = _open_matrix(self.scales_path, np.float32, capacity, 1)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self._flush()
+        del self.matrix, self.norms
+        if self.scales is not None:
+            del self.scales
+        self._map(capacity)
+        extra = capacity - self.capacity
+        self.ids.extend([None] * extra)
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self.capacity = capacity
+
+    def _flush(self):
+        self.matrix.flush()
+        self.norms.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    def _store(self, slot, values):
+        # rows hold unit vectors, so scoring needs no per-row division
+        norm = float(np.linalg.norm(values))
+        self.norms[slot] = norm
+        if norm:
+            values = values / norm
+        if self.scales is not None:
+            # symmetric int8: the largest component maps to +-127
+            peak = float(np.abs(values).max())
+            scale = peak / 127.0 if peak else 1.0
+            values = np.round(values / scale).astype(np.int8)
+            self.scales[slot] = scale
+        self.matrix[slot] = values
+
+    def _slot_for(self, vector_id):
+        if vector_id in self.slots:
+            return self.slots[vector_id]
+        if self.free:
+            return self.free.pop()
+        if self.size >= self.capacity:
+            self._grow(self.size + 1)
+        self.size += 1
+        return self.size - 1
+
+    def upsert(self, records):
+        rows = []
+        for vector_id, values, metadata in records:
+            values = np.asarray(values, dtype=np.float32)
+            if values.shape != (self.dimension,):
+                raise ValueError(f"Vector dimension {values.shape[0]} does not match "
+                                 f"the index dimension {self.dimension}")
+            slot = self._slot_for(vector_id)
+            self._store(slot, values)
+            self.ids[slot] = vector_id
+            self.slots[vector_id] = slot
+            self.alive[slot] = True
+            rows.append((slot, vector_id, json.dumps(metadata or {}, ensure_ascii=False)))
+        self._flush()
+        self._masks.clear()
+        self.db.executemany("DELETE FROM vectors WHERE id = ?", [(r[1],) for r in rows])
+        self.db.executemany("INSERT OR REPLACE INTO vectors (slot, id, metadata) VALUES (?, ?, ?)",
+                            rows)
+        self.db.commit()
+
+    def delete(self, ids):
+        slots = [self.slots.pop(vector_id) for vector_id in ids if vector_id in self.slots]
+        for slot in slots:
+            self.ids[slot] = None
+            self.alive[slot] = False
+            self.free.append(slot)
+        self._masks.clear()
+        self.db.executemany("DELETE FROM vectors WHERE slot = ?", [(slot,) for slot in slots])
+        self.db.commit()
+
+    def metadata_for(self, slots):
+        found = {}
+        slots = [int(slot) for slot in slots]
+        for start in range(0, len(slots), 500):
+            part = slots[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for slot, metadata in self.db.execute(
+                    f"SELECT slot, metadata FROM vectors WHERE slot IN ({placeholders})", part):
+                found[slot] = json.loads(metadata) if metadata else {}
+        return found
+
+    def mask_for(self, filter):
+        """
+        Return a boolean mask of the rows whose metadata satisfies `filter`.
+        """
+        key = filter_key(filter)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.zeros(self.size, dtype=bool)
+            for slot, metadata in self.db.execute("SELECT slot, metadata FROM vectors"):
+                mask[slot] = matches_filter(json.loads(metadata) if metadata else {}, filter)
+            if len(self._masks) >= 32:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = mask
+        return mask
+
+    def scores(self, vector):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm:
+            query = query / norm
+        if self.scales is None:
+            scores = self.matrix[:self.size] @ query
+        else:
+            # codes times their scale approximate the unit row
+            scores = np.empty(self.size, dtype=np.float32)
+            for start in range(0, self.size, SCORE_BLOCK_ROWS):
+                stop = min(start + SCORE_BLOCK_ROWS, self.size)
+                scores[start:stop] = ((self.matrix[start:stop].astype(np.float32) @ query)
+                                      * self.scales[start:stop, 0])
+        if self.free:
+            # deleted rows keep their old values until the slot is reused
+            scores[~self.alive[:self.size]] = -np.inf
+        return scores
+
+    def values(self, slot):
+        values = self.matrix[slot].astype(np.float32) * self.norms[slot, 0]
+        if self.scales is not None:
+            values *= self.scales[slot, 0]
+        return values.tolist()
+
+
+class LocalIndex:
+    """
+    Local stand-in for a Pinecone Index, persisted under `path`.
+
+    Args:
+        path (str): Directory holding one sub-directory per namespace.
+        dimension (int, optional): Vector size. Read from disk for an existing index.
+        quantization (str, optional): 'int8' to store one byte per component instead of
+            four. Read from disk for an existing index.
+    """
+
+    def __init__(self, path, dimension=None, quantization=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._config_path = os.path.join(path, "index.json")
+        self.dimension = dimension
+        self.quantization = quantization
+        if os.path.exists(self._config_path):
+            with open(self._config_path, 'r') as f:
+                config = json.load(f)
+            self.dimension = config['dimension']
+            self.quantization = config.get('quantization')
+        elif dimension is not None:
+            self._write_config()
+        self._namespaces = {}
+        self._lock = threading.RLock()
+
+    def _write_config(self):
+        with open(self._config_path, 'w') as f:
+            json.dump({'dimension': self.dimension, 'metric': 'cosine',
+                       'quantization': self.quantization}, f)
+
+    def ensure_dimension(self, dimension, quantization=None):
+        """
+        Set the vector size and quantization of a new index; an existing index keeps its own.
+        """
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = dimension
+                self.quantization = quantization
+                self._write_config()
+
+    @staticmethod
+    def _dir_name(namespace):
+        return quote(namespace, safe="") if namespace else DEFAULT_NAMESPACE_DIR
+
+    def _namespace(self, namespace, create=False):
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            path = os.path.join(self.path, self._dir_name(namespace))
+            if not create and not os.path.isdir(path):
+                return None
+            if self.dimension is None:
+                return None
+            ns = _Namespace(path, self.dimension, self.quantization)
+            self._namespaces[namespace] = ns
+        return ns
+
+    def _namespace_names(self):
+        names = set(self._namespaces)
+        for entry in os.listdir(self.path):
+            if os.path.isdir(os.path.join(self.path, entry)):
+                names.add("" if entry == DEFAULT_NAMESPACE_DIR else unquote(entry))
+        return names
+
+    def upsert(self, vectors, namespace="", **kwargs):
+        records = []
+        for record in vectors:
+            if isinstance(record, dict):
+                records.append((record['id'], record['values'], record.get('metadata')))
+            else:
+                records.append((record[0], record[1], record[2] if len(record) > 2 else None))
+        with self._lock:
+            if self.dimension is None and records:
+                self.dimension = len(records[0][1])
+                self._write_config()
+            self._namespace(namespace, create=True).upsert(records)
+        return {'upserted_count': len(records)}
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            namespaces = {}
+            for name in self._namespace_names():
+                ns = self._namespace(name)
+                if ns is not None and len(ns):
+                    namespaces[name] = {'vector_count': len(ns)}
+            return {
+                'dimension': self.dimension,
+                'namespaces': namespaces,
+                'total_vector_count': sum(n['vector_count'] for n in namespaces.values()),
+            }
+
+    def fetch(self, ids, namespace=""):
+        with self._lock:
+            ns = self._namespace(namespace)
+            vectors = {}
+            if ns is not None:
+                slots = {vector_id: ns.slots[vector_id] for vector_id in ids if vector_id in ns.slots}
+                metadata = ns.metadata_for(slots.values())
+                for vector_id, slot in slots.items():
+                    vectors[vector_id] = {'id': vector_id,
+                                          'values': ns.values(slot),
+                                          'metadata': metadata.get(slot, {})}
+            return {'namespace': namespace, 'vectors': vectors}
+
+    def list(self, prefix=None, namespace="", limit=100):
+        with self._lock:
+            ns = self._namespace(namespace)
+            ids = sorted(i for i in (ns.slots if ns is not None else ())
+                         if prefix is None or i.startswith(prefix))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def delete(self, ids=None, delete_all=False, namespace="", filter=None):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is not None:
+                ns.delete(list(ns.slots) if delete_all else ids or [])
+        return {}
+
+    def query(self, vector, top_k=10, namespace="", include_values=False,
+              include_metadata=True, filter=None, **kwargs):
+        """
+        Return the `top_k` most cosine-similar vectors of `namespace`, among
+        those whose metadata satisfies `filter` when one is given.
+        """
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or not len(ns):
+                return {'namespace': namespace, 'matches': []}
+            scores = ns.scores(vector)
+            candidates = len(ns)
+            if filter:
+                mask = ns.mask_for(filter)
+                scores[~mask] = -np.inf
+                candidates = int(np.count_nonzero(mask & ns.alive[:ns.size]))
+                if not candidates:
+                    return {'namespace': namespace, 'matches': []}
+            k = min(top_k, candidates)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            metadata = ns.metadata_for(top) if include_metadata else {}
+            matches = []
+            for slot in top:
+                match = {'id': ns.ids[slot], 'score': float(scores[slot])}
+                if include_values:
+                    match['values'] = ns.values(slot)
+                if include_metadata:
+                    match['metadata'] = metadata.get(int(slot), {})
+                matches.append(match)
+            return {'namespace': namespace, 'matches': matches}
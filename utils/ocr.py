@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from utils.artifact_cache import pdf_sha256
+from utils.extraction import read_pdf_bytes
+from utils.s3_upload import existing_sha256, upload_stream
+
+"""OCR of scanned PDFs with asynchronous Amazon Textract jobs:
+    1- Key every PDF by the SHA-256 of its content and serve cached pages first
+    2- Stage uncached PDFs in S3 and run up to OCR_MAX_JOBS text detection jobs at once
+    3- Poll every running job in one loop, backing off while they are in progress
+    4- Cache each page as soon as its job finishes
+    5- Give up on jobs that run past OCR_JOB_TIMEOUT
+    6- Retry only the pages a job left out, one synchronous call per page
+    """
+
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join(".cache", "ocr_pages.sqlite"))
+# Textract's default quota of concurrent asynchronous text detection jobs is low
+OCR_MAX_JOBS = int(os.getenv("OCR_MAX_JOBS", "10"))
+OCR_BUCKET = os.getenv("OCR_BUCKET") or os.getenv("AWS_BUCKET_NAME", "")
+OCR_PREFIX = "ocr/"
+OCR_REGION = os.getenv("OCR_REGION", "us-east-2")
+POLL_SECONDS = 1.0
+MAX_POLL_SECONDS = 15.0
+# a job still running after this many seconds is abandoned and its pages read one by one
+OCR_JOB_TIMEOUT = float(os.getenv("OCR_JOB_TIMEOUT", "900"))
+PAGE_RETRY_WORKERS = 4
+# start calls rejected with these codes are retried on the next polling round
+THROTTLE_CODES = {"LimitExceededException", "ProvisionedThroughputExceededException",
+                  "ThrottlingException"}
+
+
+class PageCache:
+    """
+    SQLite cache of OCR page text, keyed by PDF content hash and page number.
+
+    Args:
+        path (str): SQLite file; ':memory:' keeps the cache in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages ("
+                         "sha256 TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, "
+                         "PRIMARY KEY (sha256, page))")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get_pages(self, sha256):
+        """
+        Return {page number: text} of the cached pages of a PDF.
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT page, text FROM pages WHERE sha256 = ?", (sha256,)))
+
+    def put_pages(self, sha256, pages):
+        """
+        Cache {page number: text} for a PDF.
+        """
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO pages (sha256, page, text) VALUES (?, ?, ?)",
+                                 [(sha256, page, text) for page, text in pages.items()])
+            self._db.commit()
+
+
+def _error_code(error):
+    return str(getattr(error, 'response', {}).get('Error', {}).get('Code', ""))
+
+
+def blocks_to_pages(blocks):
+    """
+    Return {page number: text} from Textract blocks, joining each page's LINE blocks.
+
+    Every page Textract processed has a PAGE block, so blank pages map to "".
+    """
+    pages = {}
+    for block in blocks:
+        page = block.get('Page', 1)
+        if block['BlockType'] == 'PAGE':
+            pages.setdefault(page, [])
+        elif block['BlockType'] == 'LINE':
+            pages.setdefault(page, []).append(block['Text'])
+    return {page: "\n".join(lines) for page, lines in pages.items()}
+
+
+def single_page_pdf(pdf_bytes, page):
+    """
+    Return a PDF holding only `page` (starting at 1) of `pdf_bytes`.
+    """
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter()
+    writer.add_page(PdfReader(BytesIO(pdf_bytes)).pages[page - 1])
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class OcrStage:
+    """
+    Batch OCR of PDFs with asynchronous Textract jobs and a page cache.
+
+    Args:
+        textract (client): boto3 Textract client or a compatible stand-in.
+        s3 (client): S3 client where PDFs are staged for Textract.
+        bucket_name (str): Staging bucket, readable by Textract.
+        cache (PageCache): Page text cache.
+        max_jobs (int, optional): Jobs running at once. Defaults to OCR_MAX_JOBS.
+        poll_seconds (float, optional): First polling interval; it grows to
+            MAX_POLL_SECONDS while no job finishes. Defaults to POLL_SECONDS.
+        job_timeout (float, optional): Seconds after which a running job is
+            abandoned and its pages retried one by one. Defaults to OCR_JOB_TIMEOUT.
+    """
+
+    def __init__(self, textract, s3, bucket_name, cache, max_jobs=None, poll_seconds=None,
+                 job_timeout=None):
+        self.textract = textract
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.cache = cache
+        self.max_jobs = max_jobs or OCR_MAX_JOBS
+        self.poll_seconds = POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.job_timeout = OCR_JOB_TIMEOUT if job_timeout is None else job_timeout
+
+    def _stage_pdf(self, sha256, pdf_bytes):
+        # staged under the content hash, so an unchanged PDF is not uploaded twice
+        key = f"{OCR_PREFIX}{sha256}.pdf"
+        existing = existing_sha256(self.s3, self.bucket_name, key)
+        upload_stream(BytesIO(pdf_bytes).read, self.bucket_name, key, sha256=sha256,
+                      existing=existing, client=self.s3)
+        return key
+
+    def _start(self, key):
+        try:
+            response = self.textract.start_document_text_detection(
+                DocumentLocation={'S3Object': {'Bucket': self.bucket_name, 'Name': key}})
+        except Exception as e:
+            if _error_code(e) in THROTTLE_CODES:
+                return None
+            raise
+        return response['JobId']
+
+    def _poll(self, job_id):
+        # None while the job runs; the pages it processed once it is over
+        response = self.textract.get_document_text_detection(JobId=job_id)
+        status = response['JobStatus']
+        if status == 'IN_PROGRESS':
+            return None
+        if status == 'FAILED':
+            print(f"Textract job {job_id} failed: {response.get('StatusMessage', '')}")
+            return {}
+        blocks = list(response.get('Blocks', []))
+        while response.get('NextToken'):
+            response = self.textract.get_document_text_detection(JobId=job_id,
+                                                                 NextToken=response['NextToken'])
+            blocks.extend(response.get('Blocks', []))
+        return blocks_to_pages(blocks)
+
+    def _detect_page(self, pdf_bytes, page):
+        try:
+            response = self.textract.detect_document_text(
+                Document={'Bytes': single_page_pdf(pdf_bytes, page)})
+        except Exception as e:
+            print(f"Textract page {page} failed: {e}")
+            return None
+        return blocks_to_pages(response.get('Blocks', [])).get(1, "")
+
+    def run(self, pdfs):
+        """
+        OCR every PDF, reusing cached pages and running the uncached PDFs as
+        concurrent Textract jobs.
+
+        Args:
+            pdfs (list): Paths, file-like objects or bytes of PDFs.
+        Returns:
+            list (dict): Per PDF, in order: 'sha256', 'pages' (text per page, "" for
+            pages that could not be read), 'missing' page numbers and 'cached' pages.
+        """
+        from pypdf import PdfReader
+        documents = []
+        unique = {}
+        for pdf in pdfs:
+            pdf_bytes = read_pdf_bytes(pdf)
+            sha256 = pdf_sha256(pdf_bytes)
+            if sha256 not in unique:
+                cached = self.cache.get_pages(sha256)
+                unique[sha256] = {'sha256': sha256, 'bytes': pdf_bytes, 'cached': len(cached),
+                                  'total': len(PdfReader(BytesIO(pdf_bytes)).pages), 'text': cached}
+            # copies of the same PDF share one entry and are read once
+            documents.append(unique[sha256])
+
+        started = time.perf_counter()
+        # a PDF without any cached page goes through an async job; one with some
+        # cached pages only needs its missing pages
+        queued = [document for document in unique.values() if not document['text'] and document['total']]
+        running = {}
+        jobs = 0
+        timeouts = 0
+        interval = self.poll_seconds
+        while queued or running:
+            while queued and len(running) < self.max_jobs:
+                document = queued[0]
+                try:
+                    job_id = self._start(self._stage_pdf(document['sha256'], document['bytes']))
+                except Exception as e:
+                    # its pages are retried one by one below
+                    print(f"Textract job could not start for {document['sha256'][:12]}: {e}")
+                    queued.pop(0)
+                    continue
+                if job_id is None:
+                    break
+                running[job_id] = (queued.pop(0), time.monotonic())
+                jobs += 1
+            finished = False
+            for job_id in list(running):
+                pages = self._poll(job_id)
+                document, job_started = running[job_id]
+                if pages is None:
+                    if time.monotonic() - job_started < self.job_timeout:
+                        continue
+                    # stuck jobs must not hold up ingestion; the page retries below cover it
+                    print(f"Textract job {job_id} timed out after {self.job_timeout:.0f}s")
+                    pages = {}
+                    timeouts += 1
+                del running[job_id]
+                pages = {page: text for page, text in pages.items() if 1 <= page <= document['total']}
+                self.cache.put_pages(document['sha256'], pages)
+                document['text'].update(pages)
+                finished = True
+            if queued or running:
+                interval = self.poll_seconds if finished else min(MAX_POLL_SECONDS, interval * 1.5)
+                time.sleep(interval)
+
+        retries = [(document, page) for document in unique.values()
+                   for page in range(1, document['total'] + 1) if page not in document['text']]
+        if retries:
+            with ThreadPoolExecutor(max_workers=PAGE_RETRY_WORKERS) as executor:
+                texts = list(executor.map(lambda task: self._detect_page(*task),
+                                          [(document['bytes'], page) for document, page in retries]))
+            for (document, page), text in zip(retries, texts):
+                if text is not None:
+                    document['text'][page] = text
+                    self.cache.put_pages(document['sha256'], {page: text})
+
+        results = []
+        for document in documents:
+            text = document['text']
+            results.append({'sha256': document['sha256'],
+                            'pages': [text.get(page, "") for page in range(1, document['total'] + 1)],
+                            'missing': [page for page in range(1, document['total'] + 1) if page not in text],
+                            'cached': document['cached']})
+        print(f"OCR: {len(documents)} PDFs | Cached pages: {sum(d['cached'] for d in unique.values())} | "
+              f"Jobs: {jobs} | Timed out: {timeouts} | Page retries: {len(retries)} | "
+              f"Missing pages: {sum(len(r['missing']) for r in results)} | "
+              f"Time: {time.perf_counter() - started:.1f}s")
+        return results
+
+
+_ocr_stage = None
+_ocr_stage_lock = threading.Lock()
+
+
+def get_ocr_stage():
+    """
+    Return the process-wide OCR stage on shared Textract and S3 clients, staging
+    PDFs in OCR_BUCKET and caching pages at OCR_CACHE_PATH.
+    """
+    global _ocr_stage
+    if _ocr_stage is None:
+        with _ocr_stage_lock:
+            if _ocr_stage is None:
+                import boto3
+                from utils.s3_upload import get_s3_client
+                _ocr_stage = OcrStage(boto3.client("textract", region_name=OCR_REGION), get_s3_client(),
+                                      OCR_BUCKET, PageCache(OCR_CACHE_PATH))
+    return _ocr_stage
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from utils.local_index import LocalIndex
+
+"""Process-wide registry of Pinecone clients and index handles:
+    1- Share one connection-pooled Pinecone client per process
+    2- Share one Index handle per index name
+    3- Cache index readiness and dimension with a TTL
+    4- Create missing indexes once
+    5- Serve a local memory-mapped index instead of Pinecone when VECTOR_BACKEND=local
+    """
+
+POOL_THREADS = 8
+INDEX_INFO_TTL = 300.0
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", os.path.join(".cache", "vector_index"))
+
+_lock = threading.RLock()
+_client = None
+_indexes = {}
+_index_info = {}
+
+
+def use_local_backend():
+    """
+    Return True when vectors live in the local index instead of Pinecone.
+    """
+    return VECTOR_BACKEND == "local"
+
+
+def get_pinecone_client():
+    """
+    Return the process-wide Pinecone client, creating it on first use.
+
+    The client keeps its own HTTP connection pool, so every Streamlit session,
+    `get_response` and the ingest paths reuse the same connections.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # the pinecone package is only imported once an index is used
+                from pinecone import Pinecone
+                _client = Pinecone(pool_threads=POOL_THREADS)
+    return _client
+
+
+def get_index(index_name):
+    """
+    Return the shared Index handle for `index_name`.
+
+    Args:
+        index_name (str): Pinecone index name.
+    Returns:
+        Index: Handle reused by every caller in the process. With
+            VECTOR_BACKEND=local this is a LocalIndex under LOCAL_INDEX_PATH.
+    """
+    index = _indexes.get(index_name)
+    if index is None:
+        with _lock:
+            index = _indexes.get(index_name)
+            if index is None:
+                if use_local_backend():
+                    index = LocalIndex(os.path.join(LOCAL_INDEX_PATH, index_name))
+                else:
+                    index = get_pinecone_client().Index(
+                        name=index_name, pool_threads=POOL_THREADS)
+                _indexes[index_name] = index
+    return index
+
+
+def describe_index(index_name, ttl=INDEX_INFO_TTL):
+    """
+    Return cached readiness and dimension for `index_name`.
+
+    The control-plane `describe_index` call is only made when the cached
+    entry is missing, older than `ttl` seconds, or the index was not ready.
+
+    Args:
+        index_name (str): Pinecone index name.
+        ttl (float, optional): Seconds a ready entry stays valid. Defaults to 300.
+    Returns:
+        dict: {'ready': bool, 'dimension': int, 'checked_at': float}
+    """
+    now = time.monotonic()
+    info = _index_info.get(index_name)
+    if info is not None and info['ready'] and now - info['checked_at'] < ttl:
+        return info
+    if use_local_backend():
+        info = {'ready': True, 'dimension': get_index(index_name).dimension,
+                'checked_at': now}
+        _index_info[index_name] = info
+        return info
+    description = get_pinecone_client().describe_index(name=index_name)
+    info = {
+        'ready': bool(description.status['ready']),
+        'dimension': description.dimension,
+        'checked_at': now,
+    }
+    _index_info[index_name] = info
+    return info
+
+
+def index_is_ready(index_name):
+    """
+    Return True when the index is ready, using the cached description.
+    """
+    return describe_index(index_name)['ready']
+
+
+def wait_until_ready(index_name, poll_interval=1.0):
+    """
+    Block until the index reports ready. Returns immediately when a
+    cached ready entry exists.
+    """
+    while not describe_index(index_name)['ready']:
+        time.sleep(poll_interval)
+
+
+def ensure_index(index_name, dimensions=1536, metric="cosine", quantization=None):
+    """
+    Create the serverless index if it does not exist and wait for it to be ready.
+
+    `list_indexes` is only called when nothing about the index is cached yet.
+
+    Args:
+        index_name (str): Pinecone index name.
+        dimensions (int, optional): Vector size for a new index. Defaults to 1536.
+        metric (str, optional): Similarity metric for a new index. Defaults to "cosine".
+        quantization (str, optional): 'int8' to quantize a new local index. Pinecone
+            stores float32 only, so it is ignored there.
+    Returns:
+        Index: Shared handle for the ready index.
+    """
+    if use_local_backend():
+        index = get_index(index_name)
+        index.ensure_dimension(dimensions, quantization=quantization)
+        return index
+    if quantization:
+        print(f"Pinecone does not store {quantization} vectors; {index_name} uses float32")
+    if index_name not in _index_info:
+        pc = get_pinecone_client()
+        if index_name not in pc.list_indexes().names():
+            from pinecone import ServerlessSpec
+            pc.create_index(
+                name=index_name,
+                dimension=dimensions,
+                metric=metric,
+                spec=ServerlessSpec(
+                    cloud="aws",
+                    region="us-east-1",
+                ),
+            )
+    wait_until_ready(index_name)
+    return get_index(index_name)
+
+
+def reset_registry():
+    """
+    Drop every cached client, handle and index description.
+    """
+    global _client
+    with _lock:
+        _client = None
+        _indexes.clear()
+        _index_info.clear()
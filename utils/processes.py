@@ -1,18 +1,24 @@
-from pypdf import PdfReader
-from langchain_openai import OpenAIEmbeddings
-import voyageai
-from pinecone import Pinecone, ServerlessSpec
+import json
 import time
-from uuid import uuid4
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
-from langchain_community.chat_models import ChatOpenAI
-from langchain_community.document_loaders import AmazonTextractPDFLoader
-import boto3
 from botocore.exceptions import NoCredentialsError
-from langchain_text_splitters import RecursiveCharacterTextSplitter, CharacterTextSplitter
-import requests
+from utils.pinecone_client import ensure_index, get_index, index_is_ready
+from utils.upsert import records_size, upsert_records
+from utils.extraction import get_chunks_with_pages, get_page_texts, read_pdf_bytes
+from utils.reindex import chunk_ids, record_prefix, reindex_document
+from utils.answer_cache import get_answer_cache
+from utils.embedders import OPENAI_EMBEDDING_DIMENSIONS, OPENAI_EMBEDDING_MODEL, get_embedder
+from utils.embedding_cache import embed_with_cache, get_chunk_embedding_cache, get_query_embedding_cache
+from utils.context import assemble_context, get_token_counter
+from utils.catalog import resolve_catalog
+from utils.chunk_store import get_chunk_store, resolve_context, slim_metadata_enabled, slim_records
+from utils.compact import (SEARCH_DIMENSIONS, SEARCH_QUANTIZATION, compact_enabled, compact_query,
+                           compact_records, get_full_vector_store, match_field)
+from utils.facets import filter_key
+from utils.ocr import get_ocr_stage
+from utils.s3_upload import upload_fileobj, upload_url
+from utils.lexical import code_tokens, get_lexical_index, is_code_lookup, reciprocal_rank_fusion
+from utils.tracing import annotate, span
 
 """Functions for main processes:
     1- Get text from a PDF file
@@ -24,6 +30,8 @@ import requests
     7- Get response to user query by augmenting it with text from Pinecone Index
     8- Create iterable object to upsert to Pinecone Index
     9- Prepare data to upsert
+    10- Answer code lookups from the lexical index and fuse it with vector results
+    11- Time every stage of chat and ingestion requests as tracing spans
     """
 
 load_dotenv()
@@ -33,18 +41,14 @@ def get_text_from_pdf(pdf_file):
     """
     Get the text from a PDF
     """
-    reader = PdfReader(pdf_file)
-    page = reader.pages
-    all_text = ""
-    for p in range(len(page)):
-        all_text += page[p].extract_text()
-    return all_text
+    return "".join(get_page_texts(pdf_file))
 
 
 def split_text_into_chunks(docs, chunk_size=1000, chunk_overlap=100):
     """
     Split PDF text into chunks of specified size for embedding
     """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
@@ -56,6 +60,7 @@ def split_text_into_documents(docs, chunk_size=1000, chunk_overlap=100):
     """
     Split PDF text into chunks of specified size for embedding
     """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
@@ -68,66 +73,95 @@ def anthropic_emmbed_data(lst_of_chunks):
     Embed chunks of text using Anthropic model and
     feed with the text from chunks the metadata.
     """
-    vo = voyageai.Client()
-    result = vo.embed(lst_of_chunks, model="voyage-large-2",
-                      input_type=None)
-    return result.embeddings
+    return get_embedder("voyage").embed(lst_of_chunks)
 
 
 def sentence_transformer_embed_data(lst_of_chunks):
     """
     Embed chunks of text using SentenceTransformer model.
-    Sentences are passed as a list of string.
+    Sentences are passed as a list of string. The model is loaded once per process.
 
     Args:
         lst_of_chunks (list): List of chunks of text.
     Returns:
         vector (float): List of values from 0 to 1.
     """
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    return model.encode(lst_of_chunks)
+    return get_embedder("sentence-transformers").encode(lst_of_chunks)
 
 
-def pinecone_store_data(vectors, index_name, namespace, dimensions=1536):
+def pinecone_store_data(vectors, index_name, namespace, dimensions=OPENAI_EMBEDDING_DIMENSIONS,
+                        incremental=False):
     """
     Store vectors into Pinecone index.
-    """
-    pc = Pinecone()
-    if index_name not in pc.list_indexes().names():
-        # create index
-        pc.create_index(
-            name=index_name,
-            dimension=dimensions,
-            metric="cosine",
-            spec=ServerlessSpec(
-                cloud="aws",
-                region="us-east-1",
-            ),
-        )
-    # wait for index to be initialized
-    while not pc.describe_index(name=index_name).status['ready']:
-        time.sleep(1)
-    index = pc.Index(name=index_name)
-    # time.sleep(1)
-    # print("Before upserting: ", index.describe_index_stats())
-    # upsert vectors
-    index.upsert(vectors=vectors, namespace=namespace)
-    time.sleep(10)
-    print("Ready upsertion: ", index.describe_index_stats())
+
+    With `incremental=True` the vectors must all belong to one regulation:
+    only chunks that are new or changed are upserted and stale chunks of that
+    regulation are deleted.
+
+    In compact mode (SEARCH_DIMENSIONS > 0) the index receives truncated vectors
+    and the full-precision ones are kept on the side for re-ranking.
+
+    With SLIM_METADATA=1 the chunk text and regulation metadata go to the local
+    chunk store and vectors only carry a document key and the filterable fields.
+
+    Returns:
+        dict: Upsert report from `upsert_records`.
+    """
+    with span("upsert", namespace=namespace, records=len(vectors), incremental=incremental):
+        # the lexical index needs the chunk text, so it is fed before slimming
+        with span("lexical_index"):
+            get_lexical_index(index_name).add(
+                namespace, vectors, prefix=record_prefix(vectors[0][0]) if incremental and vectors else None)
+        if slim_metadata_enabled():
+            with span("slim_metadata"):
+                vectors = slim_records(records=vectors, store=get_chunk_store(), replace=incremental)
+        quantization = None
+        if compact_enabled():
+            with span("compact_vectors", dimensions=SEARCH_DIMENSIONS):
+                vectors = compact_records(
+                    records=vectors,
+                    store=get_full_vector_store(index_name),
+                    namespace=namespace,
+                    dimensions=SEARCH_DIMENSIONS,
+                    prefix=record_prefix(vectors[0][0]) if incremental and vectors else None)
+            dimensions, quantization = SEARCH_DIMENSIONS, SEARCH_QUANTIZATION
+        # create the index on first use and wait for it to be initialized
+        with span("describe_index"):
+            index = ensure_index(index_name=index_name, dimensions=dimensions, quantization=quantization)
+        # upsert vectors in concurrent batches and wait until they are visible
+        with span("index_write", payload_bytes=records_size(vectors)) as write:
+            if incremental and vectors:
+                report = reindex_document(index=index, namespace=namespace, records=vectors)
+                print(f"Unchanged chunks: {report['unchanged']} | Stale chunks deleted: {report['deleted']}")
+            else:
+                report = upsert_records(index=index, records=vectors, namespace=namespace)
+            write.set(**{key: report[key] for key in ('upserted', 'batches', 'confirmed', 'unchanged', 'deleted')
+                         if key in report})
+        # once the write is visible: drop cached answers and refuse those retrieved before it
+        get_answer_cache().invalidate(index_name, namespace)
+    print(f"Ready upsertion: {report['upserted']} vectors in {report['batches']} batches | "
+          f"{report['vectors_per_second']:.1f} vectors/s | Confirmed: {report['confirmed']}")
+    return report
 
 
 def pinecone_delete_all_from_namespace(index_name, namespace):
     """
     Delete all vectors from Pinecone index with given namespace
     """
-    pc = Pinecone()
-    index = pc.Index(index_name)
+    index = get_index(index_name)
     index.delete(delete_all=True, namespace=namespace)
+    if compact_enabled():
+        get_full_vector_store(index_name).delete_namespace(namespace)
+    get_lexical_index(index_name).delete_namespace(namespace)
+    get_answer_cache().invalidate(index_name, namespace)
 
 
-def pinecone_get_context(index_name, namespace, query_vector, top_k=10):
-    pc = Pinecone()
-    index = pc.Index(index_name)
+def pinecone_get_context(index_name, namespace, query_vector, top_k=10, filter=None):
+    """
+    Query the index for the `top_k` matches of `query_vector`, restricted to
+    vectors whose metadata satisfies `filter` (see `utils.facets`).
+    """
+    index = get_index(index_name)
     # stats = index.describe_index_stats()
     # dimension = stats['dimension']
     # index_fullness = stats['index_fullness']
@@ -135,16 +169,30 @@ def pinecone_get_context(index_name, namespace, query_vector, top_k=10):
     # total_vector_count = stats['total_vector_count']
     # print(
     #     f"Index dimension: {dimension} | Index fullnesss: {index_fullness} | Total vectors: {total_vector_count} | Namespaces: {namespaces}")
-    if pc.describe_index(index_name).status['ready']:
+    results = None
+    with span("describe_index"):
+        ready = index_is_ready(index_name)
+    if ready:
         try:
-            results = index.query(
-                namespace=namespace,
-                vector=query_vector,
-                top_k=top_k,
-                include_values=False,
-                include_metadata=True,
-                filter=None
-            )
+            with span("vector_query", top_k=top_k, compact=compact_enabled()) as query:
+                if compact_enabled():
+                    # search truncated vectors, then re-rank the candidates at full precision
+                    results = compact_query(index=index,
+                                            store=get_full_vector_store(index_name),
+                                            namespace=namespace,
+                                            query_vector=query_vector,
+                                            top_k=top_k,
+                                            filter=filter)
+                else:
+                    results = index.query(
+                        namespace=namespace,
+                        vector=query_vector,
+                        top_k=top_k,
+                        include_values=False,
+                        include_metadata=True,
+                        filter=filter
+                    )
+                query.set(matches=len(results['matches']) if results else 0)
 
         except Exception as e:
             print(e)
@@ -155,26 +203,41 @@ def pinecone_get_context(index_name, namespace, query_vector, top_k=10):
     return results
 
 
-def get_response(query, index_name, namespace):
+def lexical_lookup(query, index_name, namespace, top_k=10, filter=None):
     """
-    Generates a response to a user query by augmenting it with contextual information from a Pinecone database
-    and using an OpenAI model to generate a tailored answer.
-
-    Args:
-        query (str): The text of the user's query.
-        index_name (str): Pinecone index name from which to retrieve contextual data.
-        namespace (str): Pinecone namespace associated with the index.
+    Answer a code lookup such as "Decreto 1076 artículo 2.2.3" from the local
+    BM25 index alone, skipping the query embedding and the vector query.
 
     Returns:
-        str: The AI-generated response to the query.
+        dict: Lexical matches, or None when the query is not a code lookup or the
+        best hit does not contain every number in the query.
+    """
+    if not is_code_lookup(query):
+        return None
+    lexical = get_lexical_index(index_name)
+    matches = lexical.search(query, namespace, top_k=top_k, filter=filter)
+    if not matches or not lexical.contains_all(matches[0]['id'], namespace, code_tokens(query)):
+        return None
+    return {'namespace': namespace, 'matches': matches}
+
+
+def fuse_lexical(query, index_name, namespace, context, top_k=10, filter=None):
+    """
+    Fuse the vector matches in `context` with the BM25 matches of `query`
+    by reciprocal rank fusion. Namespaces without lexical entries keep the
+    vector matches as they are.
     """
-    query_vector = openai_embed_data(lst_chunks=[query])
-    context = pinecone_get_context(index_name=index_name,
-                                   namespace=namespace,
-                                   query_vector=query_vector)
-    contexts = [item['metadata']['text'] for item in context['matches']]
-    augmented_query = "\n\n---\n\n".join(contexts)+"\n\n-----\n\n"+query
-    primer = f"""You are Q&A senir expert legal advisor bot. A highly 
+    lexical_matches = get_lexical_index(index_name).search(query, namespace, top_k=top_k, filter=filter)
+    if not lexical_matches:
+        return context
+    vector_matches = (match_field(context, 'matches') or []) if context else []
+    return {'namespace': namespace,
+            'matches': reciprocal_rank_fusion([vector_matches, lexical_matches], top_k=top_k)}
+
+
+CHAT_MODEL = "gpt-3.5-turbo"
+
+PRIMER = f"""You are Q&A senir expert legal advisor bot. A highly 
     intelligent system that answers user questions based on the information 
     provided by the user above each question. If the information can not be found
     in the information provided by the user you truthfully say "I don't know. Check if the
@@ -191,19 +254,156 @@ def get_response(query, index_name, namespace):
     **Article Number**: [Enter the number of the article you're inquiring about.]
     **Subsection Numbers**: [Enter the numbers of the subsections.]
     """
-    client = OpenAI()
 
-    res = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": primer},
-            {"role": "user", "content": augmented_query}
-        ]
-    )
-    return res.choices[0].message.content
 
+def build_chat_messages(query, context):
+    """
+    Build the chat messages that augment the query with the retrieved context.
+
+    Args:
+        query (str): The text of the user's query.
+        context (QueryResponse): Matches returned by `pinecone_get_context`.
+
+    Returns:
+        list (dict): System and user messages for the chat completion.
+    """
+    matches = context['matches'] if context else []
+    # dedupe, stitch and pack the matches into the context token budget
+    assembled = assemble_context(matches, count_tokens=get_token_counter(CHAT_MODEL))
+    print(f"Context tokens: {assembled['tokens']} of {assembled['tokens_before']} | "
+          f"Saved: {assembled['tokens_saved']} | Passages: {len(assembled['passages'])} "
+          f"from {len(matches)} matches")
+    annotate(context_tokens=assembled['tokens'], passages=len(assembled['passages']), matches=len(matches))
+    augmented_query = assembled['text']+"\n\n-----\n\n"+query
+    return [
+        {"role": "system", "content": PRIMER},
+        {"role": "user", "content": augmented_query}
+    ]
+
+
+def messages_size(messages):
+    """
+    Return the size in bytes of the chat messages sent to the completion.
+    """
+    return len(json.dumps(messages, ensure_ascii=False).encode('utf-8'))
+
+
+def completion_usage(response, messages, answer):
+    """
+    Return the prompt and completion token counts and the answer size of a
+    chat completion, counted locally when the response carries no usage.
+    """
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        count_tokens = get_token_counter(CHAT_MODEL)
+        prompt_tokens = sum(count_tokens(message['content']) for message in messages)
+        completion_tokens = count_tokens(answer or "")
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'response_bytes': len((answer or "").encode('utf-8'))}
+
+
+def retrieve_context(query, index_name, namespace, top_k=10, filter=None):
+    """
+    Retrieval half of answering a query, shared by `get_response` and the
+    streaming chat: lexical fast path, query embedding, semantic answer cache,
+    vector query fused with BM25 matches, then slim and catalog resolution.
+
+    Args:
+        query (str): The text of the user's query.
+        index_name (str): Pinecone index name from which to retrieve contextual data.
+        namespace (str): Pinecone namespace associated with the index.
+        top_k (int, optional): Number of matches used as context. Defaults to 10.
+        filter (dict, optional): Metadata filter from `Facets.build_filter`.
+
+    Returns:
+        dict: 'answer' when the answer cache already holds one, else 'context'
+        for `build_chat_messages`; 'query_vector' (None for lexical lookups),
+        'scope', the cache 'generation' and the 'query' are kept for `store_answer`.
+    """
+    scope = filter_key(filter)
+    answer_cache = get_answer_cache()
+    # taken before any read, so an answer built while the namespace is written is not cached
+    generation = answer_cache.generation(index_name, namespace)
+    query_vector = None
+    # exact code lookups are answered from the lexical index without embedding
+    with span("lexical_lookup") as lookup:
+        context = lexical_lookup(query, index_name, namespace, top_k=top_k, filter=filter)
+        lookup.set(hit=context is not None)
+    if context is None:
+        with span("embed_query", query_bytes=len(query.encode('utf-8'))):
+            query_vector = embed_query(query)
+        with span("answer_cache") as lookup:
+            answer = answer_cache.lookup(index_name, namespace, query_vector, scope=scope, question=query)
+            lookup.set(hit=answer is not None)
+        annotate(answer_cache_hit=answer is not None)
+        if answer is not None:
+            print(answer_cache.summary())
+            return {'answer': answer, 'context': None, 'query_vector': query_vector, 'scope': scope,
+                    'generation': generation, 'query': query}
+        context = pinecone_get_context(index_name=index_name,
+                                       namespace=namespace,
+                                       query_vector=query_vector,
+                                       top_k=top_k,
+                                       filter=filter)
+        with span("fuse_lexical"):
+            context = fuse_lexical(query, index_name, namespace, context, top_k=top_k, filter=filter)
+    # slim vectors only carry a document key; fetch their text in one read
+    with span("resolve_context"):
+        context = resolve_catalog(resolve_context(context))
+    return {'answer': None, 'context': context, 'query_vector': query_vector, 'scope': scope,
+            'generation': generation, 'query': query}
+
+
+def store_answer(retrieval, index_name, namespace, answer, seconds):
+    """
+    Keep a generated answer in the semantic answer cache; answers to lexical
+    lookups are not cached, as they were never embedded, nor are answers whose
+    namespace was written after their context was retrieved.
+    """
+    if retrieval['query_vector'] is not None:
+        get_answer_cache().store(index_name, namespace, retrieval['query_vector'], answer,
+                                 seconds=seconds, scope=retrieval['scope'],
+                                 generation=retrieval['generation'], question=retrieval['query'])
+
+
+def get_response(query, index_name, namespace, filter=None):
+    """
+    Generates a response to a user query by augmenting it with contextual information from a Pinecone database
+    and using an OpenAI model to generate a tailored answer.
+
+    Args:
+        query (str): The text of the user's query.
+        index_name (str): Pinecone index name from which to retrieve contextual data.
+        namespace (str): Pinecone namespace associated with the index.
+        filter (dict, optional): Metadata filter from `Facets.build_filter`.
+
+    Returns:
+        str: The AI-generated response to the query.
+    """
+    started = time.perf_counter()
+    with span("chat", mode="sync", namespace=namespace):
+        retrieval = retrieve_context(query, index_name, namespace, filter=filter)
+        if retrieval['answer'] is not None:
+            return retrieval['answer']
+        from openai import OpenAI
+        client = OpenAI()
+
+        with span("build_prompt"):
+            messages = build_chat_messages(query, retrieval['context'])
+        with span("completion", model=CHAT_MODEL, request_bytes=messages_size(messages)) as completion:
+            res = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages
+            )
+            answer = res.choices[0].message.content
+            completion.set(**completion_usage(res, messages, answer))
+        store_answer(retrieval, index_name, namespace, answer, seconds=time.perf_counter() - started)
+    return answer
 
-def create_records_to_upsert(lst_of_chunks, embeddings, metadata):
+
+def create_records_to_upsert(lst_of_chunks, embeddings, metadata, pages=None):
     """
     Create a list of dictionaries with metadata and embeddings.
 
@@ -211,18 +411,21 @@ def create_records_to_upsert(lst_of_chunks, embeddings, metadata):
         lst_of_chunks (str): List of chunks of text before to embed.
         embeddings (float): List of vectors or embeddings that maps to the list of chunks.
         metadata (json): Json file with the metadata related to the list of chunks.
+        pages (int, optional): Page number of each chunk, stored as 'page' in the metadata.
     Returns:
-        list (iterables): List with index, vector and metadata.
+        list (iterables): List with index, vector and metadata. Ids are
+            deterministic, so re-ingesting a regulation replaces its vectors.
 
     """
-    ids = []
+    ids = chunk_ids(lst_of_chunks, metadata)
     metadatas = []
     for i in range(len(lst_of_chunks)):
-        ids.append(f"{metadata['code']}-{str(uuid4())}")
         metadatas.append({
             ** metadata,
             'text': lst_of_chunks[i]
         })
+        if pages is not None:
+            metadatas[i]['page'] = pages[i]
     return list(zip(ids, embeddings, metadatas))
 
 
@@ -238,11 +441,10 @@ def create_vector_from_documents_to_upsert(documents, embeddings, metadata):
     Returns:
         list (iterables): List with index, vector and metadata.
     """
-    ids = []
     metadatas = []
     content = [doc.page_content for doc in documents]
+    ids = chunk_ids(content, metadata)
     for i in range(len(content)):
-        ids.append(f"{metadata['code']}-{str(uuid4())}")
         metadatas.append({
             ** metadata,
             'text': content[i]
@@ -250,7 +452,7 @@ def create_vector_from_documents_to_upsert(documents, embeddings, metadata):
     return list(zip(ids, embeddings, metadatas))
 
 
-def openai_embed_data(lst_chunks, dimensions=1536):
+def openai_embed_data(lst_chunks, dimensions=OPENAI_EMBEDDING_DIMENSIONS):
     """Embed text using the model name provided by OpenAI
 
     Args:
@@ -260,16 +462,60 @@ def openai_embed_data(lst_chunks, dimensions=1536):
     Returns:
         list (float): List of floats from 0 to 1.
     """
-    model_name = 'text-embedding-3-small'
-    embeddings = OpenAIEmbeddings(
-        model=model_name,
-        dimensions=dimensions
-    )
-    vectorstore = embeddings.embed_documents(lst_chunks)
-    return vectorstore
+    return get_embedder("openai", dimensions=dimensions).embed(lst_chunks)
+
+
+def embed_query(query, dimensions=OPENAI_EMBEDDING_DIMENSIONS):
+    """
+    Embed a user query, reusing the process-wide query-embedding cache so a
+    repeated question never calls the embedding API twice.
+
+    Args:
+        query (str): The text of the user's query.
+        dimensions (int, optional): Vector size. Defaults to 1536.
+
+    Returns:
+        list (float): Query vector.
+    """
+    cache = get_query_embedding_cache()
+    vector = cache.get(query, OPENAI_EMBEDDING_MODEL, dimensions)
+    if vector is None:
+        vector = openai_embed_data(lst_chunks=[query], dimensions=dimensions)[0]
+        cache.put(query, OPENAI_EMBEDDING_MODEL, dimensions, vector)
+    return vector
 
 
-def openai_embed_document(documents, dimensions=1536):
+def embed_chunks(lst_chunks, dimensions=OPENAI_EMBEDDING_DIMENSIONS, provider="openai"):
+    """
+    Embed chunks of text for ingestion, reusing the content-addressed chunk
+    store so only chunks never seen before are sent to the embedding model.
+
+    Args:
+        lst_chunks (str): List of chunks of text
+        dimensions (int, optional): Vector size. Defaults to 1536.
+        provider (str, optional): Embedding provider from `utils.embedders`. Defaults to 'openai'.
+
+    Returns:
+        list (float): One vector per chunk, in order.
+    """
+    if provider == "openai":
+        model, embed_fn = OPENAI_EMBEDDING_MODEL, \
+            lambda missing: openai_embed_data(lst_chunks=missing, dimensions=dimensions)
+    else:
+        embedder = get_embedder(provider, dimensions=dimensions)
+        model, embed_fn, dimensions = embedder.model, embedder.embed, embedder.dimensions
+    embeddings, saved = embed_with_cache(
+        cache=get_chunk_embedding_cache(),
+        texts=list(lst_chunks),
+        model=model,
+        dimensions=dimensions,
+        embed_fn=embed_fn)
+    print(f"Chunk embeddings reused from cache: {saved} of {len(lst_chunks)}")
+    annotate(chunks=len(lst_chunks), reused=saved, model=model)
+    return embeddings
+
+
+def openai_embed_document(documents, dimensions=OPENAI_EMBEDDING_DIMENSIONS):
     """
     Generates embeddings for a list of documents using OpenAI's embedding model.
 
@@ -280,13 +526,8 @@ def openai_embed_document(documents, dimensions=1536):
     Returns:
         list of list of float: A list containing the embedding vectors for each document's content.
     """
-    model_name = "text-embedding-3-small"
-    embeddings = OpenAIEmbeddings(
-        model=model_name,
-        dimensions=dimensions
-    )
     content = [doc.page_content for doc in documents]
-    return embeddings.embed_documents(content)
+    return get_embedder("openai", dimensions=dimensions).embed(content)
 
 
 def upload_file_to_s3(file_name, bucket_name, object_name=None):
@@ -297,22 +538,22 @@ def upload_file_to_s3(file_name, bucket_name, object_name=None):
         file_name (str): File to upload
         bucket_name (str): Bucket to upload to
         object_name (str): S3 object name. If not specified, file_name is used
-    Returns: True if file was uploaded, else False
+    Returns: True if file was uploaded or already stored unchanged, else False
     """
     # If S3 object_name was not specified, use file_name
     if object_name is None:
         object_name = file_name
 
-    # Upload the file
-    s3_client = boto3.client('s3')
     try:
-        response = s3_client.upload_file(file_name, bucket_name, object_name)
+        with open(file_name, 'rb') as file_obj:
+            upload_fileobj(file_obj, bucket_name, object_name)
     except NoCredentialsError:
         print("Credentials not available")
         return False
     except Exception as e:
         print(f"An error occurred: {e}")
         return False
+    return True
 
 
 def upload_fileobj_to_s3(file_obj, bucket_name, object_name=None):
@@ -323,17 +564,15 @@ def upload_fileobj_to_s3(file_obj, bucket_name, object_name=None):
         file_obj (file-like object): File-like object to upload
         bucket_name (str): Bucket to upload file to
         object_name (str): S3 object name. If not specified, a name must be provided
-    Returns: True if file was uploaded, else False
+    Returns: True if file was uploaded or already stored unchanged, else False
     """
     # Ensure object_name is provided since file_obj doesn't have a 'name' attribute
     if object_name is None:
         raise ValueError(
             "object_name must be provided when uploading a file-like object")
 
-    # Upload the file
-    s3_client = boto3.client('s3')
     try:
-        s3_client.upload_fileobj(file_obj, bucket_name, object_name)
+        upload_fileobj(file_obj, bucket_name, object_name)
     except NoCredentialsError:
         print("Credentials not available")
         return False
@@ -345,24 +584,22 @@ def upload_fileobj_to_s3(file_obj, bucket_name, object_name=None):
 
 def upload_file_from_url(url, bucket_name, object_name=None):
     """
-    Upload a file from a URL to an S3 bucket
+    Upload a file from a URL to an S3 bucket, streaming it without buffering
+    the whole file in memory
 
     Args:
         url (str): URL of the file to download
         bucket_name (str): Bucket to upload to
-        object_name (str): S3 object name. If not specified, file_name is used
-    Returns: True if file was uploaded, else False
+        object_name (str): S3 object name. If not specified, the last part of the URL is used
+    Returns: True if file was uploaded or already stored unchanged, else False
     """
-    s3_client = boto3.client('s3')
+    import requests
+    if object_name is None:
+        object_name = url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
 
     try:
-        # Retrieve file from URL
-        response = requests.get(url)
-        response.raise_for_status()  # raises exception when not a 2xx response
-        if response.status_code == 200:
-            # Upload the file
-            s3_client.upload_fileobj(response.raw, bucket_name, object_name)
-            return True
+        upload_url(url, bucket_name, object_name)
+        return True
     except requests.exceptions.RequestException as e:
         print(f'Request failed: {e}')
         return False
@@ -396,7 +633,7 @@ def upsert_files_pinecone(index_name, namespace, pdf, metadata, dimensions):
                           the vector space model's performance and accuracy.
 
     Process:
-        1. Initialize the Amazon Textract client and process the PDF to extract text.
+        1. Extract the text with asynchronous Amazon Textract jobs, reusing cached pages.
         2. Split the extracted text into smaller chunks to prepare for embedding. This involves
            segmenting the text while allowing for overlap between chunks to maintain context.
         3. Generate embeddings for each text chunk using a specified embedding model.
@@ -409,33 +646,105 @@ def upsert_files_pinecone(index_name, namespace, pdf, metadata, dimensions):
         None: This function does not return a value. It performs the upsert operation directly
               on the Pinecone index.
     """
-    textract_client = boto3.client("textract", region_name="us-east-2")
-    loader = AmazonTextractPDFLoader(file_path=pdf, client=textract_client)
-    documents = loader.load()
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    docs = text_splitter.split_documents(documents=documents)
+    upsert_files_pinecone_batch(index_name=index_name, namespace=namespace,
+                                files=[(pdf, metadata)], dimensions=dimensions)
 
-    embeddings = openai_embed_document(documents=docs, dimensions=dimensions)
-    vector = create_vector_from_documents_to_upsert(
-        documents=docs, embeddings=embeddings, metadata=metadata)
-    pinecone_store_data(vectors=vector, index_name=index_name,
-                        namespace=namespace, dimensions=dimensions)
+
+def upsert_files_pinecone_batch(index_name, namespace, files, dimensions):
+    """
+    OCR several scanned PDFs together, then split, embed and upsert each one.
+
+    All PDFs are submitted to the OCR stage at once, so their Textract jobs run
+    concurrently instead of one document after another.
+
+    Args:
+        index_name (str): The name of the Pinecone index where the documents are to be upserted.
+        namespace (str): A specific namespace within the Pinecone index.
+        files (list): (pdf, metadata) pairs; pdf is a path, file-like object or bytes.
+        dimensions (int): The dimensionality of the vectors generated by the embedding model.
+    Returns:
+        list (dict): OCR result per file, in order, from `OcrStage.run`.
+    """
+    from langchain_core.documents import Document
+    from langchain_text_splitters import CharacterTextSplitter
+    # scanned pages come from the OCR page cache when a PDF was read before
+    results = get_ocr_stage().run([pdf for pdf, _ in files])
+    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    for (pdf, metadata), result in zip(files, results):
+        if result['missing']:
+            print(f"OCR could not read pages {result['missing']} of {metadata.get('title') or pdf}")
+        documents = [Document(page_content=text, metadata={'page': page})
+                     for page, text in enumerate(result['pages'], start=1) if text]
+        docs = text_splitter.split_documents(documents=documents)
+        if not docs:
+            continue
+
+        embeddings = embed_chunks(
+            lst_chunks=[doc.page_content for doc in docs], dimensions=dimensions)
+        vector = create_vector_from_documents_to_upsert(
+            documents=docs, embeddings=embeddings, metadata=metadata)
+        pinecone_store_data(vectors=vector, index_name=index_name,
+                            namespace=namespace, dimensions=dimensions, incremental=True)
+    return results
 
 
 def create_vector_for_pinecone(pdf_file, metadata):
     """
     Prepare data for Pinecone index.
     """
-    # get text from PDF
-    docs = get_text_from_pdf(pdf_file)
-    print("Total length of document: ", len(docs))
-    # split text into chunks
-    lst_of_chunks = split_text_into_chunks(docs)
-    print("Total of chunks: ", len(lst_of_chunks),
-          "| Type: ", type(lst_of_chunks))
-    # embed chunks of text
-    embeddings = openai_embed_data(lst_of_chunks)
-    print("Total embeddings: ", len(embeddings), " | Type: ", type(embeddings))
-    # create records
-    vector = create_records_to_upsert(lst_of_chunks, embeddings, metadata)
+    with span("create_vector"):
+        # stream page text from the PDF into the splitter
+        with span("extract_split") as split:
+            lst_of_chunks, pages = get_chunks_with_pages(pdf_file)
+            split.set(pages=pages[-1] if pages else 0, chunks=len(lst_of_chunks))
+        print("Total of pages: ", pages[-1] if pages else 0)
+        print("Total of chunks: ", len(lst_of_chunks),
+              "| Type: ", type(lst_of_chunks))
+        # embed chunks of text
+        with span("embed"):
+            embeddings = embed_chunks(lst_of_chunks)
+        print("Total embeddings: ", len(embeddings), " | Type: ", type(embeddings))
+        # create records
+        with span("create_records") as records:
+            vector = create_records_to_upsert(lst_of_chunks, embeddings, metadata, pages=pages)
+            records.set(records=len(vector))
     return vector
+
+
+def ingest_pdf(pdf_file, index_name, namespace, metadata, dimensions=OPENAI_EMBEDDING_DIMENSIONS,
+               progress=None):
+    """
+    Extract, chunk, embed and upsert one regulation, reporting each stage.
+
+    Args:
+        pdf_file (str | file-like | bytes): The PDF to ingest.
+        index_name (str): Index the chunks are written to.
+        namespace (str): Namespace within the index.
+        metadata (dict): Regulation metadata stored with every chunk.
+        dimensions (int, optional): Embedding dimensions.
+        progress (callable, optional): Called as progress(stage, count) after the
+            'extracted' (pages), 'chunked', 'embedded' and 'upserted' stages.
+    Returns:
+        dict: Pages, chunks and the upsert report.
+    """
+    progress = progress or (lambda stage, count: None)
+    with span("ingest", namespace=namespace):
+        with span("extract") as extract:
+            pdf_bytes = read_pdf_bytes(pdf_file)
+            page_texts = get_page_texts(pdf_bytes)
+            extract.set(pages=len(page_texts), pdf_bytes=len(pdf_bytes))
+        progress('extracted', len(page_texts))
+        # split the pages just extracted, whether or not the artifact cache is on
+        with span("split") as split:
+            lst_of_chunks, pages = get_chunks_with_pages(pdf_bytes, page_texts=page_texts)
+            split.set(chunks=len(lst_of_chunks))
+        progress('chunked', len(lst_of_chunks))
+        with span("embed"):
+            embeddings = embed_chunks(lst_of_chunks, dimensions=dimensions)
+        progress('embedded', len(embeddings))
+        with span("create_records"):
+            vector = create_records_to_upsert(lst_of_chunks, embeddings, metadata, pages=pages)
+        report = pinecone_store_data(vectors=vector, index_name=index_name, namespace=namespace,
+                                     dimensions=dimensions, incremental=True)
+        progress('upserted', report['upserted'])
+    return {'pages': len(page_texts), 'chunks': len(lst_of_chunks), 'report': report}
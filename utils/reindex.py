@@ -0,0 +1,143 @@
+import hashlib
+import json
+import re
+import unicodedata
+from utils.upsert import namespace_vector_count, upsert_records
+
+"""Deterministic chunk IDs and incremental re-indexing of a regulation:
+    1- Build a stable regulation key from genre, year and code
+    2- Build chunk IDs from the regulation key and a hash of the chunk
+    3- Diff the IDs stored for a regulation against a new set of records
+    4- Upsert only new or changed chunks and delete only stale IDs
+    """
+
+ID_SEPARATOR = "#"
+DELETE_BATCH_SIZE = 1000
+
+
+def _slug(value):
+    ascii_value = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9.]+', '-', ascii_value).strip('-') or "doc"
+
+
+def _digest(*parts):
+    raw = "\x1f".join(str(part) for part in parts).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+def regulation_key(metadata):
+    """
+    Return a stable ASCII key for the regulation described by `metadata`.
+
+    The code alone is not unique (a Ley and a Decreto can share a number), so
+    genre and year are folded into a short digest.
+    """
+    digest = _digest(metadata.get('genre'), metadata.get('year'), metadata.get('code'))
+    return f"{_slug(metadata.get('code'))}-{digest[:8]}"
+
+
+def document_prefix(metadata):
+    """
+    Return the ID prefix shared by every chunk of a regulation.
+    """
+    return f"{regulation_key(metadata)}{ID_SEPARATOR}"
+
+
+def metadata_fingerprint(metadata):
+    """
+    Hash the regulation metadata, so corrected metadata yields new chunk IDs.
+    """
+    fields = {key: value for key, value in metadata.items() if key not in ('text', 'page')}
+    return _digest(json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str))
+
+
+def chunk_ids(lst_of_chunks, metadata):
+    """
+    Return one deterministic ID per chunk.
+
+    Each ID is the regulation prefix plus a hash of the chunk text and the
+    metadata fingerprint. Repeated identical chunks are told apart by their
+    occurrence number.
+
+    Args:
+        lst_of_chunks (list): Chunks of text of one regulation.
+        metadata (dict): Regulation metadata.
+    Returns:
+        list (str): IDs in the order of `lst_of_chunks`.
+    """
+    prefix = document_prefix(metadata)
+    fingerprint = metadata_fingerprint(metadata)
+    seen = {}
+    ids = []
+    for chunk in lst_of_chunks:
+        occurrence = seen.get(chunk, 0)
+        seen[chunk] = occurrence + 1
+        ids.append(f"{prefix}{_digest(fingerprint, chunk, occurrence)[:20]}")
+    return ids
+
+
+def record_prefix(vector_id):
+    """
+    Return the regulation prefix of a chunk ID.
+    """
+    return vector_id.split(ID_SEPARATOR, 1)[0] + ID_SEPARATOR
+
+
+def list_document_ids(index, namespace, prefix):
+    """
+    Return every ID stored in `namespace` that starts with `prefix`.
+    """
+    ids = set()
+    for page in index.list(prefix=prefix, namespace=namespace):
+        ids.update(page)
+    return ids
+
+
+def plan_reindex(existing_ids, records):
+    """
+    Compare the stored IDs of a regulation with a new set of records.
+
+    Args:
+        existing_ids (set): IDs currently stored for the regulation.
+        records (list): New (id, values, metadata) records for the regulation.
+    Returns:
+        dict: 'upsert' records whose ID is new, 'unchanged' IDs already stored
+        and 'delete' stale IDs no longer produced.
+    """
+    new_ids = {record[0] for record in records}
+    return {
+        'upsert': [record for record in records if record[0] not in existing_ids],
+        'unchanged': existing_ids & new_ids,
+        'delete': sorted(existing_ids - new_ids),
+    }
+
+
+def reindex_document(index, namespace, records, prefix=None, **upsert_options):
+    """
+    Bring the stored chunks of one regulation in line with `records`.
+
+    Only records with new IDs are upserted and only stale IDs are deleted, so
+    the cost is proportional to what changed in the regulation.
+
+    Args:
+        index (Index): Pinecone Index handle or a compatible stand-in.
+        namespace (str): Target namespace.
+        records (list): Every (id, values, metadata) record of the regulation.
+        prefix (str, optional): Regulation ID prefix. Defaults to the prefix of the first record.
+    Returns:
+        dict: Upsert report plus 'unchanged' and 'deleted' counts.
+    """
+    if prefix is None:
+        if not records:
+            raise ValueError("prefix must be provided when there are no records")
+        prefix = record_prefix(records[0][0])
+    plan = plan_reindex(list_document_ids(index, namespace, prefix), records)
+    expected = namespace_vector_count(index, namespace) + len(plan['upsert'])
+    report = upsert_records(index=index, records=plan['upsert'], namespace=namespace,
+                            expected_count=expected, **upsert_options)
+    for start in range(0, len(plan['delete']), DELETE_BATCH_SIZE):
+        index.delete(ids=plan['delete'][start:start + DELETE_BATCH_SIZE],
+                     namespace=namespace)
+    report['unchanged'] = len(plan['unchanged'])
+    report['deleted'] = len(plan['delete'])
+    return report
@@ -0,0 +1,242 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+"""Streaming, deduplicated uploads to S3:
+    1- Share one S3 client with a connection pool sized for the upload concurrency
+    2- Split a stream into parts and upload them in parallel with multipart upload,
+       holding at most `concurrency` parts in memory
+    3- Skip objects whose SHA-256, kept in the object metadata, already matches
+    4- Spool streams of unknown hash, such as URL downloads, to a temporary file while
+       hashing them, so an unchanged file is never sent and the hash is set on creation
+    5- Report the size, time and MB/s of every upload
+    """
+
+MB = 1024 * 1024
+# S3 rejects multipart parts under 5 MB, except the last one
+MIN_PART_SIZE = 5 * MB
+S3_PART_SIZE = max(MIN_PART_SIZE, int(float(os.getenv("S3_PART_SIZE_MB", "8")) * MB))
+S3_CONCURRENCY = int(os.getenv("S3_CONCURRENCY", "8"))
+# empty uses AWS; set it to a local S3-compatible server such as MinIO
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+HASH_KEY = 'sha256'
+DOWNLOAD_TIMEOUT = 60
+# spooled streams stay in memory up to this size, then move to a temporary file
+SPOOL_MEMORY_SIZE = S3_PART_SIZE
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Return the process-wide S3 client, pooling enough connections for S3_CONCURRENCY parts.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+                from botocore.config import Config
+                config = Config(max_pool_connections=max(10, 2 * S3_CONCURRENCY),
+                                retries={'max_attempts': 5, 'mode': 'standard'})
+                _client = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL, config=config)
+    return _client
+
+
+def _read_full(read, size):
+    # file objects and HTTP streams may return fewer bytes than asked for
+    pieces = []
+    remaining = size
+    while remaining:
+        piece = read(remaining)
+        if not piece:
+            break
+        pieces.append(piece)
+        remaining -= len(piece)
+    return b"".join(pieces)
+
+
+def file_sha256(file_obj, block_size=MB):
+    """
+    Return the hex SHA-256 of a seekable file object, leaving it at its start position.
+    """
+    start = file_obj.tell()
+    digest = hashlib.sha256()
+    for block in iter(lambda: file_obj.read(block_size), b""):
+        digest.update(block)
+    file_obj.seek(start)
+    return digest.hexdigest()
+
+
+def spool_stream(read, block_size=MB):
+    """
+    Copy everything `read` returns into a temporary file while hashing it.
+
+    Returns:
+        tuple: The spooled file, positioned at its start, and the hex SHA-256.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+    digest = hashlib.sha256()
+    try:
+        for block in iter(lambda: read(block_size), b""):
+            digest.update(block)
+            spooled.write(block)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled, digest.hexdigest()
+
+
+def existing_sha256(client, bucket_name, object_name):
+    """
+    Return the SHA-256 recorded on an existing object, or None when the object
+    does not exist or was uploaded without one.
+    """
+    try:
+        response = client.head_object(Bucket=bucket_name, Key=object_name)
+    except Exception as e:
+        code = str(getattr(e, 'response', {}).get('Error', {}).get('Code', ""))
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return (response.get('Metadata') or {}).get(HASH_KEY)
+
+
+def _result(object_name, size, started, sha256, skipped):
+    seconds = time.perf_counter() - started
+    mb_per_s = size / MB / seconds if seconds > 0 else 0.0
+    action = "Unchanged, skipped" if skipped else "Uploaded"
+    print(f"{action} {object_name}: {size / MB:.2f} MB in {seconds:.2f}s ({mb_per_s:.1f} MB/s)")
+    return {'object_name': object_name, 'bytes': size, 'seconds': seconds,
+            'mb_per_s': mb_per_s, 'sha256': sha256, 'skipped': skipped}
+
+
+def upload_stream(read, bucket_name, object_name, sha256=None, existing=None, client=None,
+                  part_size=None, concurrency=None):
+    """
+    Upload everything `read` returns, in parallel parts when it exceeds one part.
+
+    Args:
+        read (callable): read(n) returning up to n bytes, b"" at the end.
+        bucket_name (str): Bucket to upload to.
+        object_name (str): S3 object name.
+        sha256 (str, optional): Hash of the content when known up front; otherwise the
+            stream is spooled to a temporary file and hashed before anything is sent.
+        existing (str, optional): Hash of the object already stored; matching content
+            is skipped without being uploaded.
+        client (S3.Client, optional): Defaults to the shared client.
+        part_size (int, optional): Bytes per part, at least 5 MB. Defaults to S3_PART_SIZE.
+        concurrency (int, optional): Parts uploaded at once. Defaults to S3_CONCURRENCY.
+    Returns:
+        dict: 'object_name', 'bytes', 'seconds', 'mb_per_s', 'sha256' and 'skipped'.
+    """
+    started = time.perf_counter()
+    if sha256 is None:
+        spooled, sha256 = spool_stream(read)
+        with spooled:
+            if sha256 == existing:
+                size = spooled.seek(0, os.SEEK_END)
+                return _result(object_name, size, started, sha256, skipped=True)
+            return _upload_parts(spooled.read, bucket_name, object_name, sha256, started,
+                                 client=client, part_size=part_size, concurrency=concurrency)
+    if sha256 == existing:
+        # the caller hashed the content; nothing was read yet
+        return _result(object_name, 0, started, sha256, skipped=True)
+    return _upload_parts(read, bucket_name, object_name, sha256, started,
+                         client=client, part_size=part_size, concurrency=concurrency)
+
+
+def _upload_parts(read, bucket_name, object_name, sha256, started, client=None, part_size=None,
+                  concurrency=None):
+    client = client or get_s3_client()
+    part_size = max(MIN_PART_SIZE, part_size or S3_PART_SIZE)
+    concurrency = concurrency or S3_CONCURRENCY
+
+    part = _read_full(read, part_size)
+    if len(part) < part_size:
+        # fits in one request; no multipart bookkeeping
+        client.put_object(Bucket=bucket_name, Key=object_name, Body=part, Metadata={HASH_KEY: sha256})
+        return _result(object_name, len(part), started, sha256, skipped=False)
+
+    upload_id = client.create_multipart_upload(
+        Bucket=bucket_name, Key=object_name, Metadata={HASH_KEY: sha256})['UploadId']
+    size = 0
+    parts = []
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = deque()
+            number = 1
+            while part:
+                size += len(part)
+                in_flight.append((number, executor.submit(
+                    client.upload_part, Bucket=bucket_name, Key=object_name, UploadId=upload_id,
+                    PartNumber=number, Body=part)))
+                if len(in_flight) >= concurrency:
+                    done, future = in_flight.popleft()
+                    parts.append({'PartNumber': done, 'ETag': future.result()['ETag']})
+                number += 1
+                part = _read_full(read, part_size)
+            parts += [{'PartNumber': done, 'ETag': future.result()['ETag']} for done, future in in_flight]
+        client.complete_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id,
+                                         MultipartUpload={'Parts': parts})
+    except BaseException:
+        client.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+        raise
+    return _result(object_name, size, started, sha256, skipped=False)
+
+
+def _remaining_size(file_obj):
+    start = file_obj.tell()
+    end = file_obj.seek(0, os.SEEK_END)
+    file_obj.seek(start)
+    return end - start
+
+
+def upload_fileobj(file_obj, bucket_name, object_name, client=None, **options):
+    """
+    Upload a file-like object, skipping it when the stored object has the same content.
+
+    A seekable object is hashed first, so an unchanged file is never sent.
+
+    Args:
+        options: `part_size` and `concurrency`, passed to `upload_stream`.
+    Returns:
+        dict: The result of `upload_stream`.
+    """
+    client = client or get_s3_client()
+    existing = existing_sha256(client, bucket_name, object_name)
+    sha256 = None
+    if getattr(file_obj, 'seekable', lambda: False)():
+        started = time.perf_counter()
+        sha256 = file_sha256(file_obj)
+        if sha256 == existing:
+            return _result(object_name, _remaining_size(file_obj), started, sha256, skipped=True)
+    return upload_stream(file_obj.read, bucket_name, object_name, sha256=sha256, existing=existing,
+                         client=client, **options)
+
+
+def upload_url(url, bucket_name, object_name, client=None, **options):
+    """
+    Download the file at `url` into a temporary file, hashing it on the way,
+    and upload it unless the stored object already has the same content.
+
+    Raises:
+        requests.exceptions.RequestException: The download failed.
+    Returns:
+        dict: The result of `upload_stream`.
+    """
+    import requests
+    client = client or get_s3_client()
+    existing = existing_sha256(client, bucket_name, object_name)
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        # undo any Content-Encoding so the stored bytes are the file itself
+        response.raw.decode_content = True
+        return upload_stream(response.raw.read, bucket_name, object_name, existing=existing,
+                             client=client, **options)
@@ -0,0 +1,280 @@
+import contextlib
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""Per-stage tracing and metrics of chat and ingestion requests:
+    1- Time every stage of a request as a span nested under the request's root span
+    2- Attach token counts, payload sizes and other attributes to the span that produced them
+    3- Keep a rolling window of durations per stage for p50/p95, and totals of tokens and bytes
+    4- Append every finished request as one JSON line to TRACE_LOG_PATH
+    5- Export the metrics in Prometheus text format to METRICS_PATH and/or on METRICS_PORT
+    """
+
+# empty turns the JSON log off
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
+# empty turns the Prometheus text file off
+METRICS_PATH = os.getenv("METRICS_PATH", "")
+# 0 turns the Prometheus endpoint off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# durations kept per stage for the percentiles
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "500"))
+METRIC_PREFIX = "qa_pdfs"
+QUANTILES = (0.5, 0.95)
+# numeric span attributes with these suffixes are also summed into counters
+COUNTED_SUFFIXES = {'_tokens': "tokens", '_bytes': "bytes"}
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed stage of a request. Spans opened while another is current
+    become its children; `asyncio.to_thread` carries the current span along.
+    """
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.attributes = dict(attributes)
+        self.children = []
+        self.start = time.time()
+        self.seconds = None
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        """
+        Add attributes, e.g. token counts or payload sizes, to the span.
+        """
+        self.attributes.update(attributes)
+        return self
+
+    def to_dict(self):
+        span = {'name': self.name, 'start': self.start, 'seconds': self.seconds,
+                'attributes': self.attributes, 'spans': [child.to_dict() for child in self.children]}
+        if self.error:
+            span['error'] = self.error
+        return span
+
+
+def _percentile(values, quantile):
+    # nearest rank on the sorted window
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(quantile * len(ordered)) - 1)]
+
+
+def _labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+class Tracer:
+    """
+    Records spans and aggregates them into per-stage metrics.
+
+    Args:
+        window (int, optional): Durations kept per stage. Defaults to METRICS_WINDOW.
+        log_path (str, optional): JSON-lines file of finished requests. Defaults to TRACE_LOG_PATH.
+        metrics_path (str, optional): Prometheus text file rewritten after every
+            request. Defaults to METRICS_PATH.
+    """
+
+    def __init__(self, window=None, log_path=None, metrics_path=None):
+        self.window = window or METRICS_WINDOW
+        self.log_path = TRACE_LOG_PATH if log_path is None else log_path
+        self.metrics_path = METRICS_PATH if metrics_path is None else metrics_path
+        for path in (self.log_path, self.metrics_path):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._durations = {}
+        self._totals = {}
+        self._counters = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the block as a stage named `name`; without a current span it is
+        the root of a new request.
+        """
+        parent = _current.get()
+        span = Span(name, parent, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.seconds = time.perf_counter() - span._started
+            _current.reset(token)
+            if parent is not None:
+                parent.children.append(span)
+            self._record(span)
+            if parent is None:
+                self._finish(span)
+
+    def _record(self, span):
+        trace = span.root.name
+        stage = "total" if span.parent is None else span.name
+        with self._lock:
+            key = (trace, stage)
+            self._durations.setdefault(key, deque(maxlen=self.window)).append(span.seconds)
+            count, total = self._totals.get(key, (0, 0.0))
+            self._totals[key] = (count + 1, total + span.seconds)
+            for attribute, value in span.attributes.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                for suffix, unit in COUNTED_SUFFIXES.items():
+                    if attribute.endswith(suffix):
+                        counter = (unit, trace, stage, attribute[:-len(suffix)])
+                        self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def _finish(self, root):
+        trace = root.to_dict()
+        with self._lock:
+            self._last[root.name] = trace
+        if self.log_path:
+            line = json.dumps(dict(trace, type="trace"), ensure_ascii=False, default=str)
+            with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        if self.metrics_path:
+            self.write_prometheus(self.metrics_path)
+
+    def last(self, trace):
+        """
+        Return the last finished request named `trace` as a nested dict, or None.
+        """
+        with self._lock:
+            return self._last.get(trace)
+
+    def percentiles(self, trace):
+        """
+        Return {stage: {'p50': s, 'p95': s, 'count': n}} over the rolling window
+        of requests named `trace`; the root span is the 'total' stage.
+        """
+        with self._lock:
+            windows = {stage: list(values) for (name, stage), values in self._durations.items()
+                       if name == trace}
+        return {stage: {'p50': _percentile(values, 0.5), 'p95': _percentile(values, 0.95),
+                        'count': len(values)}
+                for stage, values in windows.items()}
+
+    def render_prometheus(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Duration of request stages over the last {self.window} requests.",
+                 f"# TYPE {name} summary"]
+        with self._lock:
+            durations = {key: list(values) for key, values in self._durations.items()}
+            totals = dict(self._totals)
+            counters = dict(self._counters)
+        for (trace, stage), values in sorted(durations.items()):
+            labels = (('trace', trace), ('stage', stage))
+            for quantile in QUANTILES:
+                lines.append(f"{name}{{{_labels(labels + (('quantile', quantile),))}}} "
+                             f"{_percentile(values, quantile):.6f}")
+            count, total = totals[(trace, stage)]
+            lines.append(f"{name}_sum{{{_labels(labels)}}} {total:.6f}")
+            lines.append(f"{name}_count{{{_labels(labels)}}} {count}")
+        for unit in sorted({counter[0] for counter in counters}):
+            name = f"{METRIC_PREFIX}_{unit}_total"
+            lines += [f"# HELP {name} {unit.capitalize()} recorded by request stages.",
+                      f"# TYPE {name} counter"]
+            for (counter_unit, trace, stage, kind), value in sorted(counters.items()):
+                if counter_unit == unit:
+                    labels = (('trace', trace), ('stage', stage), ('kind', kind))
+                    lines.append(f"{name}{{{_labels(labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Write the metrics to `path` atomically, for a node exporter textfile collector.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(temporary, path)
+
+
+def stage_rows(trace, depth=0):
+    """
+    Flatten a trace from `Tracer.last` into rows of 'stage', 'ms' and the
+    stage's attributes, children indented under their parent.
+    """
+    rows = [{'stage': "  " * depth + trace['name'], 'ms': round(trace['seconds'] * 1000, 1),
+             **trace['attributes']}]
+    for child in trace['spans']:
+        rows += stage_rows(child, depth + 1)
+    return rows
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+_server = None
+
+
+def get_tracer():
+    """
+    Return the process-wide tracer, shared by every Streamlit session.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
+
+
+def span(name, **attributes):
+    """
+    Time a stage on the process-wide tracer: `with span("embed_query"): ...`.
+    """
+    return get_tracer().span(name, **attributes)
+
+
+def annotate(**attributes):
+    """
+    Add attributes to the current span; does nothing outside a span.
+    """
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def start_metrics_server(port=None):
+    """
+    Serve the process-wide metrics in Prometheus text format on `port`
+    (default METRICS_PORT) from a daemon thread. Returns the server, or None
+    when the port is 0.
+    """
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _tracer_lock:
+        if _server is None:
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = get_tracer().render_prometheus().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            _server = ThreadingHTTPServer(("", port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
@@ -0,0 +1,184 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+"""Batched, concurrent upserts into a Pinecone index:
+    1- Split records into size-bounded batches
+    2- Upsert batches in parallel with bounded concurrency and per-batch retry
+    3- Poll namespace stats until the write is visible, with a timeout
+    4- Report throughput in vectors/s
+    """
+
+MAX_BATCH_VECTORS = 100
+# Pinecone rejects upsert requests above 2 MB; keep a margin for the envelope.
+MAX_BATCH_BYTES = 1_900_000
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+WAIT_TIMEOUT = 30.0
+POLL_INTERVAL = 0.5
+# ids per fetch when checking which records already exist
+FETCH_BATCH_SIZE = 100
+
+
+def _record_id(record):
+    return record['id'] if isinstance(record, dict) else record[0]
+
+
+def _record_size(record):
+    """
+    Approximate the serialized size of a record in bytes.
+    """
+    if isinstance(record, dict):
+        vector_id, values, metadata = record['id'], record['values'], record.get('metadata')
+    else:
+        vector_id, values = record[0], record[1]
+        metadata = record[2] if len(record) > 2 else None
+    # floats serialize to roughly 20 characters each in JSON
+    size = len(str(vector_id)) + 20 * len(values)
+    if metadata:
+        size += len(json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8'))
+    return size
+
+
+def records_size(records):
+    """
+    Approximate the serialized size in bytes of upserting `records`.
+    """
+    return sum(_record_size(record) for record in records)
+
+
+def batch_records(records, max_vectors=MAX_BATCH_VECTORS, max_bytes=MAX_BATCH_BYTES):
+    """
+    Split records into batches bounded by vector count and payload size.
+
+    Args:
+        records (list): Tuples (id, values, metadata) or dicts with the same keys.
+        max_vectors (int, optional): Maximum vectors per batch. Defaults to 100.
+        max_bytes (int, optional): Maximum approximate payload per batch. Defaults to 1.9 MB.
+    Returns:
+        list (list): Batches of records in their original order.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for record in records:
+        size = _record_size(record)
+        if batch and (len(batch) >= max_vectors or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(record)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def namespace_vector_count(index, namespace):
+    """
+    Return the number of vectors in `namespace`, 0 when it does not exist yet.
+    """
+    stats = index.describe_index_stats()
+    namespaces = stats['namespaces'] or {}
+    if namespace not in namespaces:
+        return 0
+    return namespaces[namespace]['vector_count']
+
+
+def count_existing_ids(index, namespace, ids, batch_size=FETCH_BATCH_SIZE):
+    """
+    Return how many of `ids` are already stored in `namespace`.
+    """
+    ids = list(ids)
+    existing = 0
+    for start in range(0, len(ids), batch_size):
+        response = index.fetch(ids=ids[start:start + batch_size], namespace=namespace)
+        existing += len(response['vectors'] or {})
+    return existing
+
+
+def wait_for_vector_count(index, namespace, expected, timeout=WAIT_TIMEOUT,
+                          poll_interval=POLL_INTERVAL):
+    """
+    Poll namespace stats until at least `expected` vectors are visible.
+
+    Returns:
+        bool: True when the count was reached before `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if namespace_vector_count(index, namespace) >= expected:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
+
+def _upsert_batch(index, batch, namespace, max_retries, backoff):
+    attempt = 0
+    while True:
+        try:
+            index.upsert(vectors=batch, namespace=namespace)
+            return len(batch)
+        except Exception:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+
+def upsert_records(index, records, namespace, max_vectors=MAX_BATCH_VECTORS,
+                   max_bytes=MAX_BATCH_BYTES, max_workers=MAX_WORKERS,
+                   max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF,
+                   expected_count=None, wait_timeout=WAIT_TIMEOUT,
+                   poll_interval=POLL_INTERVAL):
+    """
+    Upsert records in size-bounded batches sent concurrently, then wait until
+    the namespace vector count confirms the write.
+
+    Args:
+        index (Index): Pinecone Index handle or a compatible stand-in.
+        records (list): Tuples (id, values, metadata) or dicts with the same keys.
+        namespace (str): Target namespace.
+        max_workers (int, optional): Batches in flight at once. Defaults to 4.
+        max_retries (int, optional): Retries per failed batch. Defaults to 3.
+        expected_count (int, optional): Namespace count that confirms the write.
+            Defaults to the count before upserting plus the number of unique ids
+            not already stored, so re-upserting existing ids confirms too.
+        wait_timeout (float, optional): Seconds to wait for confirmation. 0 skips waiting.
+    Returns:
+        dict: Upserted vectors, batches, elapsed seconds, vectors/s and whether
+        the write was confirmed.
+    """
+    started = time.perf_counter()
+    report = {'upserted': 0, 'batches': 0, 'seconds': 0.0,
+              'vectors_per_second': 0.0, 'confirmed': False}
+    if not records:
+        report['confirmed'] = True
+        return report
+
+    if expected_count is None and wait_timeout > 0:
+        unique_ids = {_record_id(record) for record in records}
+        new_ids = len(unique_ids) - count_existing_ids(index, namespace, unique_ids)
+        expected_count = namespace_vector_count(index, namespace) + new_ids
+
+    batches = batch_records(records, max_vectors=max_vectors, max_bytes=max_bytes)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_upsert_batch, index, batch, namespace,
+                                   max_retries, backoff) for batch in batches]
+        for future in as_completed(futures):
+            report['upserted'] += future.result()
+    report['batches'] = len(batches)
+
+    if wait_timeout > 0:
+        report['confirmed'] = wait_for_vector_count(
+            index, namespace, expected_count,
+            timeout=wait_timeout, poll_interval=poll_interval)
+    else:
+        report['confirmed'] = True
+
+    report['seconds'] = time.perf_counter() - started
+    if report['seconds'] > 0:
+        report['vectors_per_second'] = report['upserted'] / report['seconds']
+    return report